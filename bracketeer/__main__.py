@@ -1,95 +1,179 @@
 import logging
+import os
+import sys
+from time import perf_counter
+
+# Everything from here on counts towards the startup time we report.
+_import_started = perf_counter()
+
+from flask import Flask, Response, jsonify, request  # noqa: E402
+from flask_socketio import SocketIO  # noqa: E402
+
+from bracketeer.api_truefinals.poller import init_poller  # noqa: E402
+from bracketeer.config import load_config  # noqa: E402
+from bracketeer.debug.debug import debug_pages  # noqa: E402
+from bracketeer.matches.match_deltas import init_match_deltas  # noqa: E402
+from bracketeer.matches.match_results import _json_api_stub, match_results  # noqa: E402
+from bracketeer.matches.schedule_push import init_schedule_push  # noqa: E402
+from bracketeer.screens.cage_timer import init_cage_timers  # noqa: E402
+from bracketeer.screens.user_screens import user_screens  # noqa: E402
+from bracketeer.util.assets import init_assets  # noqa: E402
+from bracketeer.util.metrics import init_metrics, metrics  # noqa: E402
+from bracketeer.util.presence import init_presence, presence  # noqa: E402
+from bracketeer.util.wrappers import (
+    SocketIOHandlerConstruction,
+    ac_render_template,
+)  # noqa: E402
+from bracketeer.utils import runtime_err_warn  # noqa: E402
+
+"""
+The app is built by create_app() rather than at import, and none of the
+modules above touch event.json, .secrets.json or the SQLite files until
+something first needs them.  So tools, benchmarks and the like can import
+any of this cheaply, and only an actual server start pays for the lot:
+
+    app = create_app()      # blueprints, static assets, Socket.IO handlers
+    init_poller(app)        # warm start from the API cache, then polling
+    socketio.run(app, ...)
+
+main() is the development server; bracketeer.serve does the same under
+gevent for events.  Both log how long startup took.
+"""
+
+# Bound to the app in create_app(); the handlers hang off this one object.
+socketio = SocketIO()
+
+
+def _async_mode() -> str:
+    # bracketeer.serve patches everything for gevent before importing us.  Without
+    # that, stick to threads even if gevent happens to be installed.
+    if "gevent" in sys.modules:
+        from gevent import monkey
+
+        if monkey.is_module_patched("socket"):
+            return "gevent"
+    return "threading"
+
+
+def _register_routes(app):
+    @app.route("/")
+    def index():
+        return ac_render_template("homepage.html", title="Landing Page")
+
+    @app.route("/control/<int:cageID>")
+    def realTimer(cageID):
+        return ac_render_template(
+            "ctimer.html",
+            user_screens=user_screens,
+            title="Controller",
+            cageID=cageID,
+        )
 
-from flask import Flask, jsonify, request
-from flask_socketio import SocketIO
-
-from bracketeer.debug.debug import debug_pages
-from bracketeer.matches.match_results import _json_api_stub, match_results
-from bracketeer.screens.user_screens import user_screens
-from bracketeer.util.wrappers import ac_render_template
-from bracketeer.utils import runtime_err_warn
+    @app.route("/settings", methods=("GET", "POST"))
+    @runtime_err_warn
+    def generateSettingsPage():
+        if request.method == "GET":
+            return ac_render_template(
+                "app_settings.html",
+            )
+
+    @app.route("/debug/requests.json")
+    def _debug_requests():
+        from bracketeer.api_truefinals.cached_api import recent_cache_rows
+
+        return jsonify(recent_cache_rows(100))
+
+    @app.route("/debug/test_api_keys.json")
+    def _debug_api_keys():
+        from bracketeer.api_truefinals.api import testAPIKeys
+
+        return jsonify(testAPIKeys())
+
+    @app.route("/metrics")
+    def _metrics_page():
+        return Response(metrics.render_text(), mimetype="text/plain; version=0.0.4")
+
+    @app.route("/clients", methods=("GET", "POST"))
+    def _temp_clients_page():
+        clients = presence.clients()
+        by_cage = {}
+        for client in clients:
+            by_cage.setdefault(str(client["cage"]), []).append(client["sid"])
+
+        return jsonify(
+            {
+                "count": len(clients),
+                "live": sum(client["live"] for client in clients),
+                "by_cage": by_cage,
+                "clients": clients,
+            },
+        )
 
-logging.basicConfig(level="INFO")
+    @app.route("/matches.json")
+    def _debug_route_matches():
+        return jsonify(_json_api_stub())
 
-current_clients = {}
+    @app.errorhandler(500)
+    def internal_error(error):
+        autoreload = request.args.get("autoreload")
+        return ac_render_template(
+            "base.html",
+            autoreload=autoreload,
+            errormsg="Sorry, this page has produced an error while generating.  Please try again in 30s.",
+        )
 
-app = Flask(__name__, static_folder="static", template_folder="templates")
 
-app.register_blueprint(user_screens, url_prefix="/screens")
-app.register_blueprint(match_results, url_prefix="/matches")
-app.register_blueprint(debug_pages, url_prefix="/debug")
+def create_app() -> Flask:
+    start = perf_counter()
+    # Settings and secrets would otherwise load on the first request that
+    # needs them; better to see any warnings about them now.
+    load_config()
 
-### TODO: Add debug index page that lists all debug routes.
+    app = Flask(__name__, static_folder="static", template_folder="templates")
 
-app.config["SECRET_KEY"] = "secret secret key (required)!"
-socketio = SocketIO(app)
+    app.register_blueprint(user_screens, url_prefix="/screens")
+    app.register_blueprint(match_results, url_prefix="/matches")
+    app.register_blueprint(debug_pages, url_prefix="/debug")
+    init_assets(app)
 
+    ### TODO: Add debug index page that lists all debug routes.
 
-@app.route("/")
-def index():
-    return ac_render_template("homepage.html", title="Landing Page")
+    app.config["SECRET_KEY"] = "secret secret key (required)!"
 
+    socketio.init_app(app, async_mode=_async_mode())
+    init_metrics(app, socketio)
+    SocketIOHandlerConstruction(socketio)
+    init_schedule_push(app, socketio)
+    init_match_deltas(socketio)
+    init_presence(socketio)
+    init_cage_timers(socketio)
 
-@app.route("/control/<int:cageID>")
-def realTimer(cageID):
-    return ac_render_template(
-        "ctimer.html",
-        user_screens=user_screens,
-        title="Controller",
-        cageID=cageID,
-    )
+    _register_routes(app)
 
+    logging.info(f"App created in {perf_counter() - start:.2f}s.")
+    return app
 
-@app.route("/settings", methods=("GET", "POST"))
-@runtime_err_warn
-def generateSettingsPage():
-    if request.method == "GET":
-        return ac_render_template(
-            "app_settings.html",
-        )
 
-
-@app.route("/debug/requests.json")
-def _debug_requests():
-    from bracketeer.api_truefinals.cached_api import TrueFinalsAPICache
-
-    return jsonify(
-        TrueFinalsAPICache.select()
-        .order_by(TrueFinalsAPICache.last_requested)
-        .limit(100)
-        .output(load_json=True)
-        .run_sync(),
+def log_startup_time():
+    logging.info(
+        f"Started in {perf_counter() - _import_started:.2f}s, imports included.",
     )
 
 
-@app.route("/debug/test_api_keys.json")
-def _debug_api_keys():
-    from bracketeer.api_truefinals.api import testAPIKeys
-
-    return jsonify(testAPIKeys())
-
+def main():
+    logging.basicConfig(level="INFO")
 
-@app.route("/clients", methods=("GET", "POST"))
-def _temp_clients_page():
-    return jsonify(current_clients)
+    app = create_app()
 
+    # The debug reloader runs this module twice, once in a watcher process that
+    # never serves anything.  Only the serving child should poll TrueFinals.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        init_poller(app)
+        log_startup_time()
 
-@app.route("/matches.json")
-def _debug_route_matches():
-    return jsonify(_json_api_stub()._matches)
-
-
-@app.errorhandler(500)
-def internal_error(error):
-    autoreload = request.args.get("autoreload")
-    return ac_render_template(
-        "base.html",
-        autoreload=autoreload,
-        errormsg="Sorry, this page has produced an error while generating.  Please try again in 30s.",
-    )
-
+    # Development server.  For events, use `python -m bracketeer.serve`.
+    socketio.run(app, host="0.0.0.0", port=80, debug=True)
 
-logging.basicConfig()
-logging.getLogger().setLevel(logging.INFO)
 
-socketio.run(app, host="0.0.0.0", port=80, debug=True)
+if __name__ == "__main__":
+    main()
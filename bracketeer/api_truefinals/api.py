@@ -1,4 +1,5 @@
 import logging
+from time import perf_counter
 
 # This was shamelessly copied and may not work
 # as intended.  The intent is to move the API
@@ -8,9 +9,13 @@ import logging
 # en to clients for the most up-to-date match
 # behavior without needing to potentially hit
 # an error state.
+from typing import Optional
+
 from httpx import Client
 
+from bracketeer.api_truefinals.ratelimit import RateLimitedError, truefinals_limiter
 from bracketeer.config import secrets as arena_secrets
+from bracketeer.util.metrics import metrics, truefinals_endpoint_label
 
 tf_api_session = Client()
 # This caches the items less likely to change (if at all during the
@@ -18,7 +23,22 @@ tf_api_session = Client()
 # called until this is set up finally and tournaments are started.
 
 
-def makeAPIRequest(endpoint: str, api_key=None, user_id=None) -> list:
+def makeAPIRequest(
+    endpoint: str,
+    api_key=None,
+    user_id=None,
+    wait: bool = True,
+    timeout: Optional[float] = None,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+) -> list:
+    """Every request to TrueFinals goes through the shared rate limiter.
+
+    With `wait` we block until there's budget (up to `timeout`), otherwise
+    RateLimitedError is raised right away so the caller can use stale data.
+
+    Pass the `etag` / `last_modified` of a copy you already have to make it a
+    conditional request; a 304 back means that copy is still current."""
 
     if api_key is None:
         api_key = arena_secrets.truefinals.api_key
@@ -28,16 +48,56 @@ def makeAPIRequest(endpoint: str, api_key=None, user_id=None) -> list:
 
     credentials = {"user_id": user_id, "api_key": api_key}
 
-    print(credentials)
     headers = {
         "x-api-user-id": credentials["user_id"],
         "x-api-key": credentials["api_key"],
     }
+    if etag is not None:
+        headers["If-None-Match"] = etag
+    if last_modified is not None:
+        headers["If-Modified-Since"] = last_modified
 
     root_endpoint = """https://truefinals.com/api"""
 
+    endpoint_label = truefinals_endpoint_label(endpoint)
+
+    with metrics.timed("bracketeer_truefinals_token_wait_seconds"):
+        acquired = truefinals_limiter().acquire(timeout=(timeout if wait else 0))
+    if not acquired:
+        metrics.increment(
+            "bracketeer_truefinals_rate_limited_total",
+            endpoint=endpoint_label,
+        )
+        raise RateLimitedError(f"No request budget left for {endpoint}.")
+
     logging.info(f"value {endpoint} is not in cache, trying request now!")
-    resp = tf_api_session.get((f"{root_endpoint}{endpoint}"), headers=headers)
+    start = perf_counter()
+    try:
+        resp = tf_api_session.get((f"{root_endpoint}{endpoint}"), headers=headers)
+    except Exception:
+        metrics.observe(
+            "bracketeer_truefinals_request_seconds",
+            perf_counter() - start,
+            endpoint=endpoint_label,
+            status="error",
+        )
+        raise
+    metrics.observe(
+        "bracketeer_truefinals_request_seconds",
+        perf_counter() - start,
+        endpoint=endpoint_label,
+        status=resp.status_code,
+    )
+    for header in ("limit", "remaining", "reset"):
+        value = resp.headers.get(f"x-ratelimit-{header}")
+        if value is not None and value.isdigit():
+            metrics.set_gauge(f"bracketeer_truefinals_ratelimit_{header}", int(value))
+
+    if resp.status_code == 429:
+        truefinals_limiter().penalize(resp.headers)
+    else:
+        truefinals_limiter().calibrate(resp.headers)
+
     return resp
 
 
@@ -52,7 +112,7 @@ def testAPIKeys() -> list:
         trq2 = makeAPIRequest("/v1/user/tournaments", api_key=api_key, user_id=user_id)
         if trq2.status_code == 200:
             list_of_messages.append(
-                "API keys are valid, but backwards.  Invert in the secrets file."
+                "API keys are valid, but backwards.  Invert in the secrets file.",
             )
         else:
             list_of_messages.append("API keys are not valid.")
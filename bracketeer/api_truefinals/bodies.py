@@ -0,0 +1,79 @@
+import hashlib
+import json
+import threading
+import zlib
+from collections import OrderedDict
+
+"""
+How response bodies are stored in the API cache.
+
+Bodies go in as the raw bytes TrueFinals sent, zlib-compressed, alongside a
+sha256 of the uncompressed bytes.  The hash is what lets us spot a response
+that's identical to the last one (very common for games between matches)
+and what we key decoded bodies on: each distinct body is decompressed and
+parsed once, and everyone who reads it after that shares the same parsed
+object.  Treat those as read-only.
+"""
+
+# Enough for a few versions of every endpoint in a big event.
+PARSED_BODY_CACHE_SIZE = 128
+
+_parsed_bodies = OrderedDict()
+_parsed_bodies_lock = threading.Lock()
+
+
+def body_hash(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()
+
+
+def compress_body(raw: bytes) -> bytes:
+    return zlib.compress(raw, 6)
+
+
+def _remember_parsed(digest: str, parsed):
+    with _parsed_bodies_lock:
+        _parsed_bodies[digest] = parsed
+        _parsed_bodies.move_to_end(digest)
+        while len(_parsed_bodies) > PARSED_BODY_CACHE_SIZE:
+            _parsed_bodies.popitem(last=False)
+
+
+def parse_raw_body(digest: str, raw: bytes):
+    """Parsed body for freshly fetched bytes, reusing an earlier parse of the same body.
+
+    Raises ValueError for anything no caller could use: not JSON, empty, or `null`."""
+    with _parsed_bodies_lock:
+        if digest in _parsed_bodies:
+            _parsed_bodies.move_to_end(digest)
+            return _parsed_bodies[digest]
+
+    parsed = json.loads(raw)
+    if parsed is None:
+        raise ValueError("Response body is null.")
+    _remember_parsed(digest, parsed)
+    return parsed
+
+
+def decode_body(digest: str, compressed: bytes):
+    """Parsed body for a stored row; only decompresses when we haven't seen this body yet."""
+    with _parsed_bodies_lock:
+        if digest in _parsed_bodies:
+            _parsed_bodies.move_to_end(digest)
+            return _parsed_bodies[digest]
+
+    return parse_raw_body(digest, zlib.decompress(compressed))
+
+
+def decode_body_text(compressed: bytes) -> str:
+    """A stored body as text, for ones that may not be JSON (failed requests)."""
+    return zlib.decompress(compressed).decode("utf-8", errors="replace")
+
+
+def encode_headers(headers) -> bytes:
+    return zlib.compress(json.dumps(dict(headers)).encode())
+
+
+def decode_headers(compressed: bytes) -> dict:
+    if not compressed:
+        return {}
+    return json.loads(zlib.decompress(compressed))
@@ -1,152 +1,466 @@
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 # Text type is VarChar without limit, probably fine?
 from time import time
+from uuid import uuid4
 
-from piccolo.columns import JSON, UUID, BigInt, Boolean, Text
+from httpx import HTTPError
+from piccolo.columns import UUID, BigInt, Boolean, Bytea, Text, Varchar
 from piccolo.engine.sqlite import SQLiteEngine
 
 # ORM Test, ty Devyn.
 from piccolo.table import Table
 
 from bracketeer.api_truefinals.api import makeAPIRequest
-
-lru_DB = SQLiteEngine(path="tf_lru.sqlite")
+from bracketeer.api_truefinals.bodies import (
+    body_hash,
+    compress_body,
+    decode_body,
+    decode_body_text,
+    decode_headers,
+    encode_headers,
+    parse_raw_body,
+)
+from bracketeer.api_truefinals.ratelimit import RateLimitedError, truefinals_limiter
+from bracketeer.api_truefinals.singleflight import InFlightError, SingleFlight
+from bracketeer.config import settings as arena_settings
+from bracketeer.util.db import (
+    database_file_size,
+    db_writer,
+    incremental_vacuum,
+    prepare_sqlite,
+    setup_once,
+)
+from bracketeer.util.metrics import metrics, truefinals_endpoint_label
+
+# Readers and the batched writer share the file, give them a moment to take turns.
+lru_DB = SQLiteEngine(path="tf_lru.sqlite", timeout=10)
 
 """
-The true ratelimit of TrueFinals is 10 requests in 10 seconds, 
-unsure of interval of observation.  However, this neglects the
- reality that the web frontend ALSO counts towards this reque-
- st limit.  
- 
-As such, our limit is half of the rated one by default, and as 
-well is accomodating of the need for some requests that may 
-not be done yet, and or still result in rate-limiting.
-
-TrueFinals also returns the rate limit information in headers like so:
-
-X-RateLimit-Limit: Maximum number of requests allowed within a window (10s).
-X-RateLimit-Remaining: How many requests the user has left within the current window.
-X-RateLimit-Reset: Unix timestamp in milliseconds when the limits are reset.
-
-They are stored below, so we should look for the last response overall to 
-validate rate limiting, and remove ones past their expiry most likely, 
-rather than keeping them in perpetuity.
-
+The true ratelimit of TrueFinals is 10 requests in 10 seconds, and the web
+frontend ALSO counts towards it.  The accounting for that lives in
+ratelimit.py now; every makeAPIRequest call takes a token from the shared
+bucket, which re-calibrates itself from the X-RateLimit-* headers of each
+response.
 """
 
 
 def are_rate_limited() -> bool:
-    requests_thing = (
-        TrueFinalsAPICache.select()
-        .where((time() - 10) > TrueFinalsAPICache.last_requested)
-        .run_sync()
-    )
-    if (
-        len(requests_thing) >= 5
-    ):  # half of calls can be API due to web panel causing headaches.
-        return True
-    return False
+    return truefinals_limiter().tokens_available() < 1
 
 
+# Bodies and headers are zlib'd, see bodies.py.
 class TrueFinalsAPICache(Table, db=lru_DB):
     id = UUID(primary_key=True)
-    response = JSON()
+    body = Bytea()
+    body_hash = Varchar(length=64)
     last_requested = BigInt()
     api_path = Text()
     successful = Boolean()
     resp_code = BigInt()
-    resp_headers = JSON()
-
-
-# This is only used as a persistent cache in the same datastore to avoid headaches.
-class TrueFinalsTournamentsPlayers(Table, db=lru_DB):
-    pk_id = UUID(primary_key=True)
-    tournament_id = Text()
-    id = Text()
-    last_updated = BigInt()
-    player_data = JSON()
+    resp_headers = Bytea()
+
+
+# Need to assert that the table exists first, or else it fails horridly.  That
+# happens on the first lookup rather than at import, so tools that only want
+# the helpers in here don't pay for (or create) the database.
+@setup_once
+def prepare_cache_db():
+    TrueFinalsAPICache.create_table(if_not_exists=True).run_sync()
+    _migrate_cache_schema()
+
+    # Every cache lookup filters on all three of these and sorts on the last.
+    prepare_sqlite(
+        TrueFinalsAPICache,
+        indexes={
+            "tf_api_cache_lookup": ["api_path", "successful", "last_requested"],
+        },
+    )
 
 
-# Need to assert that the table exists first, or else it fails horridly.
-TrueFinalsAPICache.create_table(if_not_exists=True).run_sync()
-TrueFinalsTournamentsPlayers.create_table(if_not_exists=True).run_sync()
+def _migrate_cache_schema():
+    columns = {
+        column["name"]
+        for column in TrueFinalsAPICache.raw(
+            f"PRAGMA table_info({TrueFinalsAPICache._meta.tablename})",
+        ).run_sync()
+    }
+    if "body" not in columns:
+        # Files from before compressed bodies.  It's only a cache, start it over.
+        logging.warning("API cache has the old uncompressed layout, starting it fresh.")
+        TrueFinalsAPICache.alter().drop_table().run_sync()
+        TrueFinalsAPICache.create_table().run_sync()
 
 
 def _generate_cache_query(api_endpoint, expiry=60, expired_is_ok=False):
+    prepare_cache_db()
     find_response = (
         TrueFinalsAPICache.select(
+            TrueFinalsAPICache.id,
             TrueFinalsAPICache.api_path,
             TrueFinalsAPICache.last_requested,
-            TrueFinalsAPICache.response,
+            TrueFinalsAPICache.body,
+            TrueFinalsAPICache.body_hash,
             TrueFinalsAPICache.resp_code,
+            TrueFinalsAPICache.resp_headers,
         )
         .where(TrueFinalsAPICache.api_path == api_endpoint)
         .where(TrueFinalsAPICache.successful == True)
-        .where(TrueFinalsAPICache.resp_code != 401)  # Added to cut out user ID issues.
+        # Rows from before only 2xx counted as successful (401s, 404s...), or
+        # an empty body did.
+        .where(TrueFinalsAPICache.resp_code >= 200)
+        .where(TrueFinalsAPICache.resp_code < 300)
+        .where(TrueFinalsAPICache.body_hash != body_hash(b""))
     )
     if not expired_is_ok:
         find_response = find_response.where(
             (TrueFinalsAPICache.last_requested + expiry > time()),
         )
 
-    find_response = (
-        find_response.order_by(TrueFinalsAPICache.last_requested, ascending=False)
-        .limit(1)
-        .output(load_json=True)
+    find_response = find_response.order_by(
+        TrueFinalsAPICache.last_requested,
+        ascending=False,
+    ).limit(1)
+
+    return find_response
+
+
+def _decode_cache_row(row: dict) -> dict:
+    """Swaps the stored (compressed) body and headers on a row for their parsed forms."""
+    row = dict(row)
+    row["response"] = decode_body(row["body_hash"], row.pop("body"))
+    row["resp_headers"] = decode_headers(row["resp_headers"])
+    return row
+
+
+def _decode_failed_row(row: dict) -> dict:
+    """Like _decode_cache_row, but the body is whatever text came back rather than parsed JSON."""
+    row = dict(row)
+    row["response"] = decode_body_text(row.pop("body"))
+    row["resp_headers"] = decode_headers(row["resp_headers"])
+    return row
+
+
+def recent_cache_rows(limit=100) -> list:
+    """The most recent cache rows, decoded, for the debug pages."""
+    prepare_cache_db()
+    return [
+        _decode_cache_row(row) if row["successful"] else _decode_failed_row(row)
+        for row in TrueFinalsAPICache.select()
+        .order_by(TrueFinalsAPICache.last_requested, ascending=False)
+        .limit(limit)
+        .run_sync()
+    ]
+
+
+# api_path -> newest successful row we know of.  Inserts go out through the
+# batched writer, so for a moment after a fetch the DB won't have the row yet;
+# reads check here first so nobody re-fetches something we already have.
+_latest_responses = {}
+_latest_responses_lock = threading.Lock()
+
+
+def _remember_response(row: dict):
+    with _latest_responses_lock:
+        known = _latest_responses.get(row["api_path"])
+        if known is None or known["last_requested"] <= row["last_requested"]:
+            _latest_responses[row["api_path"]] = row
+
+
+def _newest_response(api_endpoint: str, hard_expiry) -> list:
+    """The newest successful row inside the hard expiry, as a one-row list like the query gives."""
+    row = _latest_responses.get(api_endpoint)
+
+    if row is None:
+        with metrics.timed("bracketeer_cache_query_seconds", query="newest"):
+            find_response = _generate_cache_query(
+                api_endpoint=api_endpoint,
+                expiry=hard_expiry,
+            ).run_sync()
+        if len(find_response) == 0:
+            return []
+        row = _decode_cache_row(find_response[0])
+        _remember_response(row)
+
+    if row["last_requested"] + hard_expiry <= time():
+        return []
+
+    # Copied so callers can tag it (age, stale) without touching ours.
+    return [dict(row)]
+
+
+def _mark_unchanged(known: dict, headers: dict):
+    """Bumps the freshness of a row whose body upstream says (or we found) is unchanged.
+
+    Same parsed body object and hash as before, so nothing downstream has to redo its work.
+    """
+    now = time()
+    row = dict(known, last_requested=now, resp_headers=headers)
+    db_writer.run(
+        TrueFinalsAPICache.update(
+            {
+                TrueFinalsAPICache.last_requested: now,
+                TrueFinalsAPICache.resp_headers: encode_headers(headers),
+            },
+        ).where(TrueFinalsAPICache.id == known["id"]),
     )
+    _remember_response(row)
+
+
+def _refresh_endpoint(api_endpoint: str, wait_for_token=True):
+    known = _latest_responses.get(api_endpoint)
+
+    # Only ask conditionally for things we can actually fall back on.
+    validators = {}
+    if known is not None:
+        validators = {
+            "etag": known["resp_headers"].get("etag"),
+            "last_modified": known["resp_headers"].get("last-modified"),
+        }
+
+    query_remote = makeAPIRequest(
+        api_endpoint,
+        wait=wait_for_token,
+        timeout=truefinals_limiter().window,
+        **validators,
+    )
+
+    if query_remote.status_code == 304 and known is not None:
+        logging.info(f"{api_endpoint} not modified upstream.")
+        # A 304 only carries the headers that changed, keep the rest.
+        _mark_unchanged(known, {**known["resp_headers"], **dict(query_remote.headers)})
+        return
 
+    raw_body = query_remote.content
+    digest = body_hash(raw_body)
+    # Anything else is a failed refresh: it's stored for the debug pages, but
+    # readers carry on with the last good body.
+    successful = 200 <= query_remote.status_code < 300
+
+    if (
+        successful
+        and known is not None
+        and known["body_hash"] == digest
+        and known["resp_code"] == query_remote.status_code
+    ):
+        # No validators upstream (or they changed anyway), but it's the same bytes.
+        logging.info(f"{api_endpoint} came back unchanged.")
+        _mark_unchanged(known, dict(query_remote.headers))
+        return
+
+    response = None
+    if successful:
+        try:
+            response = parse_raw_body(digest, raw_body)
+        except ValueError:
+            # An outage page from a proxy, say, or nothing at all.
+            logging.warning(f"{api_endpoint} sent back a body that isn't usable JSON.")
+            successful = False
+
+    if not successful:
+        logging.warning(
+            f"Fetching {api_endpoint} failed ({query_remote.status_code}), keeping the last good copy.",
+        )
+
+    now = time()
+    prepare_cache_db()
+    row = {
+        "id": uuid4(),
+        "response": response,
+        "body_hash": digest,
+        "successful": successful,
+        "last_requested": now,
+        "api_path": api_endpoint,
+        "resp_code": query_remote.status_code,
+        "resp_headers": dict(query_remote.headers),
+    }
+
+    db_writer.insert(
+        TrueFinalsAPICache,
+        TrueFinalsAPICache(
+            id=row["id"],
+            body=compress_body(raw_body),
+            body_hash=digest,
+            successful=successful,
+            last_requested=now,
+            api_path=api_endpoint,
+            resp_code=row["resp_code"],
+            resp_headers=encode_headers(query_remote.headers),
+        ),
+    )
+
+    if row["successful"]:
+        _remember_response(row)
+
+
+# One upstream request per api_path at a time; everyone else who misses the
+# cache for it in the meantime shares that request's outcome.
+_endpoint_flights = SingleFlight()
+
+# Soft-expired endpoints get refreshed here while callers carry on with the
+# stale copy.  Two workers is plenty, the rate limiter is the real bottleneck.
+_revalidate_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tf_revalidate")
+# api_paths with a background refresh queued or running, so a burst of stale
+# reads queues one refresh rather than one each.
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+"""
+How long past its expiry a cached response is still worth showing, when the
+refresh fails or hasn't finished yet.  Past this it's treated as missing and
+we block on a fresh copy instead.  Override per kind in event.json with
+`"cache_hard_expiry": {"games": 300}`.
+"""
+DEFAULT_HARD_EXPIRY = {
+    "event": 24 * 60 * 60,
+    "games": 10 * 60,
+    "players": 6 * 60 * 60,
+    "locations": 24 * 60 * 60,
+}
+
+
+def _hard_expiry(kind: str) -> int:
+    return arena_settings.get("cache_hard_expiry", {}).get(
+        kind,
+        DEFAULT_HARD_EXPIRY[kind],
+    )
+
+
+def _with_age(find_response: list, expiry) -> list:
+    now = time()
+    for row in find_response:
+        row["age"] = now - row["last_requested"]
+        row["stale"] = row["age"] >= expiry
     return find_response
 
 
-def getAPIEndpointRespectfully(api_endpoint: str, expiry=60):
+def _fetch_through_flight(api_endpoint: str, wait_for_token=True) -> bool:
+    """Refreshes the endpoint (or joins the refresh already running).
+
+    Returns whether that went through; failures are logged, not raised, since
+    every caller has a stale copy to fall back on."""
+    try:
+        _endpoint_flights.do(
+            api_endpoint,
+            lambda: _refresh_endpoint(api_endpoint, wait_for_token),
+            wait=wait_for_token,
+            timeout=(2 * truefinals_limiter().window),
+        )
+        return True
+    except RateLimitedError:
+        logging.warning(f"Out of request budget, using stale {api_endpoint}.")
+    except InFlightError:
+        logging.info(f"{api_endpoint} is already being fetched, using stale.")
+    except FutureTimeoutError:
+        logging.warning(f"Gave up waiting on the fetch of {api_endpoint}.")
+    except HTTPError as err:
+        logging.warning(f"Fetching {api_endpoint} failed ({err!r}), using stale.")
+    return False
+
+
+def _schedule_revalidate(api_endpoint: str, expiry):
+    with _revalidating_lock:
+        if api_endpoint in _revalidating:
+            return
+        _revalidating.add(api_endpoint)
+    _revalidate_pool.submit(_revalidate, api_endpoint, expiry)
+
+
+def _revalidate(api_endpoint: str, expiry):
+    try:
+        # The poller or an inline refresh may have got there while we were queued.
+        known = _latest_responses.get(api_endpoint)
+        if known is not None and time() - known["last_requested"] < expiry:
+            return
+
+        # Background refreshes never queue behind an in-flight fetch; if one's
+        # already running it'll land the fresh copy for us.
+        _endpoint_flights.do(
+            api_endpoint,
+            lambda: _refresh_endpoint(api_endpoint),
+            wait=False,
+        )
+    except InFlightError:
+        pass
+    except Exception:
+        logging.exception(f"Background refresh of {api_endpoint} failed.")
+    finally:
+        with _revalidating_lock:
+            _revalidating.discard(api_endpoint)
+
+
+def getAPIEndpointRespectfully(
+    api_endpoint: str,
+    expiry=60,
+    wait_for_token=True,
+    hard_expiry=None,
+    revalidate_inline=False,
+):
+    """Cached view of an endpoint, stale-while-revalidate style.
+
+    - Younger than `expiry`: served as-is.
+    - Older, but younger than `hard_expiry`: served right away (marked stale),
+      and a refresh is kicked off in the background.  With `revalidate_inline`
+      the refresh happens first instead, falling back to the stale copy if
+      it fails, for callers that are off the request path anyway.  (The
+      poller goes further and always refreshes, see refresh_division.)
+    - Missing or past `hard_expiry`: we block on a refresh.
+
+    Rows come back with `age` (seconds) and `stale` added.  A refresh that
+    finds the body unchanged (304, or the same bytes) keeps `response` and
+    `body_hash` as they were and only moves `last_requested`, so compare
+    `body_hash` to tell whether there's anything new to process.  Concurrent
+    refreshes of the same endpoint are coalesced so only one goes upstream.
+    Without `wait_for_token` we don't queue for request budget or for someone
+    else's request; an empty list means there was nothing usable at all."""
     logging.info(f"expiry is {expiry} while calling {api_endpoint}")
 
-    find_response = _generate_cache_query(api_endpoint, expiry).run_sync()
+    if hard_expiry is None:
+        hard_expiry = expiry
 
-    # Key is not present.
-    if len(find_response) == 0:
-        logging.info(f"No valid keys, adding new request for {api_endpoint}")
-        # TODO change to enqueue system and run in distinct thread I think?
-        # That or a global worker for DB operations to avoid headaches or something.
-
-        query_remote = makeAPIRequest(api_endpoint)
-        # print(query_remote.headers)
-        insert_query = TrueFinalsAPICache.insert(
-            TrueFinalsAPICache(
-                response=query_remote.json(),
-                successful=(
-                    (query_remote.status_code >= 200)
-                    and (query_remote.status_code < 500)
-                ),
-                last_requested=time(),
-                api_path=api_endpoint,
-                resp_code=query_remote.status_code,
-                resp_headers=query_remote.headers,
-            ),
-        ).run_sync()
+    find_response = _newest_response(api_endpoint, hard_expiry)
+    endpoint_label = truefinals_endpoint_label(api_endpoint)
 
-        TrueFinalsAPICache.update(force=True)
-    else:
-        logging.info(f"Valid keys found, not requesting {api_endpoint}.")
+    if len(find_response) != 0:
+        age = time() - find_response[0]["last_requested"]
 
-    find_response = _generate_cache_query(
-        api_endpoint=api_endpoint,
-        expiry=expiry,
-    ).run_sync()
+        if age < expiry:
+            logging.info(f"Valid keys found, not requesting {api_endpoint}.")
+            metrics.increment(
+                "bracketeer_cache_lookups_total",
+                endpoint=endpoint_label,
+                result="hit",
+            )
+            return _with_age(find_response, expiry)
 
-    # last ditch effort of "if we didn't get good data the last
-    # invocation, we try to return known stale data we have a
-    # copy of."
+        metrics.increment(
+            "bracketeer_cache_lookups_total",
+            endpoint=endpoint_label,
+            result="stale",
+        )
+        if not revalidate_inline:
+            logging.info(
+                f"Serving stale {api_endpoint} ({age:.0f}s old) while refreshing.",
+            )
+            _schedule_revalidate(api_endpoint, expiry)
+            return _with_age(find_response, expiry)
 
-    if len(find_response) == 0:
-        _generate_cache_query(
-            api_endpoint=api_endpoint,
-            expiry=expiry,
-            expired_is_ok=True,
-        ).run_sync()
+    else:
+        metrics.increment(
+            "bracketeer_cache_lookups_total",
+            endpoint=endpoint_label,
+            result="miss",
+        )
 
-    return find_response
+    logging.info(f"No valid keys, adding new request for {api_endpoint}")
+    _fetch_through_flight(api_endpoint, wait_for_token)
+
+    # Whatever the refresh did, the newest successful row that's still inside
+    # the hard expiry is the best we've got (stale-if-error).
+    return _with_age(_newest_response(api_endpoint, hard_expiry), expiry)
 
 
 # Below are the stubs we hope to use to use the above APICache antics we've made.
@@ -161,41 +475,249 @@ def getAPIEndpointRespectfully(api_endpoint: str, expiry=60):
 # That's a long ten seconds.
 
 
-# Below functions assume you ONLY want the unexpired items.
-# This would obviously present a headache for some use cases.
-def getEventInformation(tournamentID: str) -> dict:
-    return getAPIEndpointRespectfully(f"/v1/tournaments/{tournamentID}")
+# How long each kind of division data counts as fresh.
+DIVISION_EXPIRY = {
+    "games": 15,
+    "players": 5 * 60,
+    "locations": 60 * 60,
+}
+
+
+def division_api_path(kind: str, tournamentID: str) -> str:
+    """Endpoint for one kind ("games", "players", "locations") of a division's data."""
+    return f"/v1/tournaments/{tournamentID}/{kind}"
+
+
+def last_persisted_response(api_endpoint: str) -> list:
+    """The newest successful row on disk for the endpoint, however old it is.
+
+    For warming up at startup, when something to show beats nothing.  The row
+    always comes back `stale`, with its `age`, and is remembered so the first
+    refresh can ask upstream conditionally.  Everything else should go through
+    getAPIEndpointRespectfully, which respects the hard expiry."""
+    find_response = _generate_cache_query(api_endpoint, expired_is_ok=True).run_sync()
+    if len(find_response) == 0:
+        return []
+
+    row = _decode_cache_row(find_response[0])
+    _remember_response(row)
+    return _with_age([dict(row)], expiry=0)
+
 
+def refresh_division(kind: str, tournamentID: str) -> list:
+    """Goes upstream for one kind of a division's data right now, for the poller.
 
-def getAllGames(tournamentID: str) -> list[dict]:
+    Unlike the getters below this never settles for a cached copy just because
+    it hasn't expired yet; the poll interval is what decides how often we ask.
+    If the fetch fails we fall back on the newest row inside the hard expiry
+    (marked `stale` once it's past the kind's expiry), or nothing."""
+    api_endpoint = division_api_path(kind, tournamentID)
+    _fetch_through_flight(api_endpoint)
+    return _with_age(
+        _newest_response(api_endpoint, _hard_expiry(kind)),
+        DIVISION_EXPIRY[kind],
+    )
+
+
+# These will hand back stale items (up to their hard expiry) rather than
+# nothing, check `stale` / `age` on the row if that matters to you.
+def getEventInformation(tournamentID: str, revalidate_inline=False) -> dict:
+    return getAPIEndpointRespectfully(
+        f"/v1/tournaments/{tournamentID}",
+        hard_expiry=_hard_expiry("event"),
+        revalidate_inline=revalidate_inline,
+    )
+
+
+def getAllGames(tournamentID: str, revalidate_inline=False) -> list[dict]:
     return getAPIEndpointRespectfully(
-        f"/v1/tournaments/{tournamentID}/games",
-        expiry=15,
+        division_api_path("games", tournamentID),
+        expiry=DIVISION_EXPIRY["games"],
+        hard_expiry=_hard_expiry("games"),
+        revalidate_inline=revalidate_inline,
     )
 
 
-def getAllPlayersInTournament(tournamentID: str) -> list[dict]:
+def getAllPlayersInTournament(tournamentID: str, revalidate_inline=False) -> list[dict]:
     return getAPIEndpointRespectfully(
-        f"/v1/tournaments/{tournamentID}/players",
-        expiry=(5 * 60),
+        division_api_path("players", tournamentID),
+        expiry=DIVISION_EXPIRY["players"],
+        hard_expiry=_hard_expiry("players"),
+        revalidate_inline=revalidate_inline,
     )
 
 
-def getEventLocations(tournamentID: str) -> list[dict]:
+def getEventLocations(tournamentID: str, revalidate_inline=False) -> list[dict]:
     return getAPIEndpointRespectfully(
-        f"/v1/tournaments/{tournamentID}/locations",
-        expiry=(60 * 60),
+        division_api_path("locations", tournamentID),
+        expiry=DIVISION_EXPIRY["locations"],
+        hard_expiry=_hard_expiry("locations"),
+        revalidate_inline=revalidate_inline,
     )
 
 
 # DO NOT USE LIGHTLY.  THIS EMPTIES THE FILE.
 def purge_API_Cache(timer_passed=3600):
+    prepare_cache_db()
     # We only care about the last 10 minutes of event match failures I suspect.
     TrueFinalsAPICache.delete().where(
         TrueFinalsAPICache.last_requested + 600 < time(),
-    ).where(not TrueFinalsAPICache.successful).run_sync()
+    ).where(TrueFinalsAPICache.successful == False).run_sync()
 
     # Anything past the last hour we get rid of.
     TrueFinalsAPICache.delete().where(
         (TrueFinalsAPICache.last_requested + timer_passed < time()),
     ).run_sync()
+
+
+"""
+Retention for the API cache, run on a schedule by the poller.  Without it the
+cache keeps every games response from every poll for the whole weekend.
+
+- Only the newest `keep_per_path` successful responses per api_path are kept.
+- Failed responses go once they're older than `failure_window` seconds.
+- If what's left is still over `max_bytes`, the oldest responses go first,
+  but never the newest successful one for any api_path, which is what the
+  cache falls back on.
+- Then up to `vacuum_pages` free pages are handed back to the filesystem.
+
+Override any of these in event.json under `"cache_retention"`.
+"""
+
+DEFAULT_CACHE_RETENTION = {
+    "keep_per_path": 5,
+    "failure_window": 10 * 60,
+    "max_bytes": 64 * 1024 * 1024,
+    "vacuum_pages": 1024,
+    "interval": 5 * 60,
+}
+
+
+# The rows _generate_cache_query will serve, for the raw queries below.
+_SERVABLE_ROWS = "successful = 1 AND resp_code >= 200 AND resp_code < 300"
+
+
+def cache_retention_setting(key: str):
+    return arena_settings.get("cache_retention", {}).get(
+        key,
+        DEFAULT_CACHE_RETENTION[key],
+    )
+
+
+def _oversize_cache_ids(max_bytes: int) -> list:
+    tablename = TrueFinalsAPICache._meta.tablename
+    candidates = TrueFinalsAPICache.raw(
+        f"""
+        SELECT id, length(body) + length(resp_headers) AS size
+        FROM {tablename}
+        WHERE id NOT IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY api_path ORDER BY last_requested DESC
+                ) AS recency
+                FROM {tablename}
+                WHERE {_SERVABLE_ROWS}
+            ) WHERE recency = 1
+        )
+        ORDER BY last_requested ASC
+        """,
+    ).run_sync()
+
+    total_size = TrueFinalsAPICache.raw(
+        f"SELECT COALESCE(SUM(length(body) + length(resp_headers)), 0) AS size FROM {tablename}",
+    ).run_sync()[0]["size"]
+
+    doomed = []
+    for candidate in candidates:
+        if total_size <= max_bytes:
+            break
+        doomed.append(candidate["id"])
+        total_size -= candidate["size"] or 0
+
+    return doomed
+
+
+def enforce_cache_retention():
+    prepare_cache_db()
+    with metrics.timed("bracketeer_cache_query_seconds", query="retention"):
+        _enforce_cache_retention()
+
+
+def _enforce_cache_retention():
+    tablename = TrueFinalsAPICache._meta.tablename
+    keep_per_path = int(cache_retention_setting("keep_per_path"))
+
+    db_writer.run(
+        TrueFinalsAPICache.delete()
+        .where(TrueFinalsAPICache.successful == False)
+        .where(
+            TrueFinalsAPICache.last_requested
+            + cache_retention_setting("failure_window")
+            < time(),
+        ),
+    )
+    db_writer.run(
+        TrueFinalsAPICache.raw(
+            f"""
+            DELETE FROM {tablename}
+            WHERE successful = 1 AND id NOT IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY api_path ORDER BY last_requested DESC
+                    ) AS recency
+                    FROM {tablename}
+                    WHERE {_SERVABLE_ROWS}
+                ) WHERE recency <= {keep_per_path}
+            )
+            """,
+        ),
+    )
+    # The size cap is worked out from what's left after the above.
+    db_writer.flush()
+
+    doomed = _oversize_cache_ids(cache_retention_setting("max_bytes"))
+    if doomed:
+        db_writer.run(
+            TrueFinalsAPICache.delete().where(TrueFinalsAPICache.id.is_in(doomed)),
+        )
+
+    db_writer.run(
+        incremental_vacuum(TrueFinalsAPICache, cache_retention_setting("vacuum_pages")),
+    )
+    db_writer.flush()
+
+    logging.info(
+        f"Cache retention done, {len(doomed)} rows dropped for size; {cache_stats()['rows']} rows left.",
+    )
+
+
+def cache_stats() -> dict:
+    prepare_cache_db()
+    tablename = TrueFinalsAPICache._meta.tablename
+    with metrics.timed("bracketeer_cache_query_seconds", query="stats"):
+        per_path = TrueFinalsAPICache.raw(
+            f"""
+            SELECT api_path, successful, COUNT(*) AS row_count,
+                COALESCE(SUM(length(body) + length(resp_headers)), 0) AS bytes,
+                MAX(last_requested) AS newest
+            FROM {tablename}
+            GROUP BY api_path, successful
+            ORDER BY api_path
+            """,
+        ).run_sync()
+
+    pages = {
+        pragma: TrueFinalsAPICache.raw(f"PRAGMA {pragma}").run_sync()[0][pragma]
+        for pragma in ("page_count", "page_size", "freelist_count")
+    }
+
+    return {
+        "rows": sum(entry["row_count"] for entry in per_path),
+        "payload_bytes": sum(entry["bytes"] for entry in per_path),
+        "file_bytes": database_file_size(lru_DB),
+        "pages": pages,
+        "per_path": per_path,
+        "retention": {
+            key: cache_retention_setting(key) for key in DEFAULT_CACHE_RETENTION
+        },
+    }
@@ -1,143 +1,184 @@
 import logging
-from time import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from bracketeer.api_truefinals.cached_api import (
-    TrueFinalsTournamentsPlayers,
     getAllGames,
     getAllPlayersInTournament,
     getEventLocations,
 )
+from bracketeer.api_truefinals.player_index import PlayerIndex
+from bracketeer.api_truefinals.poller import poller_running
+from bracketeer.api_truefinals.snapshot import (
+    annotate_division_rows,
+    current_snapshot,
+)
 from bracketeer.config import settings as arena_settings
+from bracketeer.util.metrics import metrics
 
-# used for player lookup to avoid rebuilding constantly.  Should be faster.
+_INLINE_FETCHERS = {
+    "games": getAllGames,
+    "players": getAllPlayersInTournament,
+    "locations": getEventLocations,
+}
 
 
-"""
-Tournament locations call will return a list if there's more than one location / any is defined.
+# (kind, tournament_id) -> (body_hash, annotated rows), for the inline path.
+# An unchanged body hands back the same rows (and staleness_time), so the
+# player index keyed on them isn't rebuilt either.
+_inline_divisions = {}
 
-Location will return [] if there are no locations specified.
 
-"""
+def _division_rows(kind: str, tournament_key: dict) -> tuple:
+    """Rows for one division, preferring the poller's snapshot.
 
+    When the poller is running we never touch the network from here; a
+    division it hasn't fetched yet is just empty for now.  Without it (tools,
+    tf_test.py) we fall back to going through the cache inline."""
+    if poller_running():
+        return current_snapshot().divisions[kind].get(tournament_key["id"], ())
 
-def getAllTournamentsLocations():
-    output_structure = []
+    _current_data = _INLINE_FETCHERS[kind](tournament_key["id"])
+    if len(_current_data) == 0:
+        return ()
 
-    for tournament_key in arena_settings["tournament_keys"]:
-        _current_fk = tournament_key["id"]
-        _current_name = tournament_key["weightclass"]
+    division = (kind, tournament_key["id"])
+    known = _inline_divisions.get(division)
+    if known is not None and known[0] == _current_data[0]["body_hash"]:
+        return known[1]
 
-        _current_data = getEventLocations(_current_fk)
+    rows = annotate_division_rows(
+        kind,
+        tournament_key,
+        _current_data[0]["response"],
+        _current_data[0]["last_requested"],
+    )
+    _inline_divisions[division] = (_current_data[0]["body_hash"], rows)
+    return rows
 
-        for loc in _current_data[0]["response"]:
-            loc["root_tournament_fk"] = _current_fk
-            loc["staleness_time"] = _current_data[0]["last_requested"]
 
-            output_structure.append(loc)
+# Cold loads without the poller fetch every division at once instead of one
+# after another.  The rate limiter still decides how many actually go out
+# together, so this can't blow the budget, it just stops us idling on it.
+_division_pool = None
+_division_pool_lock = threading.Lock()
 
-    return output_structure
 
+def _get_division_pool() -> ThreadPoolExecutor:
+    global _division_pool
 
-def getAllTournamentsPlayers():
+    with _division_pool_lock:
+        if _division_pool is None:
+            _division_pool = ThreadPoolExecutor(
+                max_workers=arena_settings.get("truefinals_fetch_workers", 6),
+                thread_name_prefix="tf_division_fetch",
+            )
+    return _division_pool
+
+
+def _all_division_rows(kind: str) -> list:
+    tournament_keys = [
+        tournament_key
+        for tournament_key in arena_settings["tournament_keys"]
+        if tournament_key.get("tourn_type", "truefinals") == "truefinals"
+    ]
+
+    if poller_running() or len(tournament_keys) <= 1:
+        # Snapshot reads are just dict lookups, not worth a thread hop.
+        division_results = [_division_rows(kind, key) for key in tournament_keys]
+    else:
+        division_results = _get_division_pool().map(
+            lambda tournament_key: _division_rows(kind, tournament_key),
+            tournament_keys,
+        )
+
+    # map() keeps the order of the keys, so the merged output does too.
     output_structure = []
+    for rows in division_results:
+        output_structure.extend(rows)
 
-    for tournament_key in arena_settings["tournament_keys"]:
-        _current_fk = tournament_key["id"]
-        _current_name = tournament_key["weightclass"]
+    return output_structure
 
-        if tournament_key["tourn_type"] == "truefinals":
-            _current_data = getAllPlayersInTournament(_current_fk)
-        elif tournament_key["tourn_type"] == "challonge":
-            pass
-            # _current_data = getAllChallongePlayers(_current_fk)
 
-        for loc in _current_data[0]["response"]:
-            # print(loc)
-            loc["root_tournament_fk"] = _current_fk
-            loc["staleness_time"] = _current_data[0]["last_requested"]
+"""
+Tournament locations call will return a list if there's more than one location / any is defined.
 
-            output_structure.append(loc)
+Location will return [] if there are no locations specified.
 
-    # Reset this so we can re-analyze stuff and sanely interact with the data backed by the cache.
-    # for item in output_structure:
-    #
+"""
 
-    return output_structure
 
+def getAllTournamentsLocations():
+    return _all_division_rows("locations")
+
+
+def getAllTournamentsPlayers():
+    # Challonge divisions are skipped for now.
+    # _current_data = getAllChallongePlayers(_current_fk)
+    return _all_division_rows("players")
 
-"""
-This absurd function takes the contents of the temporary database and uses it to
-produce a synthetic proto-view for use in building the dictionary for finding
-players quickly and effectively across cross-tournament keys.
 
-This being faster than for loops feels absurd, I agree.
+"""
+Players are looked up once per slot of every match we render, so they come
+out of a PlayerIndex rather than anything that touches the DB.  The index is
+rebuilt only when the players data underneath it changes (a poller refresh,
+or a newer cache row when running without the poller) and swapped in whole.
 """
 
+_player_index = PlayerIndex([])
+_player_index_lock = threading.Lock()
 
-def build_player_dict_via_db_proxy():
-    player_id_dict = {}
-    start_build = time()
 
-    # If there are no valid players we can use to build this
-    # data as they've expired since we got them.
-    if (
-        len(
-            TrueFinalsTournamentsPlayers.select()
-            .where(TrueFinalsTournamentsPlayers.last_updated + 3600 > time())
-            .output(load_json=True)
-            .run_sync(),
+def _players_source() -> tuple:
+    if poller_running():
+        snapshot = current_snapshot()
+        return tuple(
+            sorted(
+                (tournament_id, last_requested)
+                for (kind, tournament_id), last_requested in snapshot.fetched_at.items()
+                if kind == "players"
+            ),
         )
-        == 0
-    ):
-        TrueFinalsTournamentsPlayers.delete(force=True)
-        player_id_dict = {}
-
-        all_tournaments_players = getAllTournamentsPlayers()
-
-        refactor_list = [
-            {
-                "tournament_id": player_moment["root_tournament_fk"],
-                "last_updated": time(),
-                "player_data": player_moment,
-            }
-            for player_moment in all_tournaments_players
-        ]
-
-        for i in refactor_list:
-            TrueFinalsTournamentsPlayers.insert(
-                TrueFinalsTournamentsPlayers(
-                    id=i["player_data"]["id"],
-                    tournament_id=i["tournament_id"],
-                    last_updated=i["last_updated"],
-                    player_data=i["player_data"],
-                ),
-            ).run_sync()
-
-    for tournament_player in (
-        TrueFinalsTournamentsPlayers.select().output(load_json=True).run_sync()
-    ):
-        if tournament_player["tournament_id"] not in player_id_dict:
-            player_id_dict[tournament_player["tournament_id"]] = {}
-
-        if (
-            tournament_player["id"]
-            not in player_id_dict[tournament_player["tournament_id"]]
-        ):
-            player_id_dict[tournament_player["tournament_id"]][
-                tournament_player["id"]
-            ] = tournament_player
-
-    end_build = time()
-    logging.info(f"Player dict build step took {end_build - start_build}s")
-    return player_id_dict
-
-
-def getPlayerByIds(tournamentID: str, playerID: str):
-    value = build_player_dict_via_db_proxy()
-
-    if tournamentID in value:
-        if playerID in value[tournamentID]:
-            return value[tournamentID][playerID]["player_data"]
+    return ()
+
+
+def get_player_index() -> PlayerIndex:
+    global _player_index
+
+    source = _players_source()
+    if source and source == _player_index.source:
+        return _player_index
+
+    players = getAllTournamentsPlayers()
+    if not source:
+        # No snapshot to go by, so key it on the cache rows the players came from.
+        source = tuple(
+            sorted({(p["root_tournament_fk"], p["staleness_time"]) for p in players}),
+        )
+
+    with _player_index_lock:
+        if source != _player_index.source:
+            new_index = PlayerIndex(players, source)
+            metrics.observe(
+                "bracketeer_player_index_build_seconds",
+                new_index.build_time,
+            )
+            logging.info(
+                f"Player index build step took {new_index.build_time:.4f}s for {len(new_index)} players.",
+            )
+            _player_index.log_retirement()
+            _player_index = new_index
+
+    return _player_index
+
+
+def getPlayerByIds(tournamentID: str, playerID: str, player_index=None):
+    if player_index is None:
+        player_index = get_player_index()
+
+    player = player_index.lookup(tournamentID, playerID)
+    if player is not None:
+        return player
     # fmt: off
     # This reflects all of the needed keys so we're kept sane-ish.  Yay.
     return {"id": None, "name": "Default Player Information",
@@ -161,46 +202,33 @@ def getPlayerByIds(tournamentID: str, playerID: str):
 def getAllTournamentsMatchesWithPlayers(filterFunction=None):
     matches = getAllTournamentsMatchesSimple(filterFunction)
 
-    print(len(matches))
-    if filterFunction:
-        matches = [x for x in matches if filterFunction(x)]
+    player_index = get_player_index()
 
+    # Snapshot rows are shared between requests, so we enrich copies.
+    enriched = []
     for match in matches:
+        match = dict(match)
+        match["slots"] = [dict(player) for player in match["slots"]]
+
         for player in match["slots"]:
             player["bracketeer_player_data"] = getPlayerByIds(
                 match["tournamentID"],
                 player["playerID"],
+                player_index,
             )
 
-    return matches
-
-
-def getAllTournamentsMatchesSimple(filterFunction=None):
-    output_structure = []
+        enriched.append(match)
 
-    for tournament_key in arena_settings["tournament_keys"]:
-        _current_fk = tournament_key["id"]
-        _current_name = tournament_key["weightclass"]
+    return enriched
 
-        _current_data = getAllGames(_current_fk)
 
-        if len(_current_data) == 1:
-            print(
-                f"Exactly one valid response in API cache for this invocation of get all games for tourney_fk of {_current_fk}.",
-            )
-
-            for match in list(_current_data[0]["response"]):
-                # print(_current_data[0]['response'])
-                match["tournamentID"] = _current_fk
-                match["weightclass"] = _current_name
-                match["staleness_time"] = _current_data[0]["last_requested"]
-
-                output_structure.append(match)
+def getAllTournamentsMatchesSimple(filterFunction=None):
+    output_structure = _all_division_rows("games")
 
-        logging.info(f"num matches before filter: {len(output_structure)}")
-        if filterFunction:
-            _current_data = [x for x in output_structure if filterFunction(x)]
+    logging.info(f"num matches before filter: {len(output_structure)}")
+    if filterFunction:
+        output_structure = [x for x in output_structure if filterFunction(x)]
 
-        logging.info(f"num matches after filter: {len(output_structure)}")
+    logging.info(f"num matches after filter: {len(output_structure)}")
 
     return output_structure
@@ -0,0 +1,213 @@
+import logging
+import sys
+import threading
+from time import perf_counter
+
+"""
+Compact, read-only views of the event's matches and players.
+
+The snapshot keeps TrueFinals' rows as dicts, and the classic JSON routes
+hand each match out with a full copy of both players' records on its slots,
+so the same player ends up serialized once per match they're in.  These
+types are built once per snapshot instead (see get_event_model), with
+`__slots__` rather than a dict per object, every id / name / state string
+interned so the copies across matches and rebuilds are shared, and slots
+that refer to their player by id.
+
+normalized_payload() is the matching wire format: the matches, plus a table
+of just the players they refer to, each sent once.  Both are a reduced view,
+not TrueFinals' rows re-encoded: only the fields listed in each class's
+to_json() make it in, which is what the queue screens draw and little else.
+Those that are kept use TrueFinals' names, so a screen reading them doesn't
+need to know which format it got.  Anything that needs the rest of a row
+wants the default format (or the cache) instead.
+"""
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Player:
+    __slots__ = (
+        "tournament_id",
+        "id",
+        "name",
+        "seed",
+        "wins",
+        "losses",
+        "ties",
+        "photo_url",
+        "is_bye",
+        "is_disqualified",
+        "placement",
+    )
+
+    def __init__(self, row: dict):
+        self.tournament_id = _intern(row["root_tournament_fk"])
+        self.id = _intern(row["id"])
+        self.name = _intern(row.get("name"))
+        self.seed = row.get("seed")
+        self.wins = row.get("wins")
+        self.losses = row.get("losses")
+        self.ties = row.get("ties")
+        self.photo_url = row.get("photoUrl")
+        self.is_bye = row.get("isBye", False)
+        self.is_disqualified = row.get("isDisqualified", False)
+        self.placement = row.get("placement")
+
+    def to_json(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "seed": self.seed,
+            "wins": self.wins,
+            "losses": self.losses,
+            "ties": self.ties,
+            "photoUrl": self.photo_url,
+            "isBye": self.is_bye,
+            "isDisqualified": self.is_disqualified,
+            "placement": self.placement,
+        }
+
+
+class Slot:
+    __slots__ = ("player_id", "prev_game_id")
+
+    def __init__(self, row: dict):
+        self.player_id = _intern(row.get("playerID"))
+        self.prev_game_id = _intern(row.get("prevGameID"))
+
+    def to_json(self) -> dict:
+        return {"playerID": self.player_id, "prevGameID": self.prev_game_id}
+
+
+class Match:
+    __slots__ = (
+        "tournament_id",
+        "id",
+        "weightclass",
+        "name",
+        "state",
+        "called_since",
+        "active_since",
+        "result_annotation",
+        "slots",
+    )
+
+    def __init__(self, row: dict):
+        self.tournament_id = _intern(row["tournamentID"])
+        self.id = _intern(row["id"])
+        self.weightclass = _intern(row.get("weightclass"))
+        self.name = _intern(row.get("name"))
+        self.state = _intern(row.get("state"))
+        self.called_since = row.get("calledSince")
+        self.active_since = row.get("activeSince")
+        self.result_annotation = _intern(row.get("resultAnnotation"))
+        self.slots = tuple(Slot(slot) for slot in row.get("slots") or ())
+
+    def to_json(self) -> dict:
+        return {
+            "id": self.id,
+            "tournamentID": self.tournament_id,
+            "weightclass": self.weightclass,
+            "name": self.name,
+            "state": self.state,
+            "calledSince": self.called_since,
+            "activeSince": self.active_since,
+            "resultAnnotation": self.result_annotation,
+            "slots": [slot.to_json() for slot in self.slots],
+        }
+
+
+class EventModel:
+    __slots__ = ("source", "matches", "players", "build_time")
+
+    def __init__(self, games: list, players: list, source: tuple = ()):
+        start_build = perf_counter()
+
+        # Whatever identifies the data this was built from, as with PlayerIndex.
+        self.source = source
+        self.matches = tuple(Match(row) for row in games)
+        # (tournament_id, player_id) -> Player
+        self.players = {}
+        for row in players:
+            player = Player(row)
+            self.players[(player.tournament_id, player.id)] = player
+
+        self.build_time = perf_counter() - start_build
+
+    def player(self, match: Match, slot: Slot):
+        return self.players.get((match.tournament_id, slot.player_id))
+
+
+def normalized_payload(model: EventModel, matches) -> dict:
+    """`matches` (from `model`) as {"matches": [...], "players": {tournamentID: {playerID: {...}}}}.
+
+    Only players some match in `matches` refers to are included."""
+    players = {}
+    for match in matches:
+        for slot in match.slots:
+            player = model.player(match, slot)
+            if player is not None:
+                division = players.setdefault(match.tournament_id, {})
+                if player.id not in division:
+                    division[player.id] = player.to_json()
+
+    return {
+        "matches": [match.to_json() for match in matches],
+        "players": players,
+    }
+
+
+_event_model = EventModel([], [])
+_event_model_lock = threading.Lock()
+
+
+def get_event_model() -> EventModel:
+    """The model for the current snapshot, built on first use after each publish.
+
+    Without the poller, it's rebuilt whenever the cache rows underneath change."""
+    global _event_model
+
+    from bracketeer.api_truefinals.cached_wrapper import (
+        getAllTournamentsMatchesSimple,
+        getAllTournamentsPlayers,
+    )
+    from bracketeer.api_truefinals.poller import poller_running
+    from bracketeer.api_truefinals.snapshot import current_snapshot
+
+    from_snapshot = poller_running()
+    if from_snapshot:
+        source = ("snapshot", current_snapshot().version)
+        if source == _event_model.source:
+            return _event_model
+
+    games = getAllTournamentsMatchesSimple()
+    players = getAllTournamentsPlayers()
+    if not from_snapshot:
+        source = (
+            "rows",
+            tuple(
+                sorted({(row["tournamentID"], row["staleness_time"]) for row in games}),
+            ),
+            tuple(
+                sorted(
+                    {
+                        (row["root_tournament_fk"], row["staleness_time"])
+                        for row in players
+                    },
+                ),
+            ),
+        )
+
+    with _event_model_lock:
+        if source != _event_model.source:
+            new_model = EventModel(games, players, source)
+            logging.info(
+                f"Event model build took {new_model.build_time:.4f}s for "
+                f"{len(new_model.matches)} matches and {len(new_model.players)} players.",
+            )
+            _event_model = new_model
+
+    return _event_model
@@ -0,0 +1,50 @@
+import logging
+from time import perf_counter
+from typing import Optional
+
+"""
+Lookup table for players across every division, keyed on
+(tournament_id, player_id).
+
+One of these is built each time the players data changes, then swapped in
+whole; nothing ever edits an index after it's built, so readers don't need
+to lock anything to use it.
+"""
+
+
+class PlayerIndex:
+    def __init__(self, players: list, source: tuple = ()):
+        start_build = perf_counter()
+
+        # Whatever identifies the players data this was built from, so we
+        # can tell when it needs rebuilding.
+        self.source = source
+        self._players = {
+            (player["root_tournament_fk"], player["id"]): player for player in players
+        }
+
+        self.hits = 0
+        self.misses = 0
+        self.build_time = perf_counter() - start_build
+
+    def __len__(self) -> int:
+        return len(self._players)
+
+    def lookup(self, tournamentID: str, playerID: str) -> Optional[dict]:
+        player = self._players.get((tournamentID, playerID))
+        if player is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return player
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / lookups
+
+    def log_retirement(self):
+        logging.info(
+            f"Retiring player index of {len(self)} players after {self.hits + self.misses} lookups ({self.hit_rate():.1%} hit rate).",
+        )
@@ -0,0 +1,179 @@
+import logging
+from datetime import datetime
+from time import perf_counter
+
+from flask_apscheduler import APScheduler
+
+from bracketeer.api_truefinals.cached_api import (
+    cache_retention_setting,
+    division_api_path,
+    enforce_cache_retention,
+    last_persisted_response,
+    refresh_division,
+)
+from bracketeer.api_truefinals.snapshot import (
+    SNAPSHOT_KINDS,
+    current_snapshot,
+    publish_division,
+)
+from bracketeer.config import settings as arena_settings
+
+"""
+Background refresh of the TrueFinals data for every division in the event.
+
+Each (division, kind) pair gets its own interval job, so a slow players
+fetch for one division never holds up the games for another.  Every run
+goes upstream (conditionally, so an unchanged division is a cheap 304)
+and stores what it got in the same cache as everything else, then
+publishes it into the event snapshot that the web routes read from.  A
+failed fetch falls back on the cache's last good copy.
+
+Intervals default to the cache expiries, and can be overridden per kind in
+event.json with `"poll_intervals": {"games": 10}` or per division with
+`"poll_intervals"` on the tournament key itself.
+
+Before the first poll, warm_start() fills the snapshot from whatever was
+last saved to tf_lru.sqlite, however old, so screens have something to show
+straight after a restart instead of waiting on a round of cold fetches.
+Those divisions are marked stale in the snapshot until a poll refreshes them.
+"""
+
+scheduler = APScheduler()
+
+DEFAULT_POLL_INTERVALS = {
+    "games": 15,
+    "players": 5 * 60,
+    "locations": 60 * 60,
+}
+
+# (kind, tournament_id) -> body_hash of what we last published for it.
+_published_hashes = {}
+
+
+def poller_running() -> bool:
+    return scheduler.running
+
+
+def _poll_interval(kind: str, tournament_key: dict) -> int:
+    if "poll_intervals" in tournament_key and kind in tournament_key["poll_intervals"]:
+        return tournament_key["poll_intervals"][kind]
+
+    event_intervals = arena_settings.get("poll_intervals", {})
+    if kind in event_intervals:
+        return event_intervals[kind]
+
+    return DEFAULT_POLL_INTERVALS[kind]
+
+
+def poll_division(kind: str, tournament_key: dict):
+    _current_data = refresh_division(kind, tournament_key["id"])
+
+    if len(_current_data) == 0:
+        logging.warning(
+            f"Poll of {kind} for {tournament_key['id']} returned nothing, keeping the last snapshot.",
+        )
+        return
+
+    if _current_data[0]["stale"]:
+        logging.warning(
+            f"Poll of {kind} for {tournament_key['id']} could only get a copy {_current_data[0]['age']:.0f}s old.",
+        )
+
+    # Unchanged upstream: the cache has already noted it's fresh, and there's
+    # nothing to re-annotate, re-index or broadcast.
+    division = (kind, tournament_key["id"])
+    if _published_hashes.get(division) == _current_data[0]["body_hash"]:
+        # ...unless it's gone stale (the refresh failed) or back to current,
+        # which the screens and the snapshot's `stale` set need to hear about.
+        if (division in current_snapshot().stale) == _current_data[0]["stale"]:
+            logging.debug(
+                f"{kind} for {tournament_key['id']} unchanged, not republishing.",
+            )
+            return
+
+    publish_division(
+        kind,
+        tournament_key,
+        _current_data[0]["response"],
+        _current_data[0]["last_requested"],
+        stale=_current_data[0]["stale"],
+    )
+    _published_hashes[division] = _current_data[0]["body_hash"]
+
+
+def _polled_keys() -> list:
+    polled = []
+    for tournament_key in arena_settings["tournament_keys"]:
+        if tournament_key.get("tourn_type", "truefinals") != "truefinals":
+            logging.info(
+                f"Not polling {tournament_key['id']}, {tournament_key.get('tourn_type')} is not supported yet.",
+            )
+            continue
+        polled.append(tournament_key)
+    return polled
+
+
+def warm_start(tournament_keys: list):
+    """Publishes the newest saved copy of every division, before any fetching."""
+    start = perf_counter()
+    ages = []
+
+    for tournament_key in tournament_keys:
+        for kind in SNAPSHOT_KINDS:
+            _last_data = last_persisted_response(
+                division_api_path(kind, tournament_key["id"]),
+            )
+            if len(_last_data) == 0:
+                continue
+
+            publish_division(
+                kind,
+                tournament_key,
+                _last_data[0]["response"],
+                _last_data[0]["last_requested"],
+                stale=True,
+            )
+            _published_hashes[(kind, tournament_key["id"])] = _last_data[0]["body_hash"]
+            ages.append(_last_data[0]["age"])
+
+    if ages:
+        logging.warning(
+            f"Warm started {len(ages)} of {len(tournament_keys) * len(SNAPSHOT_KINDS)} divisions from the API cache "
+            f"in {perf_counter() - start:.2f}s, {min(ages):.0f}s to {max(ages):.0f}s old until refreshed.",
+        )
+    else:
+        logging.info(
+            "Nothing in the API cache to warm start from, waiting on the first polls.",
+        )
+
+
+def init_poller(app):
+    scheduler.init_app(app)
+
+    tournament_keys = _polled_keys()
+    warm_start(tournament_keys)
+
+    for tournament_key in tournament_keys:
+        for kind in SNAPSHOT_KINDS:
+            scheduler.add_job(
+                id=f"tf_poll_{kind}_{tournament_key['id']}",
+                func=poll_division,
+                args=(kind, tournament_key),
+                trigger="interval",
+                seconds=_poll_interval(kind, tournament_key),
+                next_run_time=datetime.now(),  # Fetch right away, don't wait a full interval.
+                max_instances=1,
+                coalesce=True,
+            )
+
+    scheduler.add_job(
+        id="tf_cache_retention",
+        func=enforce_cache_retention,
+        trigger="interval",
+        seconds=cache_retention_setting("interval"),
+        max_instances=1,
+        coalesce=True,
+    )
+
+    scheduler.start()
+    logging.info(f"TrueFinals poller started with {len(scheduler.get_jobs())} jobs.")
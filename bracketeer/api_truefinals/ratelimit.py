@@ -0,0 +1,176 @@
+import logging
+import threading
+from time import monotonic, time
+from typing import Optional
+
+from bracketeer.config import settings as arena_settings
+
+"""
+Shared token bucket for everything we send to TrueFinals.
+
+TrueFinals allows 10 requests per 10 seconds, but the web panel the bracket
+runners are clicking around in counts against the same budget.  We keep
+`reserve` of those requests back for the panel (half, by default) and refill
+the rest evenly over the window.
+
+Every response carries the real budget in its headers:
+
+X-RateLimit-Limit: Maximum number of requests allowed within a window (10s).
+X-RateLimit-Remaining: How many requests the user has left within the current window.
+X-RateLimit-Reset: Unix timestamp in milliseconds when the limits are reset.
+
+so after each request we pull our local idea of the budget back in line with
+what TrueFinals says, which also accounts for whatever the panel has used.
+
+Override the defaults in event.json with
+`"truefinals_rate_limit": {"limit": 10, "window": 10, "reserve": 5}`.
+"""
+
+
+class RateLimitedError(Exception):
+    """No request budget is available right now, use stale data instead."""
+
+
+class TokenBucket:
+    def __init__(self, limit: int = 10, window: float = 10.0, reserve: int = 5):
+        self.limit = limit
+        self.window = window
+        self.reserve = reserve
+
+        self._tokens = float(self.capacity)
+        self._updated = monotonic()
+        # Set from the reset header when TrueFinals says we're out for this window.
+        self._blocked_until = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def capacity(self) -> int:
+        return max(1, self.limit - self.reserve)
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(
+            float(self.capacity),
+            self._tokens + elapsed * (self.capacity / self.window),
+        )
+
+    def _seconds_until_token(self, now: float) -> float:
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) * (self.window / self.capacity)
+
+    def tokens_available(self) -> float:
+        with self._condition:
+            now = monotonic()
+            self._refill(now)
+            if now < self._blocked_until:
+                return 0.0
+            return self._tokens
+
+    def try_acquire(self) -> bool:
+        return self.acquire(timeout=0)
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Takes a token, waiting up to `timeout` seconds (forever if None) for one."""
+        deadline = None if timeout is None else monotonic() + timeout
+
+        with self._condition:
+            while True:
+                now = monotonic()
+                self._refill(now)
+                wait_for = self._seconds_until_token(now)
+
+                if wait_for <= 0:
+                    self._tokens -= 1
+                    return True
+
+                if deadline is not None:
+                    if now >= deadline:
+                        return False
+                    wait_for = min(wait_for, deadline - now)
+
+                self._condition.wait(wait_for)
+
+    def calibrate(self, headers):
+        """Pulls the bucket in line with the X-RateLimit-* headers of a response."""
+        headers = {key.lower(): value for key, value in headers.items()}
+        try:
+            limit = int(headers["x-ratelimit-limit"])
+            remaining = int(headers["x-ratelimit-remaining"])
+            reset = float(headers["x-ratelimit-reset"])
+        except (KeyError, TypeError, ValueError):
+            return
+
+        with self._condition:
+            now = monotonic()
+            self._refill(now)
+
+            if limit > 0 and limit != self.limit:
+                logging.info(f"TrueFinals rate limit is now {limit} per window.")
+                self.limit = limit
+
+            # Whatever the panel has used comes out of our share first.
+            ours = max(0, remaining - self.reserve)
+            self._tokens = min(self._tokens, float(ours))
+
+            if ours == 0:
+                self._block_until_reset(now, reset)
+
+            self._condition.notify_all()
+
+    def penalize(self, headers):
+        """We got a 429 anyway, so stop until TrueFinals says the window is over."""
+        headers = {key.lower(): value for key, value in headers.items()}
+        with self._condition:
+            now = monotonic()
+            self._tokens = 0.0
+            self._updated = now
+
+            try:
+                reset = float(headers["x-ratelimit-reset"])
+            except (KeyError, TypeError, ValueError):
+                reset = 0
+
+            self._block_until_reset(now, reset)
+            logging.warning(
+                f"Rate limited by TrueFinals, holding off for {self._blocked_until - now:.1f}s.",
+            )
+
+    def _block_until_reset(self, now: float, reset: float):
+        # The header is in ms, but be forgiving of seconds as well.
+        if reset > 1e11:
+            reset = reset / 1000
+
+        wait_for = reset - time()
+        # A missing or nonsensical reset means we just sit out one full window.
+        if wait_for <= 0 or wait_for > self.window:
+            wait_for = self.window
+
+        self._blocked_until = max(self._blocked_until, now + wait_for)
+
+
+def _limiter_from_settings() -> TokenBucket:
+    limits = arena_settings.get("truefinals_rate_limit", {})
+    return TokenBucket(
+        limit=limits.get("limit", 10),
+        window=limits.get("window", 10.0),
+        reserve=limits.get("reserve", 5),
+    )
+
+
+_truefinals_limiter = None
+_truefinals_limiter_lock = threading.Lock()
+
+
+def truefinals_limiter() -> TokenBucket:
+    """The one bucket every TrueFinals request shares, set up from event.json on first use."""
+    global _truefinals_limiter
+
+    if _truefinals_limiter is None:
+        with _truefinals_limiter_lock:
+            if _truefinals_limiter is None:
+                _truefinals_limiter = _limiter_from_settings()
+    return _truefinals_limiter
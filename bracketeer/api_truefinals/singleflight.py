@@ -0,0 +1,61 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+"""
+Collapses concurrent calls for the same key into one.
+
+The first caller for a key (the leader) runs the function; anyone else who
+asks for that key while it's still running waits on the leader's result
+instead of doing the work again.  Once the leader finishes the key is
+forgotten, so the next call after that runs fresh.
+"""
+
+
+class InFlightError(Exception):
+    """Someone else is already fetching this and the caller chose not to wait."""
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def in_flight(self, key) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def do(
+        self,
+        key,
+        fn: Callable,
+        wait: bool = True,
+        timeout: Optional[float] = None,
+    ):
+        """Runs `fn` for `key`, or shares the result of the call already running.
+
+        Followers re-raise whatever the leader raised.  With `wait=False` a
+        follower gets InFlightError right away instead of blocking."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            if not wait:
+                raise InFlightError(key)
+            return future.result(timeout=timeout)
+
+        try:
+            result = fn()
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
@@ -0,0 +1,165 @@
+import logging
+import threading
+from dataclasses import dataclass, field, replace
+from time import time
+from types import MappingProxyType
+from typing import Mapping
+
+"""
+The event snapshot is the in-memory view of everything we know about the
+event's divisions (games, players and locations), as last fetched by the
+background poller.
+
+Request handlers should only ever *read* the current snapshot; it is never
+mutated in place.  Each publish builds a new snapshot with a bumped version
+and swaps it in under a lock, so a reader holding an old one keeps seeing a
+consistent picture of the event until it asks again.
+
+Rows inside a snapshot are shared between every request that reads them.
+Copy before you mutate them (see getAllTournamentsMatchesWithPlayers).
+"""
+
+SNAPSHOT_KINDS = ("games", "players", "locations")
+
+
+@dataclass(frozen=True)
+class EventSnapshot:
+    version: int = 0
+    published_at: float = 0.0
+    # kind -> tournament_id -> tuple of annotated rows.
+    divisions: Mapping[str, Mapping[str, tuple]] = field(
+        default_factory=lambda: MappingProxyType(
+            {kind: MappingProxyType({}) for kind in SNAPSHOT_KINDS},
+        ),
+    )
+    # (kind, tournament_id) -> the `last_requested` of the cache row it came from.
+    fetched_at: Mapping[tuple, float] = field(
+        default_factory=lambda: MappingProxyType({}),
+    )
+    # (kind, tournament_id) of divisions we're showing an old copy of: what
+    # was on disk from before a restart, or a poll that couldn't refresh.
+    stale: frozenset = frozenset()
+
+    @property
+    def games(self) -> Mapping[str, tuple]:
+        return self.divisions["games"]
+
+    @property
+    def players(self) -> Mapping[str, tuple]:
+        return self.divisions["players"]
+
+    @property
+    def locations(self) -> Mapping[str, tuple]:
+        return self.divisions["locations"]
+
+    def has_division(self, kind: str, tournament_id: str) -> bool:
+        return (kind, tournament_id) in self.fetched_at
+
+    def division_age(self, kind: str, tournament_id: str) -> float:
+        """Seconds since the division's rows were fetched from TrueFinals."""
+        return time() - self.fetched_at[(kind, tournament_id)]
+
+
+_snapshot_lock = threading.Lock()
+_current_snapshot = EventSnapshot()
+
+# Called as callback(old, new) after every publish, from the publishing thread.
+# Publishes are serialized through the snapshot lock, subscribers included, so
+# they always see consecutive versions in order.  Don't publish from one.
+_subscribers = []
+
+
+def current_snapshot() -> EventSnapshot:
+    return _current_snapshot
+
+
+def subscribe(callback):
+    _subscribers.append(callback)
+    return callback
+
+
+def _notify_subscriber(callback, old: EventSnapshot, new: EventSnapshot):
+    try:
+        callback(old, new)
+    except Exception:
+        logging.exception(f"Snapshot subscriber {callback!r} failed on v{new.version}.")
+
+
+def _notify_subscribers(old: EventSnapshot, new: EventSnapshot):
+    for callback in _subscribers:
+        _notify_subscriber(callback, old, new)
+
+
+def annotate_division_rows(
+    kind: str,
+    tournament_key: dict,
+    rows: list,
+    last_requested: float,
+) -> tuple:
+    """Tags raw TrueFinals rows with the division they belong to.
+
+    Returns new dicts, the rows passed in are left alone."""
+    _current_fk = tournament_key["id"]
+    annotated = []
+
+    for row in rows:
+        row = dict(row)
+        if kind == "games":
+            row["tournamentID"] = _current_fk
+            row["weightclass"] = tournament_key["weightclass"]
+        else:
+            row["root_tournament_fk"] = _current_fk
+        row["staleness_time"] = last_requested
+        annotated.append(row)
+
+    return tuple(annotated)
+
+
+def publish_division(
+    kind: str,
+    tournament_key: dict,
+    rows: list,
+    last_requested: float,
+    stale: bool = False,
+) -> EventSnapshot:
+    global _current_snapshot
+
+    if kind not in SNAPSHOT_KINDS:
+        raise ValueError(f"Unknown snapshot kind {kind!r}.")
+
+    annotated = annotate_division_rows(kind, tournament_key, rows, last_requested)
+
+    with _snapshot_lock:
+        old = _current_snapshot
+
+        divisions = dict(old.divisions)
+        kind_rows = dict(divisions[kind])
+        kind_rows[tournament_key["id"]] = annotated
+        divisions[kind] = MappingProxyType(kind_rows)
+
+        fetched_at = dict(old.fetched_at)
+        fetched_at[(kind, tournament_key["id"])] = last_requested
+
+        stale_divisions = set(old.stale)
+        if stale:
+            stale_divisions.add((kind, tournament_key["id"]))
+        else:
+            stale_divisions.discard((kind, tournament_key["id"]))
+
+        _current_snapshot = replace(
+            old,
+            version=old.version + 1,
+            published_at=time(),
+            divisions=MappingProxyType(divisions),
+            fetched_at=MappingProxyType(fetched_at),
+            stale=frozenset(stale_divisions),
+        )
+        new = _current_snapshot
+
+        logging.info(
+            f"Published snapshot v{new.version} ({kind} for {tournament_key['id']}, {len(annotated)} rows"
+            f"{', stale' if stale else ''}).",
+        )
+        _notify_subscribers(old, new)
+
+    return new
@@ -0,0 +1,347 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter, sleep
+
+from bracketeer.bench.fake_truefinals import FakeTrueFinals
+
+# Also the --help text.
+USAGE = """
+Benchmarks for the match data path, against a generated event served by
+FakeTrueFinals instead of the real site.
+
+    python -m bracketeer.bench                      # every size
+    python -m bracketeer.bench --size club -n 500
+    python -m bracketeer.bench --size championship --json results.json
+
+Each size runs in its own process and its own scratch directory (with a
+generated event.json / .secrets.json), since settings and the SQLite files
+are picked up from the working directory (on first use) and kept for the
+life of the process.  Nothing is written next to your real event, and the
+scratch directory is removed once the size is done.
+
+Cases, roughly in the order a request meets them:
+    cache: ...           getAllGames and friends, the API cache on its own
+    players: index       building the PlayerIndex from every division
+    inline: ...          _json_api_stub with no poller, everything via the cache
+    snapshot: ...        the same with the poller running, read off the snapshot
+    GET ...              the upcoming routes through Flask's test client
+"""
+
+BRACKETEER_ROOT = Path(__file__).resolve().parent.parent
+
+# divisions x players; about two games per player in each.
+SIZES = {
+    "club": {"divisions": 2, "players": 12},
+    "regional": {"divisions": 4, "players": 48},
+    "championship": {"divisions": 6, "players": 84},
+}
+
+
+def _summarize(name: str, durations: list) -> dict:
+    ordered = sorted(durations)
+    total = sum(ordered)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+
+    return {
+        "case": name,
+        "n": len(ordered),
+        "mean_ms": total / len(ordered) * 1000,
+        "p50_ms": pct(50),
+        "p90_ms": pct(90),
+        "p99_ms": pct(99),
+        "ops_per_s": len(ordered) / total if total else float("inf"),
+    }
+
+
+def _time_case(name: str, fn, iterations: int, setup=None, warmup: int = 3) -> dict:
+    for _ in range(warmup):
+        if setup is not None:
+            setup()
+        fn()
+
+    durations = []
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+        start = perf_counter()
+        fn()
+        durations.append(perf_counter() - start)
+
+    return _summarize(name, durations)
+
+
+def _write_scratch_event(directory: Path, fake: FakeTrueFinals):
+    (directory / "event.json").write_text(
+        json.dumps(
+            {
+                "event_name": "Benchmark Event",
+                "match_duration": 150,
+                "tournament_keys": fake.division_keys(),
+                "tournament_cages": [{"name": "Cage 1", "id": 1}],
+                # The fake's own X-RateLimit-* headers decide how much budget there really is.
+                "truefinals_rate_limit": {
+                    "limit": fake.rate_limit,
+                    "window": fake.rate_window,
+                    "reserve": 0,
+                },
+            },
+        ),
+    )
+    (directory / ".secrets.json").write_text(
+        json.dumps({"truefinals": {"user_id": "bench", "api_key": "bench"}}),
+    )
+
+
+def run_size(size: str, iterations: int, args, scratch: Path) -> dict:
+    fake = FakeTrueFinals(
+        divisions=args.divisions or SIZES[size]["divisions"],
+        players=args.players or SIZES[size]["players"],
+        rate_limit=args.rate_limit,
+        latency=args.latency,
+    )
+
+    _write_scratch_event(scratch, fake)
+    os.chdir(scratch)
+
+    # Settings and the SQLite files are read from the working directory on first use.
+    import logging
+
+    logging.basicConfig(level=args.log_level)
+
+    from flask import Flask
+
+    from bracketeer.api_truefinals import bodies, cached_api
+    from bracketeer.api_truefinals.cached_wrapper import (
+        getAllTournamentsMatchesWithPlayers,
+        getAllTournamentsPlayers,
+    )
+    from bracketeer.api_truefinals.player_index import PlayerIndex
+    from bracketeer.api_truefinals.poller import init_poller, scheduler
+    from bracketeer.api_truefinals.snapshot import current_snapshot
+    from bracketeer.matches.match_results import (
+        _json_api_stub,
+        filtering_func,
+        match_results,
+    )
+    from bracketeer.util.db import db_writer
+
+    fake.install()
+    tournament_ids = list(fake.tournaments)
+    games_endpoint = f"/v1/tournaments/{tournament_ids[0]}/games"
+
+    def forget_cache():
+        cached_api._latest_responses.clear()
+        with bodies._parsed_bodies_lock:
+            bodies._parsed_bodies.clear()
+
+    results = []
+    n = iterations
+
+    # Fill the cache for every division first, so the reads below are hits.
+    for tournament_id in tournament_ids:
+        cached_api.getAllGames(tournament_id)
+        cached_api.getAllPlayersInTournament(tournament_id)
+        cached_api.getEventLocations(tournament_id)
+
+    results.append(
+        _time_case(
+            "cache: hit (memory)",
+            lambda: cached_api.getAllGames(tournament_ids[0]),
+            n,
+        ),
+    )
+    results.append(
+        _time_case(
+            "cache: hit (sqlite + decode)",
+            lambda: cached_api.getAllGames(tournament_ids[0]),
+            n,
+            setup=forget_cache,
+        ),
+    )
+    results.append(
+        _time_case(
+            "cache: refresh, unchanged (304)",
+            lambda: cached_api._refresh_endpoint(games_endpoint),
+            n,
+        ),
+    )
+    results.append(
+        _time_case(
+            "cache: refresh, changed body",
+            lambda: cached_api._refresh_endpoint(games_endpoint),
+            n,
+            setup=fake.touch,
+        ),
+    )
+
+    players = getAllTournamentsPlayers()
+    results.append(
+        _time_case("players: index build", lambda: PlayerIndex(players, ("bench",)), n),
+    )
+
+    results.append(
+        _time_case(
+            "inline: matches with players",
+            lambda: getAllTournamentsMatchesWithPlayers(filtering_func),
+            n,
+        ),
+    )
+    results.append(_time_case("inline: _json_api_stub", _json_api_stub, n))
+
+    app = Flask(
+        "bracketeer.bench",
+        static_folder=str(BRACKETEER_ROOT / "static"),
+        template_folder=str(BRACKETEER_ROOT / "templates"),
+    )
+    app.register_blueprint(match_results, url_prefix="/matches")
+
+    init_poller(app)
+    deadline = perf_counter() + 60
+    while perf_counter() < deadline and not all(
+        current_snapshot().has_division(kind, tournament_id)
+        for kind in ("games", "players")
+        for tournament_id in tournament_ids
+    ):
+        sleep(0.05)
+
+    results.append(_time_case("snapshot: _json_api_stub", _json_api_stub, n))
+
+    client = app.test_client()
+    results.append(
+        _time_case(
+            "GET /matches/upcoming.json",
+            lambda: client.get("/matches/upcoming.json"),
+            n,
+        ),
+    )
+    results.append(
+        _time_case("GET /matches/upcoming", lambda: client.get("/matches/upcoming"), n),
+    )
+
+    scheduler.shutdown(wait=False)
+    # So nothing's still writing into the scratch directory when it's removed.
+    db_writer.flush(timeout=5)
+
+    upcoming = len(_json_api_stub())
+    return {
+        "size": size,
+        "divisions": len(tournament_ids),
+        "players": len(players),
+        "games": sum(len(division["games"]) for division in fake.tournaments.values()),
+        "upcoming": upcoming,
+        "upstream_requests": fake.requests,
+        "results": results,
+    }
+
+
+def _print_report(report: dict):
+    print(
+        f"\n== {report['size']}: {report['divisions']} divisions, {report['players']} players, "
+        f"{report['games']} games ({report['upcoming']} upcoming), {report['upstream_requests']} upstream requests",
+    )
+    print(
+        f"{'case':<34}{'n':>6}{'mean ms':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'ops/s':>12}",
+    )
+    for row in report["results"]:
+        print(
+            f"{row['case']:<34}{row['n']:>6}{row['mean_ms']:>10.3f}{row['p50_ms']:>10.3f}"
+            f"{row['p90_ms']:>10.3f}{row['p99_ms']:>10.3f}{row['ops_per_s']:>12.1f}",
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m bracketeer.bench",
+        description=USAGE,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--size", choices=(*SIZES, "all"), default="all")
+    parser.add_argument("-n", "--iterations", type=int, default=200)
+    parser.add_argument(
+        "--divisions",
+        type=int,
+        help="Override the size's division count.",
+    )
+    parser.add_argument(
+        "--players",
+        type=int,
+        help="Override the size's players per division.",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=int,
+        default=10000,
+        help="Requests per 10s the fake allows.",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Seconds the fake takes per request.",
+    )
+    parser.add_argument("--json", help="Also write the results here.")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--report-fd", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    # run_size moves into its scratch directory before we get to write this.
+    if args.json:
+        args.json = Path(args.json).resolve()
+
+    if args.size != "all":
+        home = os.getcwd()
+        scratch = Path(tempfile.mkdtemp(prefix=f"bracketeer_bench_{args.size}_"))
+        try:
+            report = run_size(args.size, args.iterations, args, scratch)
+        finally:
+            os.chdir(home)
+            shutil.rmtree(scratch, ignore_errors=True)
+
+        if args.report_fd is not None:
+            with os.fdopen(args.report_fd, "w") as out:
+                json.dump(report, out)
+        else:
+            _print_report(report)
+            if args.json:
+                args.json.write_text(json.dumps([report], indent=2))
+        # Background threads (scheduler, writer, fetch pools) shouldn't hold us up.
+        os._exit(0)
+
+    reports = []
+    for size in SIZES:
+        read_fd, write_fd = os.pipe()
+        command = [
+            sys.executable,
+            "-m",
+            "bracketeer.bench",
+            *sys.argv[1:],
+            "--size",
+            size,
+            "--report-fd",
+            str(write_fd),
+        ]
+        child = subprocess.Popen(command, pass_fds=(write_fd,))
+        os.close(write_fd)
+        with os.fdopen(read_fd) as report_in:
+            payload = report_in.read()
+        child.wait()
+
+        if child.returncode != 0 or not payload:
+            print(f"{size} run failed (exit {child.returncode}).", file=sys.stderr)
+            continue
+        reports.append(json.loads(payload))
+        _print_report(reports[-1])
+
+    if args.json:
+        args.json.write_text(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    main()
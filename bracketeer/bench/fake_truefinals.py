@@ -0,0 +1,214 @@
+import hashlib
+import json
+import random
+import re
+import threading
+from time import sleep, time
+
+import httpx
+
+"""
+A stand-in for the bits of the TrueFinals API we use, serving a generated
+event, so the benchmarks (and anyone poking at things offline) never touch
+the real site or its rate limit.
+
+    fake = FakeTrueFinals(divisions=4, players=48)
+    fake.install()  # swaps api.tf_api_session for one that talks to `fake`
+
+Each division is a double elimination-ish bracket: about two games per
+player, with states drawn from `state_mix`.  Responses carry ETags (and
+honour If-None-Match) and X-RateLimit-* headers counted against
+`rate_limit` requests per `rate_window` seconds, like the real thing.
+`touch()` changes one game so the next games fetch is a new body.
+"""
+
+# Roughly what a bracket looks like a few hours in.
+DEFAULT_STATE_MIX = {
+    "done": 0.45,
+    "called": 0.08,
+    "ready": 0.04,
+    "active": 0.04,
+    "available": 0.14,
+    "unavailable": 0.25,
+}
+
+WEIGHTCLASSES = ("ANT", "BTL", "PLANT", "FAIRY", "BEETLE", "HOBBY", "FEATHER", "HEAVY")
+
+_ENDPOINT = re.compile(
+    r"^/api/v1/tournaments/(?P<tid>\w+)(?:/(?P<kind>games|players|locations))?$",
+)
+
+
+def _hex_id(rng: random.Random) -> str:
+    return "".join(rng.choice("0123456789abcdef") for _ in range(16))
+
+
+class FakeTrueFinals:
+    def __init__(
+        self,
+        divisions: int = 2,
+        players: int = 16,
+        state_mix: dict = None,
+        locations: int = 2,
+        rate_limit: int = 10000,
+        rate_window: float = 10.0,
+        latency: float = 0.0,
+        seed: int = 1,
+    ):
+        self.rng = random.Random(seed)
+        self.state_mix = state_mix or DEFAULT_STATE_MIX
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.latency = latency
+
+        self.requests = 0
+        self._window_start = time()
+        self._window_count = 0
+        self._lock = threading.Lock()
+
+        self.tournaments = {}
+        for index in range(divisions):
+            tournament_id = _hex_id(self.rng)
+            self.tournaments[tournament_id] = self._generate_division(
+                tournament_id,
+                WEIGHTCLASSES[index % len(WEIGHTCLASSES)],
+                players,
+                locations,
+            )
+
+    def _generate_division(
+        self,
+        tournament_id: str,
+        weightclass: str,
+        players: int,
+        locations: int,
+    ) -> dict:
+        now_ms = int(time() * 1000)
+        roster = [
+            {
+                "id": _hex_id(self.rng),
+                "name": f"{weightclass.title()} Bot {number}",
+                "photoUrl": None,
+                "seed": number,
+                "wins": self.rng.randint(0, 4),
+                "losses": self.rng.randint(0, 2),
+                "ties": 0,
+                "isBye": False,
+                "isDisqualified": False,
+                "lastPlayTime": now_ms - self.rng.randint(0, 3_600_000),
+                "lastBracketGameID": None,
+                "placement": None,
+                "profileInfo": None,
+            }
+            for number in range(1, players + 1)
+        ]
+
+        states = list(self.state_mix)
+        weights = [self.state_mix[state] for state in states]
+        games = []
+        for number in range(1, max(2 * players - 1, 1) + 1):
+            state = self.rng.choices(states, weights)[0]
+            game = {
+                "id": f"{weightclass[:1]}{number}",
+                "name": f"{weightclass[:1]}-{number}",
+                "state": state,
+                "calledSince": None,
+                "activeSince": None,
+                "slots": [],
+            }
+            if state in ("called", "ready"):
+                game["calledSince"] = now_ms - self.rng.randint(0, 900_000)
+            if state == "active":
+                game["activeSince"] = now_ms - self.rng.randint(0, 180_000)
+
+            if state == "unavailable":
+                game["slots"] = [
+                    {
+                        "playerID": None,
+                        "prevGameID": f"{weightclass[:1]}{self.rng.randint(1, number)}",
+                    }
+                    for _ in range(2)
+                ]
+            else:
+                red, blue = (
+                    self.rng.sample(roster, 2)
+                    if len(roster) > 1
+                    else (roster[0], roster[0])
+                )
+                game["slots"] = [{"playerID": red["id"]}, {"playerID": blue["id"]}]
+            games.append(game)
+
+        return {
+            "weightclass": weightclass,
+            "event": {"id": tournament_id, "title": f"{weightclass} division"},
+            "games": games,
+            "players": roster,
+            "locations": [
+                {"id": f"loc{number}", "name": f"Cage {number}"}
+                for number in range(1, locations + 1)
+            ],
+        }
+
+    def division_keys(self) -> list:
+        """tournament_keys entries for event.json."""
+        return [
+            {
+                "id": tournament_id,
+                "weightclass": division["weightclass"],
+                "tourn_type": "truefinals",
+            }
+            for tournament_id, division in self.tournaments.items()
+        ]
+
+    def touch(self):
+        """Changes one game somewhere, so the next fetch of that division's games is a new body."""
+        division = self.rng.choice(list(self.tournaments.values()))
+        game = self.rng.choice(division["games"])
+        game["calledSince"] = int(time() * 1000)
+
+    def _rate_limit_headers(self) -> tuple:
+        now = time()
+        with self._lock:
+            if now - self._window_start >= self.rate_window:
+                self._window_start = now
+                self._window_count = 0
+            self._window_count += 1
+            self.requests += 1
+            over_limit = self._window_count > self.rate_limit
+            remaining = max(0, self.rate_limit - self._window_count)
+            reset = int((self._window_start + self.rate_window) * 1000)
+
+        headers = {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": str(reset),
+        }
+        return headers, over_limit
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        if self.latency:
+            sleep(self.latency)
+
+        headers, over_limit = self._rate_limit_headers()
+        if over_limit:
+            return httpx.Response(429, headers=headers)
+
+        match = _ENDPOINT.match(request.url.path)
+        if match is None or match["tid"] not in self.tournaments:
+            return httpx.Response(404, json={"error": "Not found"}, headers=headers)
+
+        division = self.tournaments[match["tid"]]
+        body = json.dumps(division[match["kind"] or "event"]).encode()
+
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        headers["ETag"] = etag
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304, headers=headers)
+
+        headers["Content-Type"] = "application/json"
+        return httpx.Response(200, content=body, headers=headers)
+
+    def install(self):
+        from bracketeer.api_truefinals import api
+
+        api.tf_api_session = httpx.Client(transport=httpx.MockTransport(self.handle))
@@ -0,0 +1,421 @@
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+from pathlib import Path
+from time import perf_counter, sleep, time
+
+# Also the --help text.
+USAGE = """
+Socket.IO fan-out load test: lots of simulated screens in cage rooms, with a
+controller per cage driving the traffic a real match does, against a
+running Bracketeer.
+
+    python -m bracketeer.bench.socket_load --url http://localhost --cages 4,16,64
+
+Each cage gets one controller and `--screens-per-cage` screens (default 4:
+two vertical team screens, the judges' screen and a stream overlay), all
+joined to `cage_no_{id}`.  Every controller sends
+
+    timer_event      at --timer-hz (the old ctimer tick, 10/s)
+    timer_bg_event   every --bg-interval seconds
+    player_ready     every --ready-interval seconds
+
+each stamped with when it was sent, and every client timestamps what comes
+back, so we get emit-to-receive latency per event as the server relays it.
+With `--mode server` the controllers instead start and stop the server-side
+cage timer (timer_command) and we time the timer_state frames.
+
+`--pollers` adds that many screens reloading a page over plain HTTP every
+`--poll-interval` seconds, like the autoreloading queue screens do.
+
+`--cages` takes a list so one run ramps up; each step connects everyone,
+runs for `--duration`, disconnects and reports.  Pass `--server-pid` (on
+Linux) to also get the server's CPU use per step.
+
+Needs the Socket.IO client extras: `uv sync --group loadtest`.
+"""
+
+try:
+    import requests
+    import socketio
+    import websocket  # noqa: F401  (python-socketio's websocket transport)
+except ImportError:
+    sys.exit(
+        "The load test needs the Socket.IO client extras: uv sync --group loadtest",
+    )
+
+
+def _percentile(ordered: list, pct: float):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+class LatencyLog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.sent = {}
+        self.errors = {}
+        # Off while everyone's joining, so the frames sent on join don't count.
+        self.recording = False
+
+    def received(self, event: str, sent_at: float):
+        if not self.recording:
+            return
+        latency = (time() - sent_at) * 1000
+        with self._lock:
+            self.samples.setdefault(event, []).append(latency)
+
+    def count_error(self, event: str):
+        with self._lock:
+            self.errors[event] = self.errors.get(event, 0) + 1
+
+    def count_sent(self, event: str, recipients: int):
+        with self._lock:
+            self.sent[event] = self.sent.get(event, 0) + recipients
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = {event: sorted(values) for event, values in self.samples.items()}
+            sent = dict(self.sent)
+            errors = dict(self.errors)
+
+        return {
+            event: {
+                "expected": sent.get(event),
+                "received": len(values),
+                "errors": errors.get(event, 0),
+                "p50_ms": _percentile(values, 50),
+                "p90_ms": _percentile(values, 90),
+                "p99_ms": _percentile(values, 99),
+                "max_ms": values[-1] if values else None,
+            }
+            for event, values in samples.items()
+        }
+
+
+class SimulatedScreen:
+    def __init__(self, url: str, cage_id: int, log: LatencyLog):
+        self.url = url
+        self.cage_id = cage_id
+        self.log = log
+        self.client = socketio.Client(reconnection=False)
+
+        self.client.on("timer_event", self._on_timer_event)
+        self.client.on("timer_bg_event", self._on_stamped("timer_bg_event"))
+        self.client.on(
+            "control_player_ready_event",
+            self._on_stamped("control_player_ready_event"),
+        )
+        self.client.on("timer_state", self._on_timer_state)
+
+    def _on_timer_event(self, message):
+        try:
+            self.log.received("timer_event", float(message))
+        except (TypeError, ValueError):
+            pass  # Someone else's message (STOP etc.), not one of ours.
+
+    def _on_stamped(self, event: str):
+        def handler(payload):
+            if isinstance(payload, dict) and "sent_at" in payload:
+                self.log.received(event, payload["sent_at"])
+
+        return handler
+
+    def _on_timer_state(self, frame):
+        # Same machine, so the server's clock is ours.
+        self.log.received("timer_state", frame["server_time"] / 1000)
+
+    def connect(self):
+        self.client.connect(self.url, transports=["websocket"], wait_timeout=10)
+        self.client.emit("join_cage_request", {"cage_id": self.cage_id})
+
+    def disconnect(self):
+        if self.client.connected:
+            self.client.disconnect()
+
+
+class SimulatedController(SimulatedScreen):
+    def __init__(self, url: str, cage_id: int, log: LatencyLog, room_size: int, args):
+        super().__init__(url, cage_id, log)
+        self.room_size = room_size
+        self.args = args
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start_driving(self):
+        self._thread = threading.Thread(target=self._drive, daemon=True)
+        self._thread.start()
+
+    def stop_driving(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.args.mode == "server":
+            self.client.emit(
+                "timer_command",
+                {"cageID": self.cage_id, "command": "stop"},
+            )
+
+    def _emit_counted(self, event: str, payload, relayed_as: str = None):
+        self.client.emit(event, payload)
+        self.log.count_sent(relayed_as or event, self.room_size)
+
+    def _drive(self):
+        tick = 1 / self.args.timer_hz
+        next_tick = next_bg = next_ready = perf_counter()
+        running = False
+
+        while not self._stop.is_set():
+            now = perf_counter()
+
+            if self.args.mode == "relay" and now >= next_tick:
+                self._emit_counted(
+                    "timer_event",
+                    {"cageID": self.cage_id, "message": f"{time():.6f}"},
+                )
+                next_tick += tick
+            elif self.args.mode == "server" and now >= next_tick:
+                # Start / stop every couple of seconds.  No expected count: the server adds its
+                # own frames (countdown -> running, keyframes) on top of the one per command.
+                self.client.emit(
+                    "timer_command",
+                    {"cageID": self.cage_id, "command": "stop" if running else "start"},
+                )
+                running = not running
+                next_tick += 2
+
+            if now >= next_bg:
+                self._emit_counted(
+                    "timer_bg_event",
+                    {
+                        "cageID": self.cage_id,
+                        "color": "rgb(37, 37, 37)",
+                        "sent_at": time(),
+                    },
+                )
+                next_bg += self.args.bg_interval
+
+            if now >= next_ready:
+                self._emit_counted(
+                    "player_ready",
+                    {"cageID": self.cage_id, "playerColor": "red", "sent_at": time()},
+                    relayed_as="control_player_ready_event",
+                )
+                next_ready += self.args.ready_interval
+
+            self._stop.wait(
+                max(0, min(next_tick, next_bg, next_ready) - perf_counter()),
+            )
+
+
+class SimulatedPoller:
+    """A screen reloading a page every so often, timing each load."""
+
+    def __init__(self, url: str, log: LatencyLog, args):
+        self.url = url + args.poll_path
+        self.event = f"GET {args.poll_path.split('?')[0]}"
+        self.log = log
+        self.interval = args.poll_interval
+        self.session = requests.Session()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start_driving(self):
+        self._thread = threading.Thread(target=self._drive, daemon=True)
+        self._thread.start()
+
+    def stop_driving(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _drive(self):
+        # Spread the first loads out so they don't all land at once.
+        self._stop.wait(random.uniform(0, self.interval))
+        while not self._stop.is_set():
+            sent_at = time()
+            try:
+                response = self.session.get(self.url, timeout=30)
+                if response.ok:
+                    self.log.received(self.event, sent_at)
+                else:
+                    self.log.count_error(self.event)
+            except requests.RequestException:
+                self.log.count_error(self.event)
+            self._stop.wait(self.interval)
+
+
+def _cpu_seconds(pid: int):
+    """utime + stime of `pid`, from /proc; None where that isn't available."""
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        return None
+    fields = stat[stat.rindex(")") + 2 :].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _in_parallel(clients: list, action: str, workers: int = 16) -> tuple:
+    """Calls `action` on every client a few at a time, like a room full of screens
+    coming up (and so closing sockets, which can wait on the server, doesn't take all day).
+    """
+    failures = []
+    pending = list(clients)
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                client = pending.pop()
+            try:
+                getattr(client, action)()
+            except (OSError, socketio.exceptions.SocketIOError) as err:
+                failures.append(repr(err))
+
+    start = perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return perf_counter() - start, failures
+
+
+def run_step(cages: int, args) -> dict:
+    log = LatencyLog()
+    room_size = args.screens_per_cage + 1  # The controller is in the room too.
+
+    controllers = []
+    clients = []
+    for cage_id in range(1, cages + 1):
+        controller = SimulatedController(args.url, cage_id, log, room_size, args)
+        controllers.append(controller)
+        clients.append(controller)
+        clients.extend(
+            SimulatedScreen(args.url, cage_id, log)
+            for _ in range(args.screens_per_cage)
+        )
+
+    connect_time, failures = _in_parallel(clients, "connect")
+    # Let the joins land before anything is sent to the rooms.
+    sleep(1)
+
+    drivers = controllers + [
+        SimulatedPoller(args.url, log, args) for _ in range(args.pollers)
+    ]
+
+    cpu_before = _cpu_seconds(args.server_pid) if args.server_pid else None
+    started = perf_counter()
+    log.recording = True
+    for driver in drivers:
+        driver.start_driving()
+
+    sleep(args.duration)
+
+    for driver in drivers:
+        driver.stop_driving()
+    elapsed = perf_counter() - started
+    cpu_after = _cpu_seconds(args.server_pid) if args.server_pid else None
+
+    # Stragglers still in flight.
+    sleep(1)
+    _in_parallel(clients, "disconnect")
+
+    return {
+        "cages": cages,
+        "clients": len(clients),
+        "pollers": args.pollers,
+        "connected": len(clients) - len(failures),
+        "connect_seconds": connect_time,
+        "connect_failures": failures[:5],
+        "server_cpu_percent": (
+            None
+            if cpu_before is None or cpu_after is None
+            else (cpu_after - cpu_before) / elapsed * 100
+        ),
+        "events": log.summary(),
+    }
+
+
+def _print_step(step: dict):
+    cpu = step["server_cpu_percent"]
+    print(
+        f"\n== {step['cages']} cages, {step['connected']}/{step['clients']} clients connected "
+        f"in {step['connect_seconds']:.1f}s, {step['pollers']} pollers"
+        + ("" if cpu is None else f", server CPU {cpu:.0f}%"),
+    )
+    print(
+        f"{'event':<30}{'expected':>10}{'received':>10}{'errors':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+    )
+    for event, stats in sorted(step["events"].items()):
+        latencies = "".join(
+            f"{stats[key]:>10.1f}" if stats[key] is not None else f"{'-':>10}"
+            for key in ("p50_ms", "p90_ms", "p99_ms", "max_ms")
+        )
+        print(
+            f"{event:<30}{str(stats['expected'] or '-'):>10}{stats['received']:>10}{stats['errors']:>8}{latencies}",
+        )
+    if step["connect_failures"]:
+        print(f"connect failures (first few): {step['connect_failures']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m bracketeer.bench.socket_load",
+        description=USAGE,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--url", default="http://localhost")
+    parser.add_argument(
+        "--cages",
+        default="4",
+        help="Cage count, or a comma separated ramp (4,16,64).",
+    )
+    parser.add_argument("--screens-per-cage", type=int, default=4)
+    parser.add_argument("--mode", choices=("relay", "server"), default="relay")
+    parser.add_argument("--timer-hz", type=float, default=10)
+    parser.add_argument("--bg-interval", type=float, default=5)
+    parser.add_argument("--ready-interval", type=float, default=2)
+    parser.add_argument(
+        "--pollers",
+        type=int,
+        default=0,
+        help="Screens reloading --poll-path over HTTP.",
+    )
+    parser.add_argument("--poll-interval", type=float, default=30)
+    parser.add_argument("--poll-path", default="/matches/upcoming?autoreload=30000")
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=20,
+        help="Seconds of traffic per step.",
+    )
+    parser.add_argument(
+        "--server-pid",
+        type=int,
+        help="Report this process's CPU use (Linux).",
+    )
+    parser.add_argument("--json", help="Also write the results here.")
+    args = parser.parse_args()
+
+    steps = []
+    for cages in (int(count) for count in args.cages.split(",")):
+        steps.append(run_step(cages, args))
+        _print_step(steps[-1])
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(steps, indent=2))
+
+    # socketio.Client leaves background threads about.
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
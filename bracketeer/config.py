@@ -7,56 +7,66 @@ from dynaconf import Dynaconf
 # This is unfinished, but works decently as-is.  Wait for Rick's changes back to include
 # any uv fixes before resolving path inconsistencies.
 
-if (Path.cwd() / ".secrets.json").exists():
-    secrets = Dynaconf(envvar_prefix="DYNACONF", settings_files=[Path(".secrets.json")])
+"""
+Both of these are lazy: nothing is read off disk until the first lookup, so
+importing this (or anything that imports it) is cheap.  The files are looked
+for in the working directory as of that first lookup, and the defaults below
+are filled in as they're loaded.  load_config() forces both, for when you'd
+rather pay for it (and see the warnings) at startup.
+"""
 
-if (Path.cwd() / "event.json").exists():
-    settings = Dynaconf(envvar_prefix="DYNACONF", settings_files=[Path("event.json")])
 
-
-def mandateConfig():
+def _settings_defaults(settings) -> dict:
     logging.info("Running initial configuration assertion.")
+    defaults = {}
 
     if "match_duration" not in settings:
         logging.warning("Match duration was not present, assuming 2m30s.")
-        settings["match_duration"] = (
+        defaults["match_duration"] = (
             150.9  # we start at .9 such that the JS antics behave correctly.
         )
 
     if "tournament_cages" not in settings:
         logging.warning("No event cages / locations set, assuming new event.")
-        settings["tournament_cages"] = []
+        defaults["tournament_cages"] = []
 
     if "tournament_keys" not in settings:
         logging.warning("No event divisions set, assuming new event.")
-        settings["tournament_keys"] = []
+        defaults["tournament_keys"] = []
 
     if "event_name" not in settings:
         logging.warning("No event name set, assuming new event with empty name.")
-        settings["event_name"] = ""
+        defaults["event_name"] = ""
 
     if "event_league" not in settings:
         logging.info("No league name set, assuming None.")
-        settings["event_league"] = ""  # Empty by default, fine.
+        defaults["event_league"] = ""  # Empty by default, fine.
+
+    if "obs_ws" not in secrets:
+        defaults["obs_ws"] = []
+        logging.warning(
+            "No targets set for OBS Websocket control.  Please specify targets in Settings for this feature to work.",
+        )
+
+    return defaults
+
+
+def _secrets_defaults(secrets) -> dict:
+    defaults = {}
 
     if "truefinals" not in secrets:
-        secrets["truefinals"] = {"api_key": "", "user_id": ""}
+        defaults["truefinals"] = {"api_key": "", "user_id": ""}
         logging.warning(
             "TrueFinals API keys not set up.  App will not be able to run upcoming / last matches, or run match results directly.",
         )
 
     if "robotcombatevents" not in secrets:
-        secrets["robotcombatevents"] = {"username": "", "password": ""}
+        defaults["robotcombatevents"] = {"username": "", "password": ""}
         logging.warning(
             "RCE credentials not provided.  Cannot automate import of brackets.",
         )
 
-    if "obs_ws" not in secrets:
-        settings["obs_ws"] = []
-        logging.warning(
-            "No targets set for OBS Websocket control.  Please specify targets in Settings for this feature to work.",
-        )
-    else:
+    if "obs_ws" in secrets:
         for item in secrets["obs_ws"]:
             if "uri" not in item:
                 item["uri"] = ""
@@ -70,8 +80,26 @@ def mandateConfig():
             if "scene" not in item:
                 item["scene"] = ""
 
+    return defaults
+
+
+secrets = Dynaconf(
+    envvar_prefix="DYNACONF",
+    settings_files=[Path(".secrets.json")],
+    post_hooks=[_secrets_defaults],
+)
+
+settings = Dynaconf(
+    envvar_prefix="DYNACONF",
+    settings_files=[Path("event.json")],
+    post_hooks=[_settings_defaults],
+)
 
-mandateConfig()
+
+def load_config():
+    # Any lookup loads the file (and runs its defaults hook).
+    settings.get("tournament_keys")
+    secrets.get("truefinals")
 
 
 def getCages():
@@ -81,6 +109,21 @@ def getCages():
     return settings["tournament_cages"]
 
 
+def known_cage_id(cage_id):
+    """`cage_id` from a client as one of the event's cage ids (an int), or None if it isn't one.
+
+    Anything that keeps state per cage should go through this, so a page
+    can't have us keep state for cages that don't exist."""
+    try:
+        cage_id = int(cage_id)
+    except (TypeError, ValueError):
+        return None
+
+    if cage_id not in {cage.get("id") for cage in getCages()}:
+        return None
+    return cage_id
+
+
 def addCage(cageName: str = None, cageID: int = None):
     if "tournament_cages" not in settings:
         settings["tournament_cages"] = []
@@ -24,19 +24,35 @@ def _match_duration():
 
 @debug_pages.route("/truefinals_requests")
 def _debug_requests():
-    from api_truefinals.cached_api import TrueFinalsAPICache
+    from bracketeer.api_truefinals.cached_api import recent_cache_rows
 
-    return jsonify(
-        TrueFinalsAPICache.select()
-        .order_by(TrueFinalsAPICache.last_requested)
-        .limit(100)
-        .output(load_json=True)
-        .run_sync(),
-    )
+    return jsonify(recent_cache_rows(100))
+
+
+@debug_pages.route("/metrics")
+def _debug_metrics():
+    from bracketeer.util.metrics import metrics
+    from bracketeer.util.wrappers import ac_render_template
+
+    return ac_render_template("debug_metrics.html", rows=metrics.summary())
+
+
+@debug_pages.route("/clock_sync.json")
+def _debug_clock_sync():
+    from bracketeer.screens.clock_sync import clock_sync_report
+
+    return jsonify(clock_sync_report())
+
+
+@debug_pages.route("/cache_stats.json")
+def _debug_cache_stats():
+    from bracketeer.api_truefinals.cached_api import cache_stats
+
+    return jsonify(cache_stats())
 
 
 # This fails if there's no API keys present.
 # Need to work on better error handling / exposure.
 @debug_pages.route("/matches.json")
 def _debug_route_matches():
-    return jsonify(_json_api_stub()._matches)
+    return jsonify(_json_api_stub())
@@ -0,0 +1,211 @@
+import logging
+import threading
+from collections import deque
+
+from bracketeer.api_truefinals.snapshot import current_snapshot, subscribe
+
+"""
+Match-level change events for screens that want to update in place.
+
+Every time the games in the snapshot change we diff the old and new games
+of each division that changed, keyed on the match id, and emit one of
+
+    match_added    {"version": v, "key": k, "match": {...}}
+    match_changed  {"version": v, "key": k, "match": {...}}
+    match_removed  {"version": v, "key": k}
+
+to the `match_updates` room, where `version` is the snapshot version the
+change showed up in.  A match counts as changed when its state, calledSince,
+activeSince or slots differ.  Each slot carries a short
+`bracketeer_player_data` (name and W/L/T) as of when the match was sent, so
+the live queue screens never have to look players up themselves.
+
+We keep the last few batches of events around, so a client that reconnects
+can say which version it last saw and get just what it missed.  If that's
+too far back (or from before a server restart) it gets a `match_resync`
+with every match instead.
+"""
+
+MATCH_UPDATES_ROOM = "match_updates"
+
+# Roughly 20 minutes of games polls across a handful of divisions.
+DELTA_HISTORY = 256
+
+_COMPARED_FIELDS = ("state", "calledSince", "activeSince", "slots")
+_COMPACT_FIELDS = (
+    "id",
+    "tournamentID",
+    "weightclass",
+    "name",
+    "state",
+    "calledSince",
+    "activeSince",
+    "slots",
+    "resultAnnotation",
+)
+_PLAYER_FIELDS = ("name", "wins", "losses", "ties")
+
+_delta_lock = threading.Lock()
+# (version, [(event_name, payload), ...]), oldest first.
+_delta_log = deque(maxlen=DELTA_HISTORY)
+# Every version after this one is fully covered by _delta_log.
+_delta_base_version = 0
+_last_games_version = 0
+
+_socketio = None
+
+
+def match_key(match: dict) -> str:
+    return f"{match['tournamentID']}_{match['id']}"
+
+
+def compact_match(match: dict, player_index=None) -> dict:
+    compact = {field: match.get(field) for field in _COMPACT_FIELDS}
+    if player_index is None:
+        return compact
+
+    from bracketeer.api_truefinals.cached_wrapper import getPlayerByIds
+
+    compact["slots"] = []
+    for slot in match.get("slots") or ():
+        slot = dict(slot)
+        if slot.get("playerID") is not None:
+            player = getPlayerByIds(
+                match["tournamentID"],
+                slot["playerID"],
+                player_index,
+            )
+            slot["bracketeer_player_data"] = {
+                field: player.get(field) for field in _PLAYER_FIELDS
+            }
+        compact["slots"].append(slot)
+    return compact
+
+
+def _player_index():
+    from bracketeer.api_truefinals.cached_wrapper import get_player_index
+
+    return get_player_index()
+
+
+def _match_changed(old: dict, new: dict) -> bool:
+    return any(old.get(field) != new.get(field) for field in _COMPARED_FIELDS)
+
+
+def diff_games(
+    old_games: tuple,
+    new_games: tuple,
+    version: int,
+    player_index=None,
+) -> list:
+    old_by_key = {match_key(match): match for match in old_games}
+    new_by_key = {match_key(match): match for match in new_games}
+
+    events = []
+    for key, match in new_by_key.items():
+        if key not in old_by_key:
+            events.append(
+                (
+                    "match_added",
+                    {
+                        "version": version,
+                        "key": key,
+                        "match": compact_match(match, player_index),
+                    },
+                ),
+            )
+        elif _match_changed(old_by_key[key], match):
+            events.append(
+                (
+                    "match_changed",
+                    {
+                        "version": version,
+                        "key": key,
+                        "match": compact_match(match, player_index),
+                    },
+                ),
+            )
+
+    events.extend(
+        ("match_removed", {"version": version, "key": key})
+        for key in old_by_key.keys() - new_by_key.keys()
+    )
+
+    return events
+
+
+def current_match_version() -> int:
+    """The newest version any match event has been sent for."""
+    return _last_games_version
+
+
+def full_resync() -> dict:
+    snapshot = current_snapshot()
+    player_index = _player_index()
+    return {
+        "version": max(_last_games_version, 0),
+        "matches": [
+            compact_match(match, player_index)
+            for division_games in snapshot.games.values()
+            for match in division_games
+        ],
+    }
+
+
+def deltas_since(version):
+    """Events after `version`, or None if the client has to resync instead.
+
+    `version` comes straight from the client, so anything that isn't a
+    whole number means a resync too."""
+    try:
+        version = int(version)
+    except (TypeError, ValueError):
+        return None
+
+    with _delta_lock:
+        if version < _delta_base_version or version > _last_games_version:
+            return None
+
+        return [
+            event
+            for logged_version, events in _delta_log
+            if logged_version > version
+            for event in events
+        ]
+
+
+def _record_game_changes(old, new):
+    global _delta_base_version, _last_games_version
+
+    if old.games is new.games:
+        return
+
+    player_index = _player_index()
+    events = []
+    for tournament_id in old.games.keys() | new.games.keys():
+        old_games = old.games.get(tournament_id, ())
+        new_games = new.games.get(tournament_id, ())
+        if old_games is not new_games:
+            events.extend(diff_games(old_games, new_games, new.version, player_index))
+
+    with _delta_lock:
+        if len(_delta_log) == _delta_log.maxlen:
+            # The oldest batch is about to fall off, so clients behind it can't catch up.
+            _delta_base_version = _delta_log[0][0]
+        _delta_log.append((new.version, events))
+        _last_games_version = new.version
+
+    if _socketio is None or len(events) == 0:
+        return
+
+    for event_name, payload in events:
+        _socketio.emit(event_name, payload, to=MATCH_UPDATES_ROOM)
+
+    logging.info(f"Sent {len(events)} match events for snapshot v{new.version}.")
+
+
+def init_match_deltas(socketio):
+    global _socketio
+
+    _socketio = socketio
+    subscribe(_record_game_changes)
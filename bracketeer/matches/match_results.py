@@ -1,6 +1,14 @@
-from flask import Blueprint, jsonify, render_template, request
+import hashlib
+import threading
+from uuid import uuid4
+
+from flask import Blueprint, Response, jsonify, render_template, request, session
 
 from bracketeer.api_truefinals.cached_wrapper import getAllTournamentsMatchesWithPlayers
+from bracketeer.api_truefinals.models import get_event_model, normalized_payload
+from bracketeer.api_truefinals.poller import poller_running
+from bracketeer.api_truefinals.snapshot import current_snapshot
+from bracketeer.util.metrics import metrics
 from bracketeer.util.wrappers import ac_render_template
 
 match_results = Blueprint(
@@ -49,11 +57,184 @@ def _json_api_stub():
     return matches
 
 
+def completed_filter(x):
+    return x.get("state") == "done"
+
+
+def _completed_matches():
+    matches = getAllTournamentsMatchesWithPlayers(filterFunction=completed_filter)
+    # Most recent first, as near as TrueFinals lets us tell.
+    return sorted(
+        matches,
+        key=lambda x: x["activeSince"] or x["calledSince"] or float(0),
+        reverse=True,
+    )
+
+
+"""
+Every queue screen reloads /matches/upcoming every 30s or so, and between
+two polls of TrueFinals they all get the same page.  So with the poller
+running, each variant of the page (autoreload, show_header) is rendered
+once per snapshot version and kept until the next one, and responses carry
+an ETag of the version and variant, so a reload of an unchanged page is a
+304 with no body at all.
+
+Without the poller there's no version to go by; we render every time and
+tag the response with a hash of what we rendered instead.
+"""
+
+# Versions start over with the process, so the ETags need telling apart across restarts.
+_PROCESS_TAG = uuid4().hex[:8]
+MAX_RENDERED_VARIANTS = 32
+
+_rendered_lock = threading.Lock()
+_rendered_version = None
+# variant -> (etag, body), for _rendered_version only.
+_rendered = {}
+
+
+def _cached_render(variant: tuple, render) -> tuple:
+    """(etag, body) of `variant` for the current snapshot, calling render() only when we don't have it."""
+    global _rendered_version
+
+    # base.html shows (and so uses up) this session's flashed messages, which
+    # mustn't end up in a body other sessions are handed.
+    if not poller_running() or session.get("_flashes"):
+        body = render()
+        metrics.increment(
+            "bracketeer_render_cache_total",
+            route=variant[0],
+            result="uncached",
+        )
+        return hashlib.sha1(body).hexdigest(), body
+
+    version = current_snapshot().version
+    with _rendered_lock:
+        if _rendered_version != version:
+            _rendered.clear()
+            _rendered_version = version
+        cached = _rendered.get(variant)
+
+    if cached is not None:
+        metrics.increment(
+            "bracketeer_render_cache_total",
+            route=variant[0],
+            result="hit",
+        )
+        return cached
+
+    # Rendered outside the lock; two screens missing at once just both render.
+    body = render()
+    variant_hash = hashlib.sha1(repr(variant).encode()).hexdigest()[:12]
+    cached = (f"{_PROCESS_TAG}-{version}-{variant_hash}", body)
+    with _rendered_lock:
+        # autoreload is free text, so don't let odd URLs grow this forever.
+        if _rendered_version == version and len(_rendered) < MAX_RENDERED_VARIANTS:
+            _rendered[variant] = cached
+
+    metrics.increment("bracketeer_render_cache_total", route=variant[0], result="miss")
+    return cached
+
+
+def _conditional_response(etag: str, body: bytes, mimetype: str) -> Response:
+    response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    # Screens may keep it, but have to check back with us before using it.
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+
+"""
+`?format=normalized` on the .json routes sends the matches with their slots
+pointing at a separate players table, instead of a copy of each player on
+every slot (see api_truefinals/models.py):
+
+    {"matches": [{..., "slots": [{"playerID": ..., "prevGameID": ...}]}],
+     "players": {tournamentID: {playerID: {"name": ..., "wins": ..., ...}}}}
+
+Same matches in the same order as the default format, but only the fields
+the models keep, so it's for screens rather than a stand-in for the full
+rows.  The live screens' fallback poll uses it.
+"""
+
+# The live page's `order` -> sort key (and whether it's reversed) over models.
+_MODEL_ORDERS = {
+    "called": (
+        lambda m: (m.called_since or float(0), reversor(m.state == "unavailable")),
+        False,
+    ),
+    "recent": (lambda m: m.active_since or m.called_since or float(0), True),
+}
+
+
+def _normalized_matches(page: str) -> dict:
+    model = get_event_model()
+    states = LIVE_PAGES[page]["states"]
+    key, reverse = _MODEL_ORDERS[LIVE_PAGES[page]["order"]]
+
+    matches = sorted(
+        (match for match in model.matches if match.state in states),
+        key=key,
+        reverse=reverse,
+    )
+    return normalized_payload(model, matches)
+
+
+def _json_matches_response(page: str, classic):
+    normalized = request.args.get("format") == "normalized"
+    if normalized:
+        variant = (f"{page}.json", "normalized")
+    else:
+        variant = (f"{page}.json",)
+
+    def render():
+        if normalized:
+            return jsonify(_normalized_matches(page)).get_data()
+        return jsonify(classic()).get_data()
+
+    etag, body = _cached_render(variant, render)
+    return _conditional_response(etag, body, "application/json")
+
+
 @match_results.route("/upcoming.json")
 def _json_api_results():
-    matches = _json_api_stub()
+    return _json_matches_response("upcoming", _json_api_stub)
+
+
+"""
+Live queue screens (`?live=1`) are just the page's shell.  queue_live.js
+fills in the matches over the socket (see match_deltas.py) and patches rows
+in place as they change, so the page itself is never reloaded.  While the
+socket is down it polls the page's .json instead.
+"""
 
-    return jsonify(matches)
+# page -> what the live shell needs to know about it.
+LIVE_PAGES = {
+    "upcoming": {
+        "title": "Upcoming Matches",
+        "hero": "is-info",
+        "states": ("called", "ready", "active"),
+        "order": "called",
+        "fallback": "match_results._json_api_results",
+    },
+    "completed": {
+        "title": "Last Matches",
+        "hero": "is-warning",
+        "states": ("done",),
+        "order": "recent",
+        "fallback": "match_results._json_completed_results",
+    },
+}
+
+
+def _live_page(page: str):
+    return ac_render_template(
+        "queueing/live_matches.html",
+        page=page,
+        live=LIVE_PAGES[page],
+        title=LIVE_PAGES[page]["title"],
+        show_header=request.args.get("show_header"),
+    )
 
 
 @match_results.route("/upcoming")
@@ -61,20 +242,33 @@ def routeForUpcomingMatches():
     autoreload = request.args.get("autoreload")
     show_header = request.args.get("show_header")
 
-    matches = _json_api_stub()
+    if request.args.get("live"):
+        return _live_page("upcoming")
 
-    return ac_render_template(
-        "queueing/upcoming_matches.html",
-        div_matches=matches,
-        autoreload=autoreload,
-        show_header=show_header,
-    )
+    def render():
+        return ac_render_template(
+            "queueing/upcoming_matches.html",
+            div_matches=_json_api_stub(),
+            autoreload=autoreload,
+            show_header=show_header,
+        ).encode()
+
+    etag, body = _cached_render(("upcoming", autoreload, show_header), render)
+    return _conditional_response(etag, body, "text/html")
+
+
+@match_results.route("/completed.json")
+def _json_completed_results():
+    return _json_matches_response("completed", _completed_matches)
 
 
 @match_results.route("/completed")
 def routeForLastMatches():
     autoreload = request.args.get("autoreload")
 
+    if request.args.get("live"):
+        return _live_page("completed")
+
     matches = []
 
     return ac_render_template(
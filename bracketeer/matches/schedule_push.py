@@ -0,0 +1,69 @@
+import logging
+import threading
+
+from flask import render_template
+
+from bracketeer.api_truefinals.poller import poller_running
+from bracketeer.api_truefinals.snapshot import current_snapshot, subscribe
+from bracketeer.matches.match_results import _json_api_stub
+
+"""
+Server-side rendering of the schedule panel on the match control pages.
+
+Control pages join the `schedule_update` room (see ctimer.html).  Rather than
+have each of them ask for the schedule and render it separately, we render
+_partial_template_matches.html once per snapshot version and send that same
+fragment to the whole room whenever the snapshot changes.  Anyone asking
+directly (the refresh button) gets the cached copy.
+"""
+
+SCHEDULE_ROOM = "schedule_update"
+
+_fragment_lock = threading.Lock()
+_fragment_version = None
+_fragment_html = ""
+
+_app = None
+_socketio = None
+
+
+def _render_schedule_fragment() -> str:
+    return render_template("_partial_template_matches.html", data=_json_api_stub())
+
+
+def current_schedule_fragment() -> str:
+    """The rendered schedule for the current snapshot, rendering it if needed.
+
+    Needs an app context, which socket handlers already have."""
+    global _fragment_version, _fragment_html
+
+    if not poller_running():
+        # No snapshot versions to cache against, so every ask is a fresh render.
+        return _render_schedule_fragment()
+
+    version = current_snapshot().version
+    with _fragment_lock:
+        if _fragment_version != version:
+            _fragment_html = _render_schedule_fragment()
+            _fragment_version = version
+        return _fragment_html
+
+
+def _broadcast_schedule(old, new):
+    # Locations changing doesn't touch the schedule panel.
+    if old.games is new.games and old.players is new.players:
+        return
+
+    with _app.app_context():
+        fragment = current_schedule_fragment()
+
+    _socketio.emit("schedule_data", fragment, to=SCHEDULE_ROOM)
+    logging.info(f"Broadcast schedule for snapshot v{new.version}.")
+
+
+def init_schedule_push(app, socketio):
+    global _app, _socketio
+
+    _app = app
+    _socketio = socketio
+    subscribe(_broadcast_schedule)
@@ -0,0 +1,315 @@
+import logging
+import threading
+from time import time
+
+from bracketeer.config import known_cage_id
+from bracketeer.config import settings as arena_settings
+
+"""
+The match timer for each cage, kept on the server.
+
+The controller page (ctimer.html) sends `timer_command`s, and every change
+of state goes out to the cage's room as one `timer_state` frame:
+
+    {"cageID": 1, "state": "running", "seq": 12, "duration": 150,
+     "deadline": 1718000000000, "remaining": 97.3, "server_time": ...}
+
+While the clock is going (countdown, running, warning) `deadline` is when
+it hits zero, in epoch ms, and screens count down to it themselves.
+Otherwise `deadline` is null and `remaining` is what to show.  `seq` only
+changes when the state does; the same frame is re-sent every few seconds
+while the clock runs so a screen that missed one catches up.
+
+States:
+    stopped    reset to the full duration, or 0 once a match runs out
+    countdown  the lead-in before the match clock starts
+    running    match clock going
+    warning    match clock going, past the mid-match warning
+    paused     frozen, `start` resumes whatever was going
+    estop      frozen and showing STOP; only `stop` clears it
+
+The warning state (and its chime) only happens if event.json sets
+`"mid_match_warning"` to how many seconds are left when it should.
+
+Sounds and the e-stop background still go out as the same play_sound_event
+/ timer_bg_event the screens already handle.  Free-text timer_event
+messages are still relayed as they were.
+"""
+
+TIMER_STATES = ("stopped", "countdown", "running", "warning", "paused", "estop")
+TICKING_STATES = ("countdown", "running", "warning")
+
+# Sized to the start tones, which are 3.5s and should finish as the match starts.
+COUNTDOWN_SECONDS = 4.5
+START_SOUND_LEAD = 3.8
+END_SOUND_LEAD = 0.5
+
+TICK_INTERVAL = 0.1
+KEYFRAME_INTERVAL = 5
+
+DEFAULT_BACKGROUND = "rgb(37, 37, 37)"
+
+
+def _match_duration() -> float:
+    return arena_settings.get("match_duration", 150)
+
+
+class CageTimer:
+    def __init__(self, cage_id: int, duration: float):
+        self.cage_id = cage_id
+        self.duration = duration
+        self.seq = 0
+        self._reset()
+
+    def _reset(self, remaining=None):
+        self.state = "stopped"
+        self.remaining = self.duration if remaining is None else remaining
+        self.deadline = None
+        self.resume_state = None
+        self.played = set()
+
+    def _enter(self, state: str):
+        self.state = state
+        self.seq += 1
+
+    def start(self, now: float) -> bool:
+        if self.state == "stopped":
+            self.duration = _match_duration()
+            self._reset()
+            self.deadline = now + COUNTDOWN_SECONDS
+            self._enter("countdown")
+            return True
+
+        if self.state == "paused":
+            self.deadline = now + self.remaining
+            self._enter(self.resume_state)
+            return True
+
+        return False
+
+    def pause(self, now: float) -> bool:
+        if self.state not in TICKING_STATES:
+            return False
+
+        self.remaining = max(0.0, self.deadline - now)
+        self.resume_state = self.state
+        self.deadline = None
+        self._enter("paused")
+        return True
+
+    def stop(self) -> bool:
+        self.duration = _match_duration()
+        self._reset()
+        self._enter("stopped")
+        return True
+
+    def estop(self, now: float) -> bool:
+        if self.state == "estop":
+            return False
+
+        if self.deadline is not None:
+            self.remaining = max(0.0, self.deadline - now)
+        self.deadline = None
+        self._enter("estop")
+        return True
+
+    def set_remaining(self, seconds: float) -> bool:
+        """Manual time entry; leaves the match clock paused at `seconds`."""
+        if self.state == "estop":
+            return False
+
+        self.remaining = max(0.0, seconds)
+        self.deadline = None
+        self.resume_state = "running"
+        self._enter("paused")
+        return True
+
+    def tick(self, now: float) -> list:
+        """Moves the clock along; returns the sounds that are now due."""
+        sounds = []
+        if self.state not in TICKING_STATES:
+            return sounds
+
+        left = self.deadline - now
+
+        if self.state == "countdown":
+            if left <= START_SOUND_LEAD and "start_match" not in self.played:
+                sounds.append("start_match")
+            if left <= 0:
+                # Straight on from the countdown's deadline, not from whenever we noticed.
+                self.deadline += self.duration
+                left = self.deadline - now
+                self._enter("running")
+
+        if self.state == "running":
+            warning = arena_settings.get("mid_match_warning", None)
+            if (
+                warning is not None
+                and left <= warning
+                and "mid_match_chime" not in self.played
+            ):
+                sounds.append("mid_match_chime")
+                self._enter("warning")
+
+        if self.state != "countdown":
+            if left <= END_SOUND_LEAD and "end_match" not in self.played:
+                sounds.append("end_match")
+            if left <= 0:
+                self._reset(remaining=0)
+                self._enter("stopped")
+
+        self.played.update(sounds)
+        return sounds
+
+    def frame(self, now: float) -> dict:
+        remaining = self.remaining
+        if self.deadline is not None:
+            remaining = max(0.0, self.deadline - now)
+
+        return {
+            "cageID": self.cage_id,
+            "state": self.state,
+            "seq": self.seq,
+            "duration": self.duration,
+            "deadline": None if self.deadline is None else int(self.deadline * 1000),
+            "remaining": remaining,
+            "server_time": int(now * 1000),
+        }
+
+
+_timers = {}
+_timers_lock = threading.Lock()
+
+_socketio = None
+
+
+def cage_room(cage_id) -> str:
+    return f"cage_no_{cage_id}"
+
+
+def _timer_for(cage_id: int) -> CageTimer:
+    if cage_id not in _timers:
+        _timers[cage_id] = CageTimer(cage_id, _match_duration())
+    return _timers[cage_id]
+
+
+def current_timer_frame(cage_id):
+    """The cage's frame right now, or None if it isn't one of the event's cages."""
+    cage_id = known_cage_id(cage_id)
+    if cage_id is None:
+        return None
+
+    with _timers_lock:
+        return _timer_for(cage_id).frame(time())
+
+
+def _broadcast(frame: dict, sounds=(), background=None):
+    if _socketio is None:
+        return
+
+    room = cage_room(frame["cageID"])
+    _socketio.emit("timer_state", frame, to=room)
+    for sound in sounds:
+        _socketio.emit("play_sound_event", sound, to=room)
+    if background is not None:
+        _socketio.emit(
+            "timer_bg_event",
+            {"color": background, "cageID": frame["cageID"]},
+            to=room,
+        )
+
+
+def apply_timer_command(cage_id, command: str, seconds=None):
+    """Runs a controller's command against the cage's timer and broadcasts the result.
+
+    Returns the timer's frame either way; unknown or out-of-place commands
+    just don't change anything.  Cages that aren't in tournament_cages are
+    ignored altogether (and get None)."""
+    known_id = known_cage_id(cage_id)
+    if known_id is None:
+        logging.warning(f"Ignoring timer command for unknown cage {cage_id!r}.")
+        return None
+    cage_id = known_id
+
+    now = time()
+    background = None
+
+    with _timers_lock:
+        timer = _timer_for(cage_id)
+        was_estopped = timer.state == "estop"
+
+        if command == "start":
+            changed = timer.start(now)
+        elif command == "pause":
+            changed = timer.pause(now)
+        elif command == "stop":
+            changed = timer.stop()
+            background = DEFAULT_BACKGROUND
+        elif command == "estop":
+            changed = timer.estop(now)
+            background = "red"
+        elif command == "set" and seconds is not None:
+            changed = timer.set_remaining(float(seconds))
+        else:
+            logging.warning(f"Ignoring timer command {command!r} for cage {cage_id}.")
+            changed = False
+
+        sounds = timer.tick(now) if changed else []
+        frame = timer.frame(now)
+
+    if changed:
+        if was_estopped:
+            logging.info(f"Cage {cage_id} e-stop cleared.")
+        _broadcast(frame, sounds, background)
+
+    return frame
+
+
+def estop_cage_timers(cage_ids) -> list:
+    frames = [apply_timer_command(cage_id, "estop") for cage_id in cage_ids]
+    return [frame for frame in frames if frame is not None]
+
+
+def _tick_loop(socketio):
+    last_keyframe = {}
+
+    while True:
+        socketio.sleep(TICK_INTERVAL)
+        now = time()
+
+        updates = []
+        with _timers_lock:
+            for timer in _timers.values():
+                if timer.state not in TICKING_STATES:
+                    continue
+
+                seq = timer.seq
+                sounds = timer.tick(now)
+                if (
+                    timer.seq != seq
+                    or now - last_keyframe.get(timer.cage_id, 0) >= KEYFRAME_INTERVAL
+                ):
+                    updates.append((timer.cage_id, timer.frame(now), sounds))
+                    last_keyframe[timer.cage_id] = now
+                elif sounds:
+                    updates.append((timer.cage_id, None, sounds))
+
+        for cage_id, frame, sounds in updates:
+            _send_tick(cage_id, frame, sounds)
+
+
+def _send_tick(cage_id: int, frame, sounds: list):
+    try:
+        if frame is not None:
+            _socketio.emit("timer_state", frame, to=cage_room(cage_id))
+        for sound in sounds:
+            _socketio.emit("play_sound_event", sound, to=cage_room(cage_id))
+    except Exception:
+        logging.exception(f"Failed to send the timer for cage {cage_id}.")
+
+
+def init_cage_timers(socketio):
+    global _socketio
+
+    _socketio = socketio
+    socketio.start_background_task(_tick_loop, socketio)
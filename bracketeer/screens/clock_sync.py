@@ -0,0 +1,128 @@
+import math
+import threading
+from collections import deque
+from time import time
+
+from bracketeer.config import known_cage_id
+
+"""
+How far off (and how far away) each timer screen's clock is.
+
+Screens running cage_timer.js send a `clock_ping` every so often, and the
+server acks it with its own time.  From that the screen works out its
+round trip (`rtt`) and how far its clock is from ours (`offset`, server
+minus client, ms), uses the offset to draw the timer against the server's
+deadline, and reports the sample in its next ping.
+
+We keep the last few samples per connected client and per cage (only the
+event's own cages, and only while some client is still on one), and
+`clock_sync_report()` (/debug/clock_sync.json) summarizes them as
+percentiles, slowest clients first.
+"""
+
+CLIENT_SAMPLES = 64
+CAGE_SAMPLES = 512
+PERCENTILES = (50, 90, 99)
+
+_samples_lock = threading.Lock()
+# sid -> {"cage": ..., "last_seen": ..., "rtt": deque, "offset": deque}
+_client_samples = {}
+# cage id -> {"rtt": deque, "offset": deque}
+_cage_samples = {}
+
+
+def percentiles(values, wanted=PERCENTILES) -> dict:
+    """Nearest-rank percentiles of `values`, as {"p50": ..., ...}; empty if there are none."""
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+
+    return {
+        f"p{pct}": ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+        for pct in wanted
+    }
+
+
+def record_sample(sid: str, cage, rtt, offset) -> bool:
+    """Keeps one sample from a screen's ping; False (and nothing kept) if it's not a real measurement.
+
+    A `cage` that isn't one of the event's still counts for the client, as
+    cage None, but not for any cage."""
+    try:
+        rtt = float(rtt)
+        offset = float(offset)
+    except (TypeError, ValueError):
+        return False
+    if not (math.isfinite(rtt) and math.isfinite(offset)) or rtt < 0:
+        return False
+    cage = known_cage_id(cage)
+
+    with _samples_lock:
+        client = _client_samples.get(sid)
+        if client is None:
+            client = {
+                "cage": cage,
+                "rtt": deque(maxlen=CLIENT_SAMPLES),
+                "offset": deque(maxlen=CLIENT_SAMPLES),
+            }
+            _client_samples[sid] = client
+        previous_cage = client["cage"]
+        client["cage"] = cage
+        client["last_seen"] = time()
+        client["rtt"].append(rtt)
+        client["offset"].append(offset)
+        if previous_cage != cage:
+            _drop_unwatched_cage(previous_cage)
+
+        if cage is not None:
+            per_cage = _cage_samples.setdefault(
+                cage,
+                {
+                    "rtt": deque(maxlen=CAGE_SAMPLES),
+                    "offset": deque(maxlen=CAGE_SAMPLES),
+                },
+            )
+            per_cage["rtt"].append(rtt)
+            per_cage["offset"].append(offset)
+
+    return True
+
+
+def _drop_unwatched_cage(cage):
+    # Callers hold _samples_lock.
+    if all(client["cage"] != cage for client in _client_samples.values()):
+        _cage_samples.pop(cage, None)
+
+
+def drop_client(sid: str):
+    # A cage keeps its history across reconnects, but not once nobody's on it.
+    with _samples_lock:
+        client = _client_samples.pop(sid, None)
+        if client is not None:
+            _drop_unwatched_cage(client["cage"])
+
+
+def clock_sync_report() -> dict:
+    with _samples_lock:
+        clients = [
+            {
+                "sid": sid,
+                "cage": client["cage"],
+                "samples": len(client["rtt"]),
+                "last_seen": client["last_seen"],
+                "rtt": percentiles(client["rtt"]),
+                "offset": percentiles(client["offset"]),
+            }
+            for sid, client in _client_samples.items()
+        ]
+        cages = {
+            cage: {
+                "samples": len(samples["rtt"]),
+                "rtt": percentiles(samples["rtt"]),
+                "offset": percentiles(samples["offset"]),
+            }
+            for cage, samples in _cage_samples.items()
+        }
+
+    clients.sort(key=lambda client: client["rtt"].get("p90", 0), reverse=True)
+    return {"clients": clients, "cages": cages}
@@ -0,0 +1,109 @@
+// Draws the cage's match clock from the server's timer_state frames (see cage_timer.py).
+// The server only sends a frame when the state changes (and every few seconds while running),
+// so the counting down between frames happens here, against the frame's deadline.
+//
+// `render(text, frame)` is called whenever what should be shown changes.
+// Free-text timer_event messages still go through showMessage(), and stay up until the timer's state next changes.
+
+// Pings the server over the socket to work out how far our clock is from its clock (see clock_sync.py).
+// Uses the sample with the shortest round trip out of the last few; each measurement gets reported in the next ping.
+function ClockSync(socket, cage) {
+    var samples = [];
+    var last = null;
+
+    function ping() {
+        var t0 = Date.now();
+        socket.emit("clock_ping", {'t0': t0, 'cage': cage(), 'rtt': last && last.rtt, 'offset': last && last.offset}, function(pong) {
+            var t1 = Date.now();
+            last = {'rtt': t1 - t0, 'offset': pong.server_time - (t0 + (t1 - t0) / 2)};
+            samples.push(last);
+            if (samples.length > 8) {
+                samples.shift();
+            }
+        });
+    }
+
+    // a quick few on (re)connect so the first offset isn't a one-off, then every 10s.
+    socket.on("connect", function() {
+        for (var i = 0; i < 4; i++) {
+            setTimeout(ping, i * 1000);
+        }
+    });
+    if (socket.connected) {
+        ping();
+    }
+    setInterval(ping, 10000);
+
+    return {
+        offset: function() {
+            if (samples.length === 0) {
+                return null;
+            }
+            return samples.reduce((best, sample) => (sample.rtt < best.rtt ? sample : best)).offset;
+        },
+    };
+}
+
+function pad_timer_value(seconds) {
+    return seconds.toString().padStart(3, "0");
+}
+
+function CageTimerClock(socket, render) {
+    var frame = null;
+    var offset = 0; // server clock - our clock, in ms.
+    var clock_sync = ClockSync(socket, function() {
+        return frame === null ? null : frame.cageID;
+    });
+    var message = null;
+    var shown = null;
+
+    function remaining() {
+        if (frame.deadline === null) {
+            return frame.remaining;
+        }
+        var synced = clock_sync.offset();
+        return Math.max(0, (frame.deadline - (Date.now() + (synced === null ? offset : synced))) / 1000);
+    }
+
+    function draw() {
+        if (frame === null) {
+            return;
+        }
+
+        var text;
+        if (message !== null) {
+            text = message;
+        } else if (frame.state === "estop") {
+            text = "STOP";
+        } else {
+            text = pad_timer_value(Math.ceil(remaining()));
+        }
+
+        if (text !== shown) {
+            shown = text;
+            render(text, frame);
+        }
+    }
+
+    socket.on("timer_state", function(new_frame) {
+        if (frame === null || new_frame.seq !== frame.seq) {
+            message = null;
+        }
+        // Only used until ClockSync has a measurement; it's off by the one-way latency.
+        offset = new_frame.server_time - Date.now();
+        frame = new_frame;
+        draw();
+    });
+
+    setInterval(draw, 100);
+
+    return {
+        showMessage: function(text) {
+            message = text;
+            draw();
+        },
+        state: function() {
+            return frame === null ? null : frame.state;
+        },
+    };
+}
@@ -1,4 +1,6 @@
-from flask import Blueprint, Response, redirect, render_template
+from flask import Blueprint, current_app, redirect, render_template
+
+from bracketeer.util.assets import asset_response, build_asset
 
 user_screens = Blueprint(
     "user_screens",
@@ -43,10 +45,23 @@ def judgesScreen(cageID: int):
     return render_template("judges_timer.html", cageID=cageID)
 
 
+_fonts_css = None
+
+
 # Stupid hack to get around relative pathing so it can be moved around. 0/10 do not do this.
+# The font urls in it only change with a restart, so it's rendered once and served like a static file.
+# Except under the dev server, where the template might be what's being edited.
 @user_screens.route("fonts.css")
 def getCSSPath():
-    return Response(render_template("fonts.css"), mimetype="text/css")
+    global _fonts_css
+
+    if _fonts_css is None or current_app.debug:
+        _fonts_css = build_asset(
+            "fonts.css",
+            render_template("fonts.css").encode("utf-8"),
+            "text/css",
+        )
+    return asset_response(_fonts_css)
 
 
 @user_screens.route("/upcoming_test")
@@ -0,0 +1,130 @@
+import sys
+
+try:
+    from gevent import monkey
+except ImportError:
+    sys.exit("Production mode runs on gevent: uv sync --extra production")
+
+# Before anything else gets to import socket, ssl, threading and friends, so
+# the scheduler, DB writer, httpx and friends all end up as greenlets on the one loop.
+monkey.patch_all()
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import logging  # noqa: E402
+import signal  # noqa: E402
+
+import gevent  # noqa: E402
+import piccolo.utils.sync  # noqa: E402
+from gevent.pool import Pool  # noqa: E402
+
+
+def _run_sync_on_native_thread(coroutine):
+    # asyncio keeps the running loop per OS thread, and every greenlet shares
+    # this one, so two queries' asyncio.run()s would trip over each other.
+    # Each gets a real thread from gevent's pool to run its loop in instead.
+    return gevent.get_hub().threadpool.apply(asyncio.run, (coroutine,))
+
+
+# Piccolo modules all `from piccolo.utils.sync import run_sync`, and none are imported yet.
+piccolo.utils.sync.run_sync = _run_sync_on_native_thread
+
+# Also the --help text.
+USAGE = """
+Production entry point: the same app as `python -m bracketeer`, served by
+gevent's WSGI server instead of Werkzeug's debug server.
+
+    python -m bracketeer.serve --port 80 --concurrency 1000
+
+No reloader and no debugger.  Every connection (HTTP request or screen's
+socket) is a greenlet from a pool of `--concurrency`, and everything that
+used to be a thread (the TrueFinals poller, DB writer, cage timer and
+presence loops, fetch pools) runs as greenlets on the same loop, since the
+standard library is patched before any of it is imported.  Piccolo's
+queries are the exception: they're asyncio underneath, so each runs its
+event loop on one of gevent's native threads.
+
+SIGTERM / SIGINT shut down gracefully: the poller stops, the presence
+table and any queued DB writes are flushed, the screens are told to
+disconnect (they reconnect on their own once we're back) and requests
+still running get `--grace` seconds to finish.
+"""
+
+
+def _shutdown(socketio, grace: float):
+    from bracketeer.api_truefinals.poller import scheduler
+    from bracketeer.util.db import db_writer
+    from bracketeer.util.presence import presence
+
+    logging.info("Shutting down.")
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+
+    presence.checkpoint()
+    db_writer.flush(timeout=grace)
+
+    for sid, _ in list(socketio.server.manager.get_participants("/", None)):
+        socketio.server.disconnect(sid)
+
+    socketio.wsgi_server.stop(timeout=grace)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m bracketeer.serve",
+        description=USAGE,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=80)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1000,
+        help="Most connections (sockets and requests) served at once.",
+    )
+    parser.add_argument(
+        "--grace",
+        type=float,
+        default=10,
+        help="Seconds to let requests finish on shutdown.",
+    )
+    parser.add_argument(
+        "--access-log",
+        action="store_true",
+        help="Log every request, like the dev server does.",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level="INFO")
+
+    from bracketeer.__main__ import create_app, log_startup_time, socketio
+    from bracketeer.api_truefinals.poller import init_poller
+
+    app = create_app()
+    if socketio.async_mode != "gevent":
+        sys.exit(f"Socket.IO came up in {socketio.async_mode} mode instead of gevent.")
+
+    init_poller(app)
+    log_startup_time()
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        gevent.signal_handler(signum, gevent.spawn, _shutdown, socketio, args.grace)
+
+    logging.info(
+        f"Serving on {args.host}:{args.port} with up to {args.concurrency} connections.",
+    )
+    socketio.run(
+        app,
+        host=args.host,
+        port=args.port,
+        debug=False,
+        use_reloader=False,
+        log_output=args.access_log,
+        spawn=Pool(args.concurrency),
+    )
+    logging.info("Stopped.")
+
+
+if __name__ == "__main__":
+    main()
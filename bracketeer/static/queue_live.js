@@ -0,0 +1,281 @@
+// Live queue screens (see match_deltas.py and live_matches.html).
+// The page is loaded once; a match_resync fills the table, then match_added / match_changed /
+// match_removed patch single rows.  On reconnect we say which version we last saw and only get
+// what we missed.  While the socket is down, the page's .json is polled instead, in its
+// normalized format (players sent once, joined back onto the slots here).
+
+function LiveQueue(socket, options) {
+    var fallback_interval = options.fallback_interval || 30000;
+    var matches = {}; // key -> match
+    var rows = {}; // key -> <tr>
+    var version = null;
+    var fallback_timer = null;
+    var loaded = false; // anything from either the socket or a poll yet
+
+    function key_of(match) {
+        return match.tournamentID + "_" + match.id;
+    }
+
+    function wanted(match) {
+        return options.states.indexOf(match.state) !== -1;
+    }
+
+    // Same order as the server-rendered pages.
+    function compare(a, b) {
+        if (options.order === "recent") {
+            return (b.activeSince || b.calledSince || 0) - (a.activeSince || a.calledSince || 0);
+        }
+        var by_called = (a.calledSince || 0) - (b.calledSince || 0);
+        if (by_called !== 0) {
+            return by_called;
+        }
+        return (b.state === "unavailable") - (a.state === "unavailable");
+    }
+
+    function cell(content, colspan) {
+        var td = document.createElement("td");
+        if (colspan) {
+            td.colSpan = colspan;
+        }
+        if (typeof content === "string") {
+            td.textContent = content;
+        } else if (content) {
+            td.appendChild(content);
+        }
+        return td;
+    }
+
+    function tag(text, classes) {
+        var span = document.createElement("span");
+        span.className = "tag " + (classes || "");
+        span.textContent = text;
+        return span;
+    }
+
+    function tags(items) {
+        var group = document.createElement("div");
+        group.className = "tags has-addons";
+        items.forEach((item) => group.appendChild(item));
+        return group;
+    }
+
+    function called_text(match) {
+        if (match.calledSince === null || match.calledSince === undefined) {
+            return "ACTIVE NOW";
+        }
+        return "Called " + time_ago(match.calledSince);
+    }
+
+    function called_cell(match) {
+        var button = document.createElement("span");
+        var active = match.calledSince === null || match.calledSince === undefined;
+        button.className = "button is-small is-fullwidth " + (active ? "is-danger" : "is-primary");
+        var label = document.createElement("b");
+        label.className = "called_since";
+        label.textContent = called_text(match);
+        button.appendChild(label);
+        return cell(button);
+    }
+
+    function slot_cells(match) {
+        var cells = [];
+
+        if (match.state === "unavailable") {
+            var waiting = document.createElement("div");
+            waiting.appendChild(document.createElement("i")).textContent = "waiting . . . ";
+            var advances = [tag("Advances from " + match.weightclass)];
+            (match.slots || []).forEach((slot) => advances.push(tag(slot.prevGameID || "?", "is-success is-light")));
+            waiting.appendChild(tags(advances));
+            return [cell(waiting, 2)];
+        }
+
+        (match.slots || []).forEach(function(slot) {
+            var player = slot.bracketeer_player_data;
+            var name = document.createElement("b");
+            name.textContent = player ? player.name : (slot.playerID || "");
+            cells.push(cell(name, 2));
+
+            cells.push(cell(player ? tags([
+                tag("WLT"),
+                tag(player.wins, "is-primary is-light is-rounded"),
+                tag(player.losses, "is-danger is-light is-rounded"),
+                tag(player.ties, "is-warning is-light is-rounded"),
+            ]) : null));
+        });
+
+        if ((match.slots || []).length === 1) {
+            var waiting_for = document.createElement("i");
+            waiting_for.textContent = "waiting . . . ";
+            cells.push(cell(waiting_for));
+        }
+        return cells;
+    }
+
+    function render_row(match) {
+        var tr = document.createElement("tr");
+        var match_info = document.createElement("b");
+        match_info.textContent = (match.weightclass || "").slice(0, 4).toUpperCase() + "-" + match.name;
+
+        if (options.layout === "completed") {
+            tr.appendChild(cell(match.weightclass || ""));
+            tr.appendChild(cell(match_info));
+            slot_cells(match).forEach((td) => tr.appendChild(td));
+            tr.appendChild(cell(match.resultAnnotation ? tags([tag("Win by", "is-link"), tag(match.resultAnnotation, "is-dark")]) : null));
+        } else {
+            tr.appendChild(called_cell(match));
+            tr.appendChild(cell(match_info));
+            slot_cells(match).forEach((td) => tr.appendChild(td));
+        }
+        return tr;
+    }
+
+    // Moves rows only where they're out of place, so unchanged rows are left alone.
+    function reorder() {
+        var keys = Object.keys(matches).sort((a, b) => compare(matches[a], matches[b]));
+        keys.forEach(function(key, index) {
+            if (options.tbody.children[index] !== rows[key]) {
+                options.tbody.insertBefore(rows[key], options.tbody.children[index] || null);
+            }
+        });
+
+        var empty = keys.length === 0;
+        options.table.style.display = empty ? "none" : "";
+        options.empty.style.display = empty ? "" : "none";
+    }
+
+    function remove(key) {
+        if (key in rows) {
+            rows[key].remove();
+            delete rows[key];
+            delete matches[key];
+        }
+    }
+
+    function upsert(key, match) {
+        if (!wanted(match)) {
+            remove(key);
+            return;
+        }
+
+        var row = render_row(match);
+        if (key in rows) {
+            options.tbody.replaceChild(row, rows[key]);
+        } else {
+            options.tbody.appendChild(row);
+        }
+        rows[key] = row;
+        matches[key] = match;
+    }
+
+    // A resync or fallback poll still only touches the rows that actually changed.
+    function replace_all(all_matches) {
+        loaded = true;
+        var seen = {};
+        all_matches.forEach(function(match) {
+            var key = key_of(match);
+            seen[key] = true;
+            if (!(key in matches) || JSON.stringify(matches[key]) !== JSON.stringify(match)) {
+                upsert(key, match);
+            }
+        });
+        Object.keys(rows).filter((key) => !(key in seen)).forEach(remove);
+        reorder();
+    }
+
+    function note_version(new_version) {
+        if (version === null || new_version > version) {
+            version = new_version;
+        }
+    }
+
+    function set_status(text) {
+        options.status.textContent = text;
+    }
+
+    socket.on("match_resync", function(payload) {
+        version = payload.version;
+        replace_all(payload.matches);
+        set_status("Live.");
+    });
+
+    socket.on("match_added", function(payload) {
+        note_version(payload.version);
+        upsert(payload.key, payload.match);
+        reorder();
+    });
+    socket.on("match_changed", function(payload) {
+        note_version(payload.version);
+        upsert(payload.key, payload.match);
+        reorder();
+    });
+    socket.on("match_removed", function(payload) {
+        note_version(payload.version);
+        remove(payload.key);
+        reorder();
+    });
+
+    // Normalized matches with each slot's player put back where the socket's matches have it.
+    function join_players(payload) {
+        return payload.matches.map(function(match) {
+            var players = payload.players[match.tournamentID] || {};
+            var slots = match.slots.map((slot) => Object.assign({}, slot, {
+                'bracketeer_player_data': players[slot.playerID] || null,
+            }));
+            return Object.assign({}, match, {'slots': slots});
+        });
+    }
+
+    // Only while the socket's down; the server's ETags make an unchanged poll cheap.
+    function poll_fallback() {
+        fetch(options.fallback_url, {'cache': "no-cache"})
+            .then((response) => response.json())
+            .then(function(payload) {
+                replace_all(join_players(payload));
+                set_status("Reconnecting... (updated " + new Date().toLocaleTimeString() + ")");
+            })
+            .catch(() => set_status("Reconnecting... (can't reach the server)"));
+    }
+
+    function arm_fallback() {
+        if (fallback_timer === null) {
+            fallback_timer = setInterval(poll_fallback, fallback_interval);
+        }
+    }
+
+    function subscribe() {
+        clearInterval(fallback_timer);
+        fallback_timer = null;
+        socket.emit("client_subscribe_matches", version === null ? {} : {'version': version});
+    }
+
+    // The fallback runs from page load until the first connect, and again whenever the socket
+    // drops.  A socket that never connects only gets connect_errors, never a disconnect.
+    socket.on("connect", subscribe);
+    socket.on("disconnect", function() {
+        set_status("Reconnecting...");
+        arm_fallback();
+    });
+    socket.on("connect_error", function() {
+        if (!loaded) {
+            // Don't leave the table empty for a whole interval.
+            poll_fallback();
+        }
+        arm_fallback();
+    });
+    if (socket.connected) {
+        subscribe();
+    } else {
+        set_status("Connecting...");
+        arm_fallback();
+    }
+
+    // "Called 3 minutes ago" moves on without anything changing.
+    setInterval(function() {
+        Object.keys(rows).forEach(function(key) {
+            var label = rows[key].querySelector(".called_since");
+            if (label) {
+                label.textContent = called_text(matches[key]);
+            }
+        });
+    }, 15000);
+}
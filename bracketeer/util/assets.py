@@ -0,0 +1,230 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import posixpath
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import perf_counter
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+"""
+Static files, fingerprinted and precompressed once at startup rather than
+read off disk (and sent uncompressed) for every screen on every load.
+
+init_assets(app) walks the app's and every blueprint's static folder, keeps
+each file in memory with a hash of its contents, and gzips (and, if the
+`brotli` package is about, brotlis) anything that compresses.  Then:
+
+    url_for("static", filename=...) gets `?v=<hash>` added, and a request
+    with the current hash is sent `Cache-Control: immutable` for a year.
+    Without one (hard-coded paths, fonts pulled in by relative CSS urls we
+    couldn't resolve) it's `no-cache` plus an ETag, so it's a 304 at worst.
+
+    Each response is the smallest encoding the client accepts.
+
+    CSS url()s pointing at other static files are rewritten to carry the
+    target's hash too (Font Awesome's webfonts, say), before the CSS itself
+    is hashed.
+
+Files added after startup aren't in the manifest; they go to Flask's own
+static handler as before.  So does everything while `app.debug` is set, so
+edits to the static files show up on the dev server without a restart.
+"""
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+COMPRESSIBLE = {
+    ".css",
+    ".js",
+    ".json",
+    ".map",
+    ".svg",
+    ".txt",
+    ".html",
+    ".ttf",
+    ".otf",
+    ".eot",
+}
+# Not worth a Content-Encoding if it saves less than this.
+MIN_SAVING = 0.1
+
+_CSS_URL = re.compile(r"""url\((['"]?)([^'")]+)\1\)""")
+
+
+@dataclass
+class Asset:
+    path: str
+    mimetype: str
+    digest: str
+    # encoding ("identity", "gzip", "br") -> body
+    bodies: dict = field(default_factory=dict)
+
+
+def _compress(asset: Asset):
+    body = asset.bodies["identity"]
+    if Path(asset.path).suffix.lower() not in COMPRESSIBLE or len(body) < 256:
+        return
+
+    candidates = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        # 11 is a few seconds over Bulma and friends at startup, for a percent or two.
+        candidates["br"] = brotli.compress(body, quality=9)
+
+    for encoding, compressed in candidates.items():
+        if len(compressed) <= len(body) * (1 - MIN_SAVING):
+            asset.bodies[encoding] = compressed
+
+
+def build_asset(filename: str, body: bytes, mimetype: str = None) -> Asset:
+    asset = Asset(
+        path=filename,
+        mimetype=mimetype
+        or mimetypes.guess_type(filename)[0]
+        or "application/octet-stream",
+        digest=hashlib.sha256(body).hexdigest()[:12],
+        bodies={"identity": body},
+    )
+    _compress(asset)
+    return asset
+
+
+class AssetManifest:
+    def __init__(self):
+        # endpoint -> filename -> Asset
+        self.assets = {}
+
+    def lookup(self, endpoint: str, filename: str):
+        return self.assets.get(endpoint, {}).get(filename)
+
+    def _rewrite_css(self, endpoint: str, filename: str, css: bytes) -> bytes:
+        def versioned(match):
+            quote, target = match.groups()
+            if (
+                target.startswith(("data:", "http:", "https:", "/", "#"))
+                or "?" in target
+            ):
+                return match.group(0)
+
+            resolved = posixpath.normpath(
+                posixpath.join(posixpath.dirname(filename), target),
+            )
+            asset = self.lookup(endpoint, resolved)
+            if asset is None:
+                return match.group(0)
+            return f"url({quote}{target}?v={asset.digest}{quote})"
+
+        return _CSS_URL.sub(versioned, css.decode("utf-8")).encode("utf-8")
+
+    def add_folder(self, endpoint: str, folder: str):
+        root = Path(folder)
+        if not root.is_dir():
+            return
+
+        files = sorted(path for path in root.rglob("*") if path.is_file())
+        assets = self.assets.setdefault(endpoint, {})
+        # CSS last, so whatever it points at already has a hash.
+        for path in sorted(files, key=lambda path: path.suffix.lower() == ".css"):
+            filename = path.relative_to(root).as_posix()
+            body = path.read_bytes()
+            if path.suffix.lower() == ".css":
+                body = self._rewrite_css(endpoint, filename, body)
+
+            assets[filename] = build_asset(filename, body)
+
+    def stats(self) -> dict:
+        assets = [
+            asset for by_name in self.assets.values() for asset in by_name.values()
+        ]
+        return {
+            "files": len(assets),
+            "bytes": sum(len(asset.bodies["identity"]) for asset in assets),
+            "compressed_bytes": sum(
+                min(len(body) for body in asset.bodies.values()) for asset in assets
+            ),
+        }
+
+
+manifest = AssetManifest()
+
+
+def asset_response(asset: Asset, immutable: bool = False):
+    """Response for `asset` in the best encoding the current request accepts."""
+    from flask import Response, request
+
+    encoding = request.accept_encodings.best_match(
+        [encoding for encoding in ("br", "gzip") if encoding in asset.bodies],
+        default="identity",
+    )
+
+    response = Response(asset.bodies[encoding], mimetype=asset.mimetype)
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.set_etag(f"{asset.digest}-{encoding}")
+    response.headers["Cache-Control"] = IMMUTABLE if immutable else "no-cache"
+    if encoding != "identity":
+        return response.make_conditional(request)
+    # Audio gets fetched in ranges.
+    return response.make_conditional(
+        request,
+        accept_ranges=True,
+        complete_length=len(asset.bodies[encoding]),
+    )
+
+
+def _static_endpoints(app) -> dict:
+    endpoints = {"static": app.static_folder}
+    for name, blueprint in app.blueprints.items():
+        if blueprint.static_folder is not None:
+            endpoints[f"{name}.static"] = blueprint.static_folder
+    return endpoints
+
+
+def init_assets(app):
+    from flask import request
+
+    start = perf_counter()
+    endpoints = _static_endpoints(app)
+    for endpoint, folder in endpoints.items():
+        manifest.add_folder(endpoint, folder)
+
+    stats = manifest.stats()
+    logging.info(
+        f"Built {stats['files']} static assets in {perf_counter() - start:.2f}s, "
+        f"{stats['bytes'] / 1e6:.1f}MB down to {stats['compressed_bytes'] / 1e6:.1f}MB compressed"
+        f"{'' if brotli else ' (gzip only, brotli is not installed)'}.",
+    )
+
+    @app.url_defaults
+    def _fingerprint_static(endpoint, values):
+        if app.debug:
+            return
+        if endpoint in endpoints and "v" not in values:
+            asset = manifest.lookup(endpoint, values.get("filename"))
+            if asset is not None:
+                values["v"] = asset.digest
+
+    def serving(endpoint, original_view):
+        def serve_asset(filename):
+            asset = None if app.debug else manifest.lookup(endpoint, filename)
+            if asset is None:
+                return original_view(filename=filename)
+            return asset_response(
+                asset,
+                immutable=request.args.get("v") == asset.digest,
+            )
+
+        return serve_asset
+
+    for endpoint in endpoints:
+        if endpoint in app.view_functions:
+            app.view_functions[endpoint] = serving(
+                endpoint,
+                app.view_functions[endpoint],
+            )
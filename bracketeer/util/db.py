@@ -0,0 +1,241 @@
+import atexit
+import functools
+import logging
+import queue
+import threading
+from pathlib import Path
+from time import monotonic, perf_counter
+
+from bracketeer.util.metrics import SIZE_BUCKETS, metrics
+
+"""
+SQLite plumbing shared by the cache and client tables.
+
+All writes go through one BatchedWriter thread instead of whichever request
+thread happened to need them.  It waits for the first queued write, collects
+anything else that shows up within `flush_interval`, and commits the lot in a
+single transaction per database, with consecutive inserts into the same table
+merged into as few statements as SQLite's parameter limit allows.  If that
+transaction fails, its operations are retried one at a time, so a bad row only
+loses itself.
+
+With WAL journaling (see prepare_sqlite) readers never wait on that writer,
+they just see the last committed state.  Anything that needs its own write
+back straight away should keep it in memory as well, as the API cache does.
+"""
+
+
+def setup_once(setup):
+    """Decorator for a database's create_table / migration / prepare_sqlite
+    step, so it runs the first time something actually needs the tables
+    instead of whenever the module happens to be imported.
+
+    Call the decorated function before any query; after the first call it's
+    a flag check."""
+    done = False
+    lock = threading.Lock()
+
+    @functools.wraps(setup)
+    def ensure():
+        nonlocal done
+        if done:
+            return
+
+        with lock:
+            if not done:
+                start = perf_counter()
+                setup()
+                done = True
+                logging.info(f"{setup.__name__} took {perf_counter() - start:.3f}s.")
+
+    return ensure
+
+
+def prepare_sqlite(table, indexes: dict = None):
+    """Switches the table's database to WAL and incremental auto-vacuum, and
+    creates any missing indexes.
+
+    `indexes` maps index name -> list of column names."""
+    # Both of these stick to the file, so they only really do anything once.
+    # auto_vacuum needs a full VACUUM to take effect on an existing file.
+    if table.raw("PRAGMA auto_vacuum").run_sync()[0]["auto_vacuum"] != 2:
+        logging.info(
+            f"Converting {table._meta.tablename}'s database to incremental vacuum.",
+        )
+        table.raw("PRAGMA auto_vacuum=INCREMENTAL").run_sync()
+        table.raw("VACUUM").run_sync()
+
+    table.raw("PRAGMA journal_mode=WAL").run_sync()
+
+    tablename = table._meta.tablename
+    for index_name, columns in (indexes or {}).items():
+        table.raw(
+            f"CREATE INDEX IF NOT EXISTS {index_name} ON {tablename} ({', '.join(columns)})",
+        ).run_sync()
+
+
+def incremental_vacuum(table, pages: int = 0):
+    """Query handing free pages back to the filesystem, all of them if `pages` is 0.
+
+    Returned rather than run so it can be queued behind the deletes on the writer."""
+    return table.raw(f"PRAGMA incremental_vacuum({int(pages)})")
+
+
+def database_file_size(engine) -> int:
+    """Bytes on disk for the database, counting the WAL alongside it."""
+    size = 0
+    for suffix in ("", "-wal"):
+        path = Path(f"{engine.path}{suffix}")
+        if path.exists():
+            size += path.stat().st_size
+    return size
+
+
+# SQLite's default cap on bound parameters in one statement.
+SQLITE_MAX_VARIABLES = 999
+
+
+def _insert_chunks(table, rows: list):
+    """`rows` split so each multi-row insert stays under SQLITE_MAX_VARIABLES."""
+    per_chunk = max(1, SQLITE_MAX_VARIABLES // len(table._meta.columns))
+    for start in range(0, len(rows), per_chunk):
+        yield rows[start : start + per_chunk]
+
+
+class BatchedWriter:
+    def __init__(self, flush_interval: float = 0.25, max_batch: int = 500):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name="bracketeer_db_writer",
+                    daemon=True,
+                )
+                self._thread.start()
+
+    def insert(self, table, row):
+        """Queues `row` (an instance of `table`) to be inserted."""
+        self._ensure_started()
+        self._queue.put(("insert", table, row))
+
+    def run(self, query):
+        """Queues any other write query (update, delete) to run in order with the inserts."""
+        self._ensure_started()
+        self._queue.put(("query", query.table._meta.db, query))
+
+    def flush(self, timeout: float = None):
+        """Blocks until everything queued so far has been written."""
+        if self._thread is None:
+            return
+
+        done = threading.Event()
+        self._queue.put(("flush", None, done))
+        done.wait(timeout)
+
+    def stop(self):
+        # Daemon thread, so this is just a last chance to get queued writes out.
+        self.flush(timeout=5)
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = monotonic() + self.flush_interval
+
+        while len(batch) < self.max_batch:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _write(self, batch: list):
+        # engine -> queries, in the order they were queued.
+        per_engine = {}
+
+        for kind, target, item in batch:
+            if kind == "flush":
+                continue
+
+            if kind == "insert":
+                queries = per_engine.setdefault(target._meta.db, [])
+                # A run of inserts into the same table becomes one statement.
+                if (
+                    queries
+                    and isinstance(queries[-1], list)
+                    and queries[-1][0] is target
+                ):
+                    queries[-1][1].append(item)
+                else:
+                    queries.append([target, [item]])
+            else:
+                per_engine.setdefault(target, []).append(item)
+
+        for engine, queries in per_engine.items():
+            self._write_engine(engine, queries)
+
+    def _write_engine(self, engine, queries: list):
+        try:
+            atomic = engine.atomic()
+            for query in queries:
+                if isinstance(query, list):
+                    table, rows = query
+                    for chunk in _insert_chunks(table, rows):
+                        atomic.add(table.insert(*chunk))
+                else:
+                    atomic.add(query)
+            atomic.run_sync()
+        except Exception:
+            logging.warning(
+                "Batched DB write failed, retrying its operations one at a time.",
+                exc_info=True,
+            )
+            # So one bad row only loses itself, not everything queued alongside it.
+            for query in queries:
+                if isinstance(query, list):
+                    table, rows = query
+                    for row in rows:
+                        self._write_one(table.insert(row))
+                else:
+                    self._write_one(query)
+
+    @staticmethod
+    def _write_one(query):
+        try:
+            query.run_sync()
+        except Exception:
+            logging.exception(f"Failed to write queued DB operation {query}.")
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+
+            try:
+                with metrics.timed("bracketeer_db_batch_seconds"):
+                    self._write(batch)
+                metrics.observe("bracketeer_db_batch_rows", len(batch), SIZE_BUCKETS)
+            except Exception:
+                logging.exception(
+                    f"Failed to write a batch of {len(batch)} queued DB operations.",
+                )
+
+            for kind, _, item in batch:
+                if kind == "flush":
+                    item.set()
+
+
+db_writer = BatchedWriter()
+atexit.register(db_writer.stop)
@@ -0,0 +1,238 @@
+import logging
+import re
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+"""
+In-process metrics: counters, gauges and histograms, kept in memory and
+exposed as Prometheus-style text at /metrics (and as a table on
+/debug/metrics for people).
+
+What's measured:
+    bracketeer_http_request_seconds          every Flask route, by rule/method/status
+    bracketeer_view_seconds                  views wrapped in runtime_err_warn
+    bracketeer_truefinals_request_seconds    every makeAPIRequest, by endpoint/status
+    bracketeer_truefinals_token_wait_seconds time spent waiting on the rate limiter
+    bracketeer_truefinals_ratelimit_*        the X-RateLimit-* headers of the last response
+    bracketeer_cache_query_seconds           API cache reads, by query
+    bracketeer_cache_lookups_total           API cache lookups, by kind and hit/stale/miss
+    bracketeer_db_batch_seconds / _rows      each batch the DB writer commits
+    bracketeer_player_index_build_seconds    player index rebuilds
+    bracketeer_render_cache_total            upcoming page renders, by route and hit/miss/uncached
+    bracketeer_socketio_fanout               clients each Socket.IO emit went to, by event
+
+Nothing here is persisted; it all starts over with the process.
+"""
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+FANOUT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (1, 5, 10, 50, 100, 500, 1000)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # The last one is +Inf.
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float):
+        """Upper bound of the bucket the q-th observation landed in."""
+        if self.count == 0:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_key: tuple, extra=()) -> str:
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    return (
+        "{"
+        + ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in pairs)
+        + "}"
+    )
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # name -> (type, buckets or None, {label_key: value})
+        self._metrics = {}
+
+    def _series(self, name: str, kind: str, buckets=None) -> dict:
+        if name not in self._metrics:
+            self._metrics[name] = (kind, buckets, {})
+        return self._metrics[name][2]
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        with self._lock:
+            series = self._series(name, "counter")
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._series(name, "gauge")[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, buckets=LATENCY_BUCKETS, **labels):
+        with self._lock:
+            series = self._series(name, "histogram", buckets)
+            key = _label_key(labels)
+            if key not in series:
+                series[key] = Histogram(self._metrics[name][1])
+            series[key].observe(value)
+
+    @contextmanager
+    def timed(self, name: str, **labels):
+        """Observes how long the block took, in seconds, even if it raises."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - start, **labels)
+
+    def render_text(self) -> str:
+        lines = []
+        with self._lock:
+            for name, (kind, _, series) in sorted(self._metrics.items()):
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(series.items()):
+                    if kind != "histogram":
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+                        continue
+
+                    cumulative = 0
+                    for bound, bucket_count in zip(
+                        value.buckets + ("+Inf",),
+                        value.counts,
+                    ):
+                        cumulative += bucket_count
+                        lines.append(
+                            f"{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}",
+                        )
+                    lines.append(f"{name}_sum{_format_labels(key)} {value.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {value.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> list:
+        """One row per series, for the debug page."""
+        rows = []
+        with self._lock:
+            for name, (kind, _, series) in sorted(self._metrics.items()):
+                for key, value in sorted(series.items()):
+                    row = {"name": name, "type": kind, "labels": dict(key)}
+                    if kind == "histogram":
+                        row.update(
+                            count=value.count,
+                            mean=(value.sum / value.count) if value.count else None,
+                            p50=value.quantile(0.5),
+                            p90=value.quantile(0.9),
+                            p99=value.quantile(0.99),
+                        )
+                    else:
+                        row["value"] = value
+                    rows.append(row)
+        return rows
+
+
+metrics = MetricsRegistry()
+
+_TRUEFINALS_ID = re.compile(r"/[0-9a-f]{16,}")
+
+
+def truefinals_endpoint_label(endpoint: str) -> str:
+    """Endpoint with the ids taken out, so every division lands in one series."""
+    return _TRUEFINALS_ID.sub("/{id}", endpoint)
+
+
+def _instrument_socketio(socketio):
+    # Everything goes through SocketIO.emit, flask_socketio.emit in handlers included.
+    emit = socketio.emit
+
+    def counted_emit(event, *args, **kwargs):
+        room = kwargs.get("to", kwargs.get("room"))
+        try:
+            fanout = sum(
+                1
+                for _ in socketio.server.manager.get_participants(
+                    kwargs.get("namespace") or "/",
+                    room,
+                )
+            )
+            metrics.observe(
+                "bracketeer_socketio_fanout",
+                fanout,
+                FANOUT_BUCKETS,
+                event=event,
+            )
+        except Exception:
+            logging.debug(f"Couldn't count recipients of {event}.", exc_info=True)
+        return emit(event, *args, **kwargs)
+
+    socketio.emit = counted_emit
+
+
+def init_metrics(app, socketio):
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_request_start = perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        start = g.pop("metrics_request_start", None)
+        if start is not None:
+            metrics.observe(
+                "bracketeer_http_request_seconds",
+                perf_counter() - start,
+                route=(request.url_rule.rule if request.url_rule else "unmatched"),
+                method=request.method,
+                status=response.status_code,
+            )
+        return response
+
+    _instrument_socketio(socketio)
@@ -0,0 +1,109 @@
+import logging
+import threading
+from time import time
+
+from bracketeer.config import settings as arena_settings
+from bracketeer.util.db import db_writer
+
+"""
+Who's connected right now, kept in memory and keyed on the Socket.IO sid.
+
+Each entry notes the page and cage the client told us about, where it
+connected from, and when we last heard from it.  Anything a client sends
+(connecting, `exists`, joining a cage, the `presence_heartbeat` the pages
+send every so often) counts as hearing from it, and disconnecting removes
+it.  `/clients` reads straight from here.
+
+Every `presence_checkpoint_interval` seconds, if anything changed, the whole
+registry is written out to BracketeerClients in one batch so there's a record
+of what was up if the server falls over.  Sids don't survive a restart, so
+the table is replaced each time rather than appended to.
+"""
+
+DEFAULT_CHECKPOINT_INTERVAL = 30
+
+# Pages heartbeat every 15s; a couple missed and it's probably asleep.
+IDLE_AFTER = 45
+
+
+class PresenceRegistry:
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def touch(self, sid: str, **details):
+        """Notes that we heard from `sid`, updating whatever `details` it gave us."""
+        now = time()
+        with self._lock:
+            client = self._clients.get(sid)
+            if client is None:
+                client = {"sid": sid, "page": None, "cage": None, "connected_at": now}
+                self._clients[sid] = client
+            client.update(
+                {key: value for key, value in details.items() if value is not None},
+            )
+            client["last_seen"] = now
+            self._dirty = True
+
+    def drop(self, sid: str):
+        with self._lock:
+            if self._clients.pop(sid, None) is not None:
+                self._dirty = True
+
+    def clients(self) -> list:
+        now = time()
+        with self._lock:
+            listing = [dict(client) for client in self._clients.values()]
+
+        for client in listing:
+            client["idle"] = now - client["last_seen"]
+            client["live"] = client["idle"] < IDLE_AFTER
+        return sorted(
+            listing,
+            key=lambda client: (str(client["cage"]), client["connected_at"]),
+        )
+
+    def __len__(self):
+        return len(self._clients)
+
+    def checkpoint(self) -> bool:
+        """Queues a rewrite of BracketeerClients if anything changed since the last one."""
+        from bracketeer.util.wrappers import BracketeerClients, prepare_clients_db
+
+        with self._lock:
+            if not self._dirty:
+                return False
+            listing = [dict(client) for client in self._clients.values()]
+            self._dirty = False
+
+        prepare_clients_db()
+
+        db_writer.run(BracketeerClients.delete(force=True))
+        for client in listing:
+            db_writer.insert(
+                BracketeerClients,
+                BracketeerClients(sid=client["sid"], information=client),
+            )
+        return True
+
+
+presence = PresenceRegistry()
+
+
+def _checkpoint_loop(socketio):
+    interval = arena_settings.get(
+        "presence_checkpoint_interval",
+        DEFAULT_CHECKPOINT_INTERVAL,
+    )
+    while True:
+        socketio.sleep(interval)
+        try:
+            if presence.checkpoint():
+                logging.info(f"Checkpointed {len(presence)} connected clients.")
+        except Exception:
+            logging.exception("Failed to checkpoint connected clients.")
+
+
+def init_presence(socketio):
+    socketio.start_background_task(_checkpoint_loop, socketio)
@@ -1,4 +1,5 @@
 import logging
+from time import time
 
 from flask import render_template
 
@@ -23,7 +24,10 @@ from piccolo.columns import JSON, UUID, Text
 from piccolo.engine.sqlite import SQLiteEngine
 from piccolo.table import Table
 
-bracketeer_clients = SQLiteEngine(path="bracketeer_clients.sqlite")
+from bracketeer.util.db import prepare_sqlite, setup_once
+from bracketeer.util.presence import presence
+
+bracketeer_clients = SQLiteEngine(path="bracketeer_clients.sqlite", timeout=10)
 
 
 # This is used to handle message registration in a "mutable" way, since
@@ -32,57 +36,154 @@ bracketeer_clients = SQLiteEngine(path="bracketeer_clients.sqlite")
 # anything race.
 
 
+# Checkpoints of the presence registry, see presence.py.
 class BracketeerClients(Table, db=bracketeer_clients):
     id = UUID(primary_key=True)
     sid = Text()
     information = JSON()
 
 
-BracketeerClients.create_table(if_not_exists=True).run_sync()
+@setup_once
+def prepare_clients_db():
+    BracketeerClients.create_table(if_not_exists=True).run_sync()
+    prepare_sqlite(BracketeerClients, indexes={"bracketeer_clients_sid": ["sid"]})
 
 
 class SocketIOHandlerConstruction:
     def __init__(self, socketio):
+        @socketio.on("connect")
+        def connect_handler():
+            presence.touch(
+                request.sid,
+                remote_addr=request.remote_addr,
+                user_agent=request.headers.get("User-Agent"),
+            )
+
         @socketio.on("disconnect")
         def disconnect_handler():
-            pass
+            from bracketeer.screens.clock_sync import drop_client
+
+            presence.drop(request.sid)
+            drop_client(request.sid)
+
+        # Timer screens measuring their clock against ours, see clock_sync.py.
+        # The ack carries our time; the ping carries their last measurement.
+        @socketio.on("clock_ping")
+        def _handle_clock_ping(ping=None):
+            from bracketeer.screens.clock_sync import record_sample
+
+            if not isinstance(ping, dict):
+                ping = {}
+            # Malformed samples are just dropped, the ack still goes out.
+            record_sample(
+                request.sid,
+                ping.get("cage"),
+                ping.get("rtt"),
+                ping.get("offset"),
+            )
+
+            return {"t0": ping.get("t0"), "server_time": int(time() * 1000)}
 
         @socketio.on("client_attests_existence")
         def _handle_attestation(location):
-            pass
+            presence.touch(request.sid, page=(location or {}).get("location"))
+
+        # Pages send these every so often, with the same shape as connect_location.
+        @socketio.on("presence_heartbeat")
+        @socketio.on("connect_location")
+        def _handle_presence(location=None):
+            location = location or {}
+            presence.touch(
+                request.sid,
+                page=location.get("data"),
+                cage=location.get("cage"),
+            )
 
         @socketio.on("client_notify_schedule")
         def _handle_notif_schedule(location):
-            join_room("schedule_update")
+            from bracketeer.matches.schedule_push import (
+                SCHEDULE_ROOM,
+                current_schedule_fragment,
+            )
+
+            join_room(SCHEDULE_ROOM)
+            # Fill the panel straight away rather than waiting for the next change.
+            emit("schedule_data", current_schedule_fragment(), to=request.sid)
 
         @socketio.on("client_requests_schedule")
         def _handle_schedule_upd():
-            pass
+            from bracketeer.matches.schedule_push import current_schedule_fragment
 
-        # Wrapper to take note of clients as they connect/reconnect to store in above so we can keep track of their current page.
-        @socketio.on("exists")
-        def state_client_exists():
-            find_resp = (
-                BracketeerClients.select()
-                .where(BracketeerClients.sid == request.sid)
-                .output(load_json=True)
-            ).run_sync()
+            emit("schedule_data", current_schedule_fragment(), to=request.sid)
+
+        def _requested_version(request_data):
+            if not isinstance(request_data, dict):
+                return None
+            return request_data.get("version")
+
+        def _send_match_catchup(version):
+            from bracketeer.matches.match_deltas import deltas_since, full_resync
 
-            if len(find_resp) == 0:
-                BracketeerClients.insert(
-                    BracketeerClients(sid=request.sid, information=request),
-                ).run_sync()
+            missed = deltas_since(version)
+            if missed is None:
+                emit("match_resync", full_resync(), to=request.sid)
+                return
 
+            # Events are upserts / deletes keyed on the match, so a client
+            # seeing one twice (caught up *and* broadcast) is harmless.
+            for event_name, payload in missed:
+                emit(event_name, payload, to=request.sid)
+
+        # Screens that want per-match updates.  `version` is the last one the
+        # client applied, leave it out (first load) to get everything.
+        @socketio.on("client_subscribe_matches")
+        def _handle_match_subscription(request_data=None):
+            from bracketeer.matches.match_deltas import MATCH_UPDATES_ROOM
+
+            join_room(MATCH_UPDATES_ROOM)
+            _send_match_catchup(_requested_version(request_data))
+
+        @socketio.on("client_requests_match_sync")
+        def _handle_match_sync(request_data=None):
+            _send_match_catchup(_requested_version(request_data))
+
+        # Clients say this as they connect/reconnect; we ask them where they are in return.
+        @socketio.on("exists")
+        def state_client_exists():
+            presence.touch(request.sid)
             emit("arena_query_location", to=request.sid)
 
         @socketio.on("globalESTOP")
         def global_safety_eSTOP():
+            from bracketeer.screens.cage_timer import estop_cage_timers
+
             valid_rooms = [ctl_rooms for ctl_rooms in rooms()]
+            estop_cage_timers(
+                [
+                    int(v[len("cage_no_") :])
+                    for v in valid_rooms
+                    if v.startswith("cage_no_")
+                ],
+            )
             for v in valid_rooms:
                 emit("timer_event", "STOP", to=v)
                 emit("timer_bg_event", {"color": "red", "cageID": 999}, to=v)
 
+        # The controller drives the cage's timer through these, see cage_timer.py.
+        @socketio.on("timer_command")
+        def _handle_timer_command(command_data: dict):
+            from bracketeer.screens.cage_timer import apply_timer_command
+
+            if not isinstance(command_data, dict):
+                return
+            apply_timer_command(
+                command_data.get("cageID"),
+                command_data.get("command"),
+                command_data.get("seconds"),
+            )
+
         # Old global handler, should probably be moved to globally accessible timer area.
+        # Still used for free-text messages on the screens; the clock itself is timer_state now.
         @socketio.on("timer_event")
         def handle_message(timer_message):
             print(timer_message)
@@ -102,16 +203,31 @@ class SocketIOHandlerConstruction:
 
         @socketio.on("join_cage_request")
         def join_cage_handler(request_data: dict):
+            presence.touch(
+                request.sid,
+                page=request_data.get("data"),
+                cage=request_data.get("cage_id", request_data.get("cage")),
+            )
             if "cage_id" in request_data:
-                join_room(f'cage_no_{request_data["cage_id"]}')
+                from bracketeer.screens.cage_timer import current_timer_frame
+
+                # Whatever the clock's doing right now, rather than waiting for the next change.
+                frame = current_timer_frame(request_data["cage_id"])
+                if frame is None:
+                    logging.warning(
+                        f"User SID ({request.sid}) asked to join unknown cage {request_data['cage_id']!r}.",
+                    )
+                    return
+
+                cage_id = frame["cageID"]
+                join_room(f"cage_no_{cage_id}")
+                emit("timer_state", frame, to=request.sid)
                 emit(
                     "client_joined_room",
-                    f'cage_no_{request_data["cage_id"]}',
-                    to=f"cage_no_{request_data['cage_id']}",
-                )
-                logging.info(
-                    f"User SID ({request.sid}) has joined Cage #{request_data['cage_id']}",
+                    f"cage_no_{cage_id}",
+                    to=f"cage_no_{cage_id}",
                 )
+                logging.info(f"User SID ({request.sid}) has joined Cage #{cage_id}")
 
         @socketio.on("player_ready")
         def handle_message(ready_msg: dict):
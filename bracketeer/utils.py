@@ -1,23 +1,27 @@
-from pathlib import Path
+import functools
+import logging
+from time import perf_counter
 
-from dynaconf import Dynaconf
 from flask import flash
 
-secrets = Dynaconf(envvar_prefix="DYNACONF", settings_files=[Path(".secrets.json")])
+from bracketeer.config import secrets
+from bracketeer.util.metrics import metrics
 
 
 def runtime_err_warn(func):
     """Decorator that reports the execution time."""
 
+    @functools.wraps(func)
     def wrap(*args, **kwargs):
-        # start = time.time()
+        start = perf_counter()
 
         if "challonge" not in secrets:
             flash(
                 "Challonge tokens / user credentials not provided, requests made with POSTs / that aren't static <i>will</i> fail.<br><br>Use Settings to change.",
             )
 
-        if "truefinals" not in secrets:
+        # config.py fills in a blank truefinals entry when there isn't one.
+        if not secrets.truefinals.get("api_key"):
             flash(
                 "TrueFinals user_id and token not provided, requests to the site <i>will</i> fail.<br><br>Use Settings to change.",
             )
@@ -27,10 +31,11 @@ def runtime_err_warn(func):
                 "No local credentials for OBS WebSockets provided.  This will still allow all operation to continue, but will not attempt to provide control buttons for OBS websockets in the match control pane.",
             )
 
-        result = func(*args, **kwargs)
-        # end = time.time()
-
-        # print(func.__name__, end-start)
-        return result
+        try:
+            return func(*args, **kwargs)
+        finally:
+            duration = perf_counter() - start
+            metrics.observe("bracketeer_view_seconds", duration, view=func.__name__)
+            logging.debug(f"{func.__name__} took {duration:.4f}s")
 
     return wrap
@@ -0,0 +1,38 @@
+import json
+import os
+
+import pytest
+
+"""
+Settings and the SQLite files are picked up from the working directory on
+first use (see config.py), so the whole session runs in a scratch directory
+with a minimal event of its own, never next to a real one.
+"""
+
+
+@pytest.fixture(scope="session", autouse=True)
+def scratch_event(tmp_path_factory):
+    scratch = tmp_path_factory.mktemp("event")
+    (scratch / "event.json").write_text(
+        json.dumps(
+            {
+                "event_name": "Test Event",
+                "match_duration": 150,
+                "tournament_keys": [],
+                "tournament_cages": [{"name": "Cage 1", "id": 1}],
+            },
+        ),
+    )
+    (scratch / ".secrets.json").write_text(
+        json.dumps({"truefinals": {"user_id": "test", "api_key": "test"}}),
+    )
+
+    previous = os.getcwd()
+    os.chdir(scratch)
+    yield scratch
+
+    # The SQLite paths are relative, so queued writes have to land before we leave.
+    from bracketeer.util.db import db_writer
+
+    db_writer.flush(timeout=5)
+    os.chdir(previous)
@@ -0,0 +1,282 @@
+import json
+import threading
+from uuid import uuid4
+
+import httpx
+import pytest
+
+from bracketeer.api_truefinals import cached_api
+from bracketeer.api_truefinals.cached_api import TrueFinalsAPICache
+from bracketeer.util.db import db_writer
+
+GAMES = [{"id": "A1", "state": "called"}, {"id": "A2", "state": "done"}]
+
+
+class FakeUpstream:
+    """Stands in for makeAPIRequest, handing out queued responses in order."""
+
+    def __init__(self):
+        self.responses = []
+        self.calls = []
+
+    def queue(self, status_code, body=b"", headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.responses.append(
+            httpx.Response(status_code, content=body, headers=headers),
+        )
+
+    def __call__(self, endpoint, **kwargs):
+        self.calls.append((endpoint, kwargs))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    upstream = FakeUpstream()
+    monkeypatch.setattr(cached_api, "makeAPIRequest", upstream)
+    # Nothing remembered from other tests.
+    monkeypatch.setattr(cached_api, "_latest_responses", {})
+    return upstream
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(1_700_000_000.0)
+    monkeypatch.setattr(cached_api, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def endpoint():
+    return f"/v1/tournaments/{uuid4().hex[:16]}/games"
+
+
+def get(endpoint, **kwargs):
+    kwargs.setdefault("expiry", 15)
+    kwargs.setdefault("hard_expiry", 600)
+    kwargs.setdefault("revalidate_inline", True)
+    return cached_api.getAPIEndpointRespectfully(endpoint, **kwargs)
+
+
+def stored_rows(endpoint) -> list:
+    db_writer.flush(timeout=5)
+    return (
+        TrueFinalsAPICache.select(
+            TrueFinalsAPICache.successful,
+            TrueFinalsAPICache.resp_code,
+        )
+        .where(TrueFinalsAPICache.api_path == endpoint)
+        .order_by(TrueFinalsAPICache.last_requested)
+        .run_sync()
+    )
+
+
+def test_cold_fetch_is_stored_and_served(upstream, clock, endpoint):
+    upstream.queue(200, GAMES, {"etag": '"v1"'})
+
+    rows = get(endpoint)
+    assert rows[0]["response"] == GAMES
+    assert rows[0]["stale"] is False
+    assert stored_rows(endpoint) == [{"successful": True, "resp_code": 200}]
+
+    # Fresh, so it's served without going upstream again.
+    assert get(endpoint)[0]["id"] == rows[0]["id"]
+    assert len(upstream.calls) == 1
+
+
+@pytest.mark.parametrize(
+    ("status_code", "body"),
+    [
+        (503, b"<html><body>Service Unavailable</body></html>"),
+        (500, {"error": "internal"}),
+        (404, {"error": "not found"}),
+        (401, {"error": "bad key"}),
+        # A 2xx that isn't JSON is as good as a failure.
+        (200, b"<html>maintenance</html>"),
+        (200, b""),
+        (200, b"null"),
+    ],
+)
+def test_failed_refresh_keeps_serving_the_last_good_copy(
+    upstream,
+    clock,
+    endpoint,
+    status_code,
+    body,
+):
+    upstream.queue(200, GAMES)
+    good = get(endpoint)[0]
+
+    clock.now += 60
+    upstream.queue(status_code, body)
+    rows = get(endpoint)
+
+    assert len(upstream.calls) == 2
+    assert rows[0]["id"] == good["id"]
+    assert rows[0]["response"] == GAMES
+    assert rows[0]["stale"] is True
+    assert rows[0]["age"] == 60
+    # The failure is kept for the debug pages, but never counts as a response.
+    assert stored_rows(endpoint) == [
+        {"successful": True, "resp_code": 200},
+        {"successful": False, "resp_code": status_code},
+    ]
+
+
+def test_failed_refresh_with_nothing_cached_is_empty(upstream, clock, endpoint):
+    upstream.queue(503, b"<html>down</html>")
+
+    assert get(endpoint) == []
+
+
+def test_failed_rows_show_up_undecoded_on_the_debug_pages(upstream, clock, endpoint):
+    upstream.queue(503, b"<html>down</html>")
+    get(endpoint)
+    db_writer.flush(timeout=5)
+
+    rows = [
+        row for row in cached_api.recent_cache_rows() if row["api_path"] == endpoint
+    ]
+    assert rows[0]["response"] == "<html>down</html>"
+
+
+def test_http_errors_fall_back_to_stale(upstream, clock, endpoint):
+    upstream.queue(200, GAMES)
+    good = get(endpoint)[0]
+
+    clock.now += 60
+    upstream.responses.append(httpx.ConnectError("unreachable"))
+    rows = get(endpoint)
+
+    assert rows[0]["id"] == good["id"]
+    assert rows[0]["stale"] is True
+
+
+def test_past_the_hard_expiry_is_nothing(upstream, clock, endpoint):
+    upstream.queue(200, GAMES)
+    get(endpoint)
+
+    clock.now += 601
+    upstream.queue(503, b"<html>down</html>")
+    assert get(endpoint) == []
+
+
+def test_conditional_request_and_304(upstream, clock, endpoint):
+    upstream.queue(
+        200,
+        GAMES,
+        {"etag": '"v1"', "last-modified": "Wed, 01 Jan 2025 00:00:00 GMT"},
+    )
+    good = get(endpoint)[0]
+    # Nothing to be conditional about the first time.
+    assert "etag" not in upstream.calls[0][1]
+
+    clock.now += 60
+    upstream.queue(304, headers={"x-ratelimit-remaining": "3"})
+    rows = get(endpoint)
+
+    assert upstream.calls[1][1]["etag"] == '"v1"'
+    assert upstream.calls[1][1]["last_modified"] == "Wed, 01 Jan 2025 00:00:00 GMT"
+    # Same row and the very same parsed body, just fresh again.
+    assert rows[0]["id"] == good["id"]
+    assert rows[0]["response"] is good["response"]
+    assert rows[0]["body_hash"] == good["body_hash"]
+    assert rows[0]["stale"] is False
+    assert rows[0]["age"] == 0
+    # A 304 only has the headers that changed.
+    assert rows[0]["resp_headers"]["etag"] == '"v1"'
+    assert rows[0]["resp_headers"]["x-ratelimit-remaining"] == "3"
+
+    db_writer.flush(timeout=5)
+    on_disk = (
+        TrueFinalsAPICache.select(TrueFinalsAPICache.last_requested)
+        .where(TrueFinalsAPICache.api_path == endpoint)
+        .run_sync()
+    )
+    assert on_disk == [{"last_requested": clock.now}]
+
+
+def test_same_bytes_without_validators_are_unchanged(upstream, clock, endpoint):
+    upstream.queue(200, GAMES)
+    good = get(endpoint)[0]
+
+    clock.now += 60
+    upstream.queue(200, GAMES)
+    rows = get(endpoint)
+
+    assert rows[0]["id"] == good["id"]
+    assert rows[0]["response"] is good["response"]
+    assert rows[0]["stale"] is False
+    assert stored_rows(endpoint) == [{"successful": True, "resp_code": 200}]
+
+
+def test_changed_body_is_a_new_row(upstream, clock, endpoint):
+    upstream.queue(200, GAMES, {"etag": '"v1"'})
+    good = get(endpoint)[0]
+
+    clock.now += 60
+    changed = [{**GAMES[0], "state": "active"}, GAMES[1]]
+    upstream.queue(200, changed, {"etag": '"v2"'})
+    rows = get(endpoint)
+
+    assert rows[0]["id"] != good["id"]
+    assert rows[0]["body_hash"] != good["body_hash"]
+    assert rows[0]["response"] == changed
+    assert len(stored_rows(endpoint)) == 2
+
+
+def test_size_cap_keeps_the_last_good_row_behind_failures(upstream, clock, endpoint):
+    upstream.queue(200, GAMES)
+    good = get(endpoint)[0]
+    for _ in range(3):
+        clock.now += 60
+        upstream.queue(503, b"<html>down</html>" * 100)
+        get(endpoint)
+    db_writer.flush(timeout=5)
+
+    doomed = cached_api._oversize_cache_ids(max_bytes=0)
+
+    assert good["id"] not in doomed
+    assert len([row for row in stored_rows(endpoint) if not row["successful"]]) == 3
+
+
+def test_stale_reads_queue_one_background_refresh(upstream, clock, endpoint):
+    upstream.queue(200, GAMES)
+    get(endpoint)
+
+    # Both workers busy, so the refreshes queue up behind them.
+    busy = threading.Event()
+    for _ in range(2):
+        cached_api._revalidate_pool.submit(busy.wait, 5)
+
+    clock.now += 60
+    upstream.queue(200, [*GAMES, {"id": "A3", "state": "available"}])
+    for _ in range(5):
+        assert get(endpoint, revalidate_inline=False)[0]["stale"] is True
+    busy.set()
+
+    # Whatever was queued before these has run once they have.
+    for _ in range(2):
+        cached_api._revalidate_pool.submit(lambda: None).result(5)
+    assert len(upstream.calls) == 2
+    assert len(get(endpoint)[0]["response"]) == 3
+
+
+def test_queued_refresh_skips_if_already_fresh(upstream, clock, endpoint):
+    upstream.queue(200, GAMES)
+    get(endpoint)
+
+    cached_api._revalidate(endpoint, 15)
+    assert len(upstream.calls) == 1
@@ -0,0 +1,187 @@
+import pytest
+
+from bracketeer.screens import cage_timer
+from bracketeer.screens.cage_timer import (
+    COUNTDOWN_SECONDS,
+    END_SOUND_LEAD,
+    START_SOUND_LEAD,
+    CageTimer,
+)
+
+DURATION = 150
+START = 1_700_000_000.0
+# When the match clock itself starts, once the countdown's done.
+MATCH_START = START + COUNTDOWN_SECONDS
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    settings = {"match_duration": DURATION}
+    monkeypatch.setattr(cage_timer, "arena_settings", settings)
+    return settings
+
+
+@pytest.fixture
+def timer(settings):
+    return CageTimer(cage_id=1, duration=DURATION)
+
+
+def run_until(timer, end: float, step: float = 0.1) -> list:
+    """Ticks from START to `end`; returns (time, sound) for every sound that came due."""
+    sounds = []
+    now = START
+    while now <= end:
+        sounds.extend((round(now - START, 1), sound) for sound in timer.tick(now))
+        now += step
+    return sounds
+
+
+def test_starts_stopped_at_full_duration(timer):
+    frame = timer.frame(START)
+
+    assert frame["state"] == "stopped"
+    assert frame["remaining"] == DURATION
+    assert frame["deadline"] is None
+    assert frame["seq"] == 0
+
+
+def test_countdown_into_running(timer):
+    assert timer.start(START)
+    assert timer.state == "countdown"
+    assert timer.frame(START)["deadline"] == int(MATCH_START * 1000)
+    # Already going.
+    assert not timer.start(START + 1)
+
+    sounds = run_until(timer, MATCH_START + 1)
+    assert timer.state == "running"
+    [(at, sound)] = sounds
+    assert sound == "start_match"
+    assert at == pytest.approx(COUNTDOWN_SECONDS - START_SOUND_LEAD, abs=0.1)
+    # From the countdown's deadline, however late the tick that noticed was.
+    assert timer.deadline == MATCH_START + DURATION
+
+
+def test_late_tick_does_not_drift(timer):
+    timer.start(START)
+    timer.tick(MATCH_START + 2.5)
+
+    assert timer.state == "running"
+    assert timer.deadline == MATCH_START + DURATION
+
+
+def test_runs_out_to_stopped(timer):
+    timer.start(START)
+    sounds = run_until(timer, MATCH_START + DURATION + 0.2)
+
+    assert [sound for _, sound in sounds] == ["start_match", "end_match"]
+    assert sounds[-1][0] == pytest.approx(
+        COUNTDOWN_SECONDS + DURATION - END_SOUND_LEAD,
+        abs=0.1,
+    )
+    assert timer.state == "stopped"
+    assert timer.frame(MATCH_START + DURATION + 1)["remaining"] == 0
+
+
+def test_mid_match_warning(timer, settings):
+    settings["mid_match_warning"] = 30
+    timer.start(START)
+    sounds = run_until(timer, MATCH_START + DURATION - 29)
+
+    assert timer.state == "warning"
+    assert [sound for _, sound in sounds] == ["start_match", "mid_match_chime"]
+
+
+def test_no_warning_unless_configured(timer):
+    timer.start(START)
+    run_until(timer, MATCH_START + DURATION - 10)
+
+    assert timer.state == "running"
+
+
+def test_seq_only_moves_with_the_state(timer):
+    timer.start(START)
+    seq = timer.seq
+    timer.tick(START + 1)
+    timer.tick(START + 2)
+    assert timer.seq == seq
+
+    timer.tick(MATCH_START)
+    assert timer.seq == seq + 1
+
+
+def test_pause_and_resume(timer):
+    timer.start(START)
+    timer.tick(MATCH_START)
+
+    assert timer.pause(MATCH_START + 50)
+    assert timer.state == "paused"
+    assert timer.frame(MATCH_START + 500)["remaining"] == DURATION - 50
+    assert timer.tick(MATCH_START + 500) == []
+    # Nothing to pause.
+    assert not timer.pause(MATCH_START + 501)
+
+    assert timer.start(MATCH_START + 1000)
+    assert timer.state == "running"
+    assert timer.deadline == MATCH_START + 1000 + DURATION - 50
+
+
+def test_resume_keeps_the_warning(timer, settings):
+    settings["mid_match_warning"] = 30
+    timer.start(START)
+    run_until(timer, MATCH_START + DURATION - 20)
+
+    timer.pause(MATCH_START + DURATION - 20)
+    timer.start(MATCH_START + DURATION)
+    assert timer.state == "warning"
+
+
+def test_estop_only_clears_with_stop(timer, settings):
+    timer.start(START)
+    timer.tick(MATCH_START)
+
+    assert timer.estop(MATCH_START + 10)
+    assert not timer.estop(MATCH_START + 11)
+    assert timer.frame(MATCH_START + 60)["remaining"] == DURATION - 10
+    assert not timer.start(MATCH_START + 60)
+    assert not timer.set_remaining(30)
+    assert timer.state == "estop"
+
+    settings["match_duration"] = 180
+    assert timer.stop()
+    assert timer.state == "stopped"
+    # The duration is picked up again on every reset.
+    assert timer.frame(MATCH_START + 60)["remaining"] == 180
+
+
+def test_set_remaining_leaves_it_paused(timer):
+    assert timer.set_remaining(42)
+    assert timer.state == "paused"
+    assert timer.frame(START)["remaining"] == 42
+
+    assert timer.start(START)
+    assert timer.state == "running"
+    assert timer.frame(START + 2)["remaining"] == 40
+
+
+def test_set_remaining_clamps_negative(timer):
+    timer.set_remaining(-5)
+    assert timer.remaining == 0
+
+
+@pytest.fixture
+def timers(monkeypatch, settings):
+    timers = {}
+    monkeypatch.setattr(cage_timer, "_timers", timers)
+    monkeypatch.setattr(cage_timer, "_socketio", None)
+    return timers
+
+
+def test_commands_only_for_the_events_cages(timers):
+    # The test event.json has just cage 1.
+    assert cage_timer.apply_timer_command("1", "start")["state"] == "countdown"
+
+    for cage_id in (99, "2", "cage", None, [1]):
+        assert cage_timer.apply_timer_command(cage_id, "start") is None
+        assert cage_timer.current_timer_frame(cage_id) is None
+
+    assert list(timers) == [1]
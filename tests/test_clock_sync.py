@@ -0,0 +1,58 @@
+import pytest
+
+from bracketeer.screens import clock_sync
+from bracketeer.screens.clock_sync import clock_sync_report, drop_client, record_sample
+
+
+@pytest.fixture(autouse=True)
+def samples(monkeypatch):
+    monkeypatch.setattr(clock_sync, "_client_samples", {})
+    monkeypatch.setattr(clock_sync, "_cage_samples", {})
+
+
+def test_percentiles():
+    assert clock_sync.percentiles(range(1, 101)) == {"p50": 50, "p90": 90, "p99": 99}
+    assert clock_sync.percentiles([]) == {}
+
+
+@pytest.mark.parametrize(
+    ("rtt", "offset"),
+    [(None, 1), ("fast", 1), (float("nan"), 1), (-1, 1), (10, float("inf"))],
+)
+def test_junk_samples_are_dropped(rtt, offset):
+    assert not record_sample("a", 1, rtt, offset)
+    assert clock_sync_report() == {"clients": [], "cages": {}}
+
+
+def test_only_the_events_cages_get_samples():
+    # The test event.json has just cage 1.
+    assert record_sample("a", "1", 20, 5)
+    assert record_sample("b", 99, 30, 5)
+    assert record_sample("c", "cage", 40, 5)
+
+    report = clock_sync_report()
+    assert list(report["cages"]) == [1]
+    assert report["cages"][1]["samples"] == 1
+    assert {client["sid"]: client["cage"] for client in report["clients"]} == {
+        "a": 1,
+        "b": None,
+        "c": None,
+    }
+
+
+def test_cage_samples_go_with_its_last_client():
+    record_sample("a", 1, 20, 5)
+    record_sample("b", 1, 30, 5)
+
+    drop_client("a")
+    assert clock_sync_report()["cages"][1]["samples"] == 2
+
+    drop_client("b")
+    assert clock_sync_report()["cages"] == {}
+
+
+def test_moving_off_a_cage_drops_it_if_nobody_else_is_on_it():
+    record_sample("a", 1, 20, 5)
+    record_sample("a", None, 20, 5)
+
+    assert clock_sync_report()["cages"] == {}
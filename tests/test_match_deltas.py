@@ -0,0 +1,162 @@
+from collections import deque
+from types import SimpleNamespace
+
+import pytest
+
+from bracketeer.api_truefinals.player_index import PlayerIndex
+from bracketeer.matches import match_deltas
+from bracketeer.matches.match_deltas import deltas_since, diff_games
+
+
+def game(game_id, state="available", tournament="T1", **fields):
+    return {
+        "id": game_id,
+        "tournamentID": tournament,
+        "weightclass": "BEETLE",
+        "name": game_id,
+        "state": state,
+        "calledSince": None,
+        "activeSince": None,
+        "slots": [{"playerID": "p1"}, {"playerID": "p2"}],
+        "resultAnnotation": None,
+        **fields,
+    }
+
+
+def events_by_key(events) -> dict:
+    return {payload["key"]: (name, payload) for name, payload in events}
+
+
+def test_diff_games_added_changed_removed():
+    old = (game("A1"), game("A2"), game("A3"))
+    new = (game("A1"), game("A2", "called", calledSince=100), game("A4"))
+
+    events = events_by_key(diff_games(old, new, version=7))
+
+    assert set(events) == {"T1_A2", "T1_A3", "T1_A4"}
+    assert events["T1_A2"][0] == "match_changed"
+    assert events["T1_A2"][1]["match"]["state"] == "called"
+    assert events["T1_A3"] == ("match_removed", {"version": 7, "key": "T1_A3"})
+    assert events["T1_A4"][0] == "match_added"
+    assert all(payload["version"] == 7 for _, payload in events.values())
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        {"state": "active"},
+        {"calledSince": 100},
+        {"activeSince": 200},
+        {"slots": [{"playerID": "p1"}, {"playerID": "p3"}]},
+    ],
+)
+def test_diff_games_compared_fields(change):
+    events = diff_games((game("A1"),), (game("A1", **change),), version=1)
+    assert [name for name, _ in events] == ["match_changed"]
+
+
+def test_diff_games_ignores_other_fields():
+    # Only what the queue screens show counts as a change.
+    new = game("A1", name="renamed", lastUpdated=12345)
+    assert diff_games((game("A1"),), (new,), version=1) == []
+
+
+def test_diff_games_compacts_and_attaches_players():
+    index = PlayerIndex(
+        [
+            {
+                "root_tournament_fk": "T1",
+                "id": "p1",
+                "name": "Bot One",
+                "wins": 2,
+                "losses": 1,
+                "ties": 0,
+                "seed": 4,
+            },
+        ],
+    )
+    new = (game("A1", photoUrl="https://example.com/a.png"),)
+
+    [(name, payload)] = diff_games((), new, version=1, player_index=index)
+    match = payload["match"]
+
+    assert name == "match_added"
+    assert "photoUrl" not in match
+    assert match["slots"][0]["bracketeer_player_data"] == {
+        "name": "Bot One",
+        "wins": 2,
+        "losses": 1,
+        "ties": 0,
+    }
+    # Unknown players get the placeholder rather than nothing.
+    assert (
+        match["slots"][1]["bracketeer_player_data"]["name"]
+        == "Default Player Information"
+    )
+
+
+@pytest.fixture
+def delta_log(monkeypatch):
+    monkeypatch.setattr(match_deltas, "_delta_log", deque(maxlen=3))
+    monkeypatch.setattr(match_deltas, "_delta_base_version", 0)
+    monkeypatch.setattr(match_deltas, "_last_games_version", 0)
+    monkeypatch.setattr(match_deltas, "_socketio", None)
+    monkeypatch.setattr(match_deltas, "_player_index", lambda: None)
+
+
+def snapshot(version, *games_):
+    return SimpleNamespace(version=version, games={"T1": tuple(games_)})
+
+
+def publish(previous, version, *games_):
+    new = snapshot(version, *games_)
+    match_deltas._record_game_changes(previous, new)
+    return new
+
+
+def test_deltas_since(delta_log):
+    v0 = snapshot(0)
+    v1 = publish(v0, 1, game("A1"))
+    v2 = publish(v1, 2, game("A1", "called"), game("A2"))
+    publish(v2, 3, game("A2"))
+
+    assert [(name, payload["key"]) for name, payload in deltas_since(1)] == [
+        ("match_changed", "T1_A1"),
+        ("match_added", "T1_A2"),
+        ("match_removed", "T1_A1"),
+    ]
+    assert [name for name, _ in deltas_since(2)] == ["match_removed"]
+    assert deltas_since(3) == []
+    # From the future (a restarted server's client): resync.
+    assert deltas_since(4) is None
+
+
+def test_deltas_since_falls_back_to_resync_once_history_runs_out(delta_log):
+    previous = snapshot(0)
+    for version in range(1, 6):
+        previous = publish(previous, version, game("A1", calledSince=version))
+
+    # Only the last three batches are kept.
+    assert deltas_since(1) is None
+    assert [payload["version"] for _, payload in deltas_since(2)] == [3, 4, 5]
+
+
+def test_unchanged_games_record_nothing(delta_log):
+    v1 = publish(snapshot(0), 1, game("A1"))
+    # Another division (or players) changing leaves the games tuple as it was.
+    match_deltas._record_game_changes(v1, SimpleNamespace(version=2, games=v1.games))
+
+    assert match_deltas.current_match_version() == 1
+
+
+@pytest.mark.parametrize("version", [None, "", "latest", "1.5", [1], {"v": 1}])
+def test_deltas_since_resyncs_on_junk_versions(delta_log, version):
+    publish(snapshot(0), 1, game("A1"))
+
+    assert deltas_since(version) is None
+
+
+def test_deltas_since_accepts_numeric_strings(delta_log):
+    publish(snapshot(0), 1, game("A1"))
+
+    assert deltas_since("1") == []
@@ -0,0 +1,148 @@
+from time import monotonic
+
+import pytest
+
+from bracketeer.api_truefinals import ratelimit
+from bracketeer.api_truefinals.ratelimit import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.wall = 1_700_000_000.0
+
+    def advance(self, seconds: float):
+        self.now += seconds
+        self.wall += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit, "monotonic", lambda: clock.now)
+    monkeypatch.setattr(ratelimit, "time", lambda: clock.wall)
+    return clock
+
+
+def rate_headers(limit=10, remaining=10, reset_in=10.0, clock=None):
+    return {
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(int((clock.wall + reset_in) * 1000)),
+    }
+
+
+def test_capacity_keeps_the_reserve_back():
+    assert TokenBucket(limit=10, reserve=5).capacity == 5
+    assert TokenBucket(limit=10, reserve=0).capacity == 10
+    # Never less than one, or nothing would ever get through.
+    assert TokenBucket(limit=4, reserve=5).capacity == 1
+
+
+def test_try_acquire_until_empty(clock):
+    bucket = TokenBucket(limit=10, window=10, reserve=5)
+
+    assert [bucket.try_acquire() for _ in range(6)] == [True] * 5 + [False]
+    assert bucket.tokens_available() == 0
+
+
+def test_refills_evenly_over_the_window(clock):
+    bucket = TokenBucket(limit=10, window=10, reserve=5)
+    for _ in range(5):
+        bucket.try_acquire()
+
+    # Five tokens per ten seconds is one every two.
+    clock.advance(1.9)
+    assert not bucket.try_acquire()
+    clock.advance(0.1)
+    assert bucket.try_acquire()
+
+    clock.advance(60)
+    assert bucket.tokens_available() == 5
+
+
+def test_calibrate_takes_the_panels_use_out_of_our_share(clock):
+    bucket = TokenBucket(limit=10, window=10, reserve=5)
+
+    bucket.calibrate(rate_headers(remaining=7, clock=clock))
+    assert bucket.tokens_available() == 2
+
+
+def test_calibrate_blocks_until_reset_when_out(clock):
+    bucket = TokenBucket(limit=10, window=10, reserve=5)
+
+    bucket.calibrate(rate_headers(remaining=5, reset_in=4, clock=clock))
+    assert not bucket.try_acquire()
+
+    clock.advance(3.9)
+    assert bucket.tokens_available() == 0
+    clock.advance(0.1)
+    # Blocked time counts towards the refill like any other.
+    assert bucket.try_acquire()
+
+
+def test_calibrate_follows_a_new_limit(clock):
+    bucket = TokenBucket(limit=10, window=10, reserve=5)
+
+    bucket.calibrate(rate_headers(limit=20, remaining=20, clock=clock))
+    assert bucket.limit == 20
+    assert bucket.capacity == 15
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        {},
+        {"X-RateLimit-Limit": "10", "X-RateLimit-Remaining": "0"},
+        {
+            "X-RateLimit-Limit": "ten",
+            "X-RateLimit-Remaining": "0",
+            "X-RateLimit-Reset": "0",
+        },
+    ],
+)
+def test_calibrate_ignores_missing_or_bad_headers(clock, headers):
+    bucket = TokenBucket(limit=10, window=10, reserve=5)
+
+    bucket.calibrate(headers)
+    assert bucket.limit == 10
+    assert bucket.tokens_available() == 5
+
+
+def test_penalize_without_reset_sits_out_a_window(clock):
+    bucket = TokenBucket(limit=10, window=10, reserve=5)
+
+    bucket.penalize({})
+    clock.advance(9.9)
+    assert not bucket.try_acquire()
+    clock.advance(0.1)
+    assert bucket.try_acquire()
+
+
+def test_penalize_accepts_a_reset_in_seconds(clock):
+    bucket = TokenBucket(limit=10, window=10, reserve=5)
+
+    bucket.penalize({"x-ratelimit-reset": str(clock.wall + 3)})
+    clock.advance(2.9)
+    assert not bucket.try_acquire()
+    clock.advance(0.1)
+    assert bucket.try_acquire()
+
+
+def test_acquire_waits_for_the_next_token():
+    # Real time: one token every 50ms.
+    bucket = TokenBucket(limit=2, window=0.05, reserve=1)
+    assert bucket.try_acquire()
+
+    start = monotonic()
+    assert bucket.acquire(timeout=1)
+    assert monotonic() - start >= 0.03
+
+
+def test_acquire_gives_up_at_the_timeout():
+    bucket = TokenBucket(limit=2, window=60, reserve=1)
+    assert bucket.try_acquire()
+
+    start = monotonic()
+    assert not bucket.acquire(timeout=0.05)
+    assert monotonic() - start < 1
@@ -0,0 +1,105 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from time import sleep
+
+import pytest
+
+from bracketeer.api_truefinals.singleflight import InFlightError, SingleFlight
+
+
+def blocking_call(flight: SingleFlight, key, result):
+    """Starts a leader for `key` on its own thread that won't return until released.
+
+    Returns (release, future of the leader's result)."""
+    started = threading.Event()
+    release = threading.Event()
+
+    def fn():
+        started.set()
+        release.wait(5)
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    leader = pool.submit(flight.do, key, fn)
+    assert started.wait(5)
+    pool.shutdown(wait=False)
+    return release, leader
+
+
+def test_runs_fn_and_forgets_the_key():
+    flight = SingleFlight()
+
+    assert flight.do("games", lambda: 1) == 1
+    assert not flight.in_flight("games")
+    # Nothing's cached between calls.
+    assert flight.do("games", lambda: 2) == 2
+
+
+def test_followers_share_the_leaders_result():
+    flight = SingleFlight()
+    calls = []
+    release, leader = blocking_call(flight, "games", "body")
+    assert flight.in_flight("games")
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        followers = [
+            pool.submit(flight.do, "games", lambda: calls.append(1)) for _ in range(4)
+        ]
+        # Nothing to wait on for "they've all joined", so give them a moment.
+        sleep(0.1)
+        release.set()
+        assert [follower.result(5) for follower in followers] == ["body"] * 4
+
+    assert leader.result(5) == "body"
+    assert calls == []
+    assert not flight.in_flight("games")
+
+
+def test_followers_get_the_leaders_exception():
+    flight = SingleFlight()
+    release, leader = blocking_call(flight, "games", ValueError("upstream"))
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        follower = pool.submit(flight.do, "games", lambda: "not run")
+        release.set()
+        with pytest.raises(ValueError, match="upstream"):
+            follower.result(5)
+
+    with pytest.raises(ValueError, match="upstream"):
+        leader.result(5)
+    assert not flight.in_flight("games")
+
+
+def test_no_wait_raises_in_flight():
+    flight = SingleFlight()
+    release, leader = blocking_call(flight, "games", "body")
+
+    with pytest.raises(InFlightError):
+        flight.do("games", lambda: "not run", wait=False)
+
+    release.set()
+    assert leader.result(5) == "body"
+
+
+def test_follower_timeout():
+    flight = SingleFlight()
+    release, leader = blocking_call(flight, "games", "body")
+
+    with pytest.raises(FutureTimeoutError):
+        flight.do("games", lambda: "not run", timeout=0.05)
+
+    release.set()
+    assert leader.result(5) == "body"
+
+
+def test_keys_are_independent():
+    flight = SingleFlight()
+    release, leader = blocking_call(flight, "games", "body")
+
+    assert flight.do("players", lambda: "players") == "players"
+
+    release.set()
+    assert leader.result(5) == "body"